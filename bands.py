@@ -0,0 +1,98 @@
+# Frequency bands used to route sweep results so consumers only get what they decode
+
+import json # needed for band files
+
+import numpy as np # needed for splitting sweeps
+
+# topic exchange the per band messages go to, routing keys look like scan.2400 or signal.5000
+BAND_EXCHANGE = 'sweepBands'
+
+# anything outside the configured bands, so scan.* still covers the whole sweep
+OTHER_BAND = 'other'
+
+# (name, low MHz, high MHz)
+DEFAULT_BANDS = (
+    ('433', 433, 435),
+    ('868', 863, 870),
+    ('915', 902, 928),
+    ('2400', 2400, 2500),
+    ('5000', 5150, 5925),
+)
+
+def loadBands(fileName):
+    """
+    Reads band definitions from a JSON file
+
+    Args:
+        fileName (str): JSON list like [["2400", 2400, 2500], ["5000", 5150, 5925]]
+
+    Returns:
+        list: (name, low MHz, high MHz) for each band
+    """
+
+    with open(fileName, 'r') as infile:
+        return [(str(name), float(low), float(high)) for name, low, high in json.load(infile)]
+
+def routingKey(kind, band):
+    ''' Builds the routing key for a kind of message ('scan' or 'signal') in a band '''
+
+    return f"{kind}.{band}"
+
+class BandRouter:
+    """
+    Splits a sweep's results into one group per band
+    """
+
+    def __init__(self, bands=DEFAULT_BANDS):
+        """
+        Initialization method
+
+        Args:
+            bands (list, optional): (name, low MHz, high MHz) for each band, they can't overlap. Defaults to DEFAULT_BANDS.
+        """
+
+        self.bands = sorted(((str(name), float(low), float(high)) for name, low, high in bands), key=lambda band: band[1])
+
+        for previous, band in zip(self.bands, self.bands[1:]):
+            if band[1] < previous[2]:
+                raise ValueError(f"Bands {previous[0]} and {band[0]} overlap")
+
+        self.names = [band[0] for band in self.bands] + [OTHER_BAND]
+        self.lows = np.array([band[1] for band in self.bands])
+        self.highs = np.array([band[2] for band in self.bands])
+
+    def bandIndex(self, freqs):
+        """
+        Finds the band of each frequency
+
+        Args:
+            freqs (numpy.ndarray): frequencies in MHz
+
+        Returns:
+            numpy.ndarray: index into names for each frequency, the last one is OTHER_BAND
+        """
+
+        index = np.searchsorted(self.lows, freqs, side='right') - 1
+        inBand = (index >= 0) & (freqs < self.highs[np.maximum(index, 0)])
+        return np.where(inBand, index, len(self.bands))
+
+    def split(self, freqs, scale=1.0):
+        """
+        Groups positions in a result list by band
+
+        Args:
+            freqs (list): the frequency of each result
+            scale (float, optional): converts freqs to MHz, 1e-6 for Hz. Defaults to 1.
+
+        Returns:
+            dict: band name -> indexes of the results in that band, empty bands are left out
+        """
+
+        if len(freqs) == 0:
+            return {}
+
+        index = self.bandIndex(np.asarray(freqs, dtype=np.float64) * scale)
+        order = np.argsort(index, kind='stable')
+        bounds = np.searchsorted(index[order], np.arange(len(self.names) + 1))
+
+        return {self.names[i]: order[bounds[i]:bounds[i + 1]] for i in range(len(self.names)) if bounds[i + 1] > bounds[i]}
@@ -3,26 +3,680 @@
 import subprocess # needed for hackrf sweep
 import sys # needed for rabbit
 import time # needed for sleep
-from threading import Thread # needed for threads
+from threading import Thread, Lock # needed for threads
+
+import argparse # needed for command line options
+import queue # needed for handing sweeps to the cluster thread
+import json # needed for the radios file
 
 import pika # needed for rabbitMQ
 
-from sklearn.cluster import DBSCAN, HDBSCAN # needed for DBSCAN clustering
 import numpy as np # needed for clustering
-from sklearn.neighbors import NearestNeighbors # needed for helping find epsilon
-from kneed import KneeLocator # needed for helping to find epsilon
-
-import pandas as pd # needed for data frames
 import os # needed to clear screen
 
 import math
 
+from cactusConfig import parseArgs # needed for the config file
+from sweepRing import SweepRing # needed for the shared memory transport
+from bands import BandRouter, DEFAULT_BANDS, BAND_EXCHANGE, routingKey, loadBands # needed for band routed publishing
+from sweepHistory import TieredHistory, parseTiers # needed for the long clustering history
+
+from sweepRecorder import SweepRecorder # needed for recording full sweeps
+from geoStore import GeoStore # needed for geo tagged detections
+from position import openFeed # needed for geo tagged detections
+import metrics # needed for runtime stats
+from profiler import LoopProfiler # needed for on demand profiling
+
+# per stage metrics, shared by every Cactus in the process
+SWEEPS = metrics.counter('cactus_sweeps_total', 'Completed sweeps')
+SWEEP_SECONDS = metrics.histogram('cactus_sweep_seconds', 'Wall time of each full sweep')
+SWEEP_TARGETS = metrics.gauge('cactus_sweep_targets', 'Bins above the target floor in the last sweep')
+LINE_SECONDS = metrics.histogram('cactus_line_parse_seconds', 'Time parsing one hackrf_sweep line')
+CLUSTER_SECONDS = metrics.histogram('cactus_cluster_seconds', 'Time spent in clusterData')
+CLUSTER_POINTS = metrics.gauge('cactus_cluster_points', 'Points in the last clustering run')
+CLUSTER_THREADS = metrics.gauge('cactus_cluster_threads', 'Signal cluster threads busy clustering')
+CLUSTER_DROPPED = metrics.counter('cactus_cluster_dropped_total', 'Sweeps dropped because clustering fell behind')
+SIGNALS = metrics.gauge('cactus_signals', 'Signals found by the last clustering run')
+CLUSTER_REUSED = metrics.counter('cactus_cluster_reused_total', 'Sweeps that reused the last clustering because the spectrum had not changed')
+PUBLISH_SCAN_SECONDS = metrics.histogram('cactus_publish_scan_seconds', 'Time building and publishing a scanSweep message')
+PUBLISH_SIGNAL_SECONDS = metrics.histogram('cactus_publish_signal_seconds', 'Time building and publishing a signalSweep message')
+
+def clusterLabels(dataList, weights=None, minSamples=None):
+    """
+    Runs DBSCAN with a knee point epsilon
+
+    Args:
+        dataList (list): the list of [MHz, dBm, sweep] points to cluster
+        weights (numpy.ndarray, optional): sweeps each point stands for, None when every point is one sweep. Defaults to None.
+        minSamples (int, optional): weight a neighborhood needs to be a cluster core. Defaults to 0.1% of the points plus one.
+
+    Returns:
+        tuple: (N x 3 array of the points, cluster label of each point, -1 for un-clustered points)
+    """
+
+    # slow to import, only loaded once something is clustered
+    from sklearn.cluster import DBSCAN # needed for DBSCAN clustering
+    from sklearn.neighbors import NearestNeighbors # needed for helping find epsilon
+    from kneed import KneeLocator # needed for helping to find epsilon
+
+    # gets distance from all neighbors
+    data = np.asarray(dataList, dtype=np.float64)
+    neighbors = NearestNeighbors(n_neighbors=11).fit(data)
+    distances, indices = neighbors.kneighbors(data)
+    distances = np.sort(distances[:,len(distances[0])-1], axis=0)
+
+    # find knee point
+    knee = KneeLocator(np.arange(len(distances)), distances, S=1, curve='convex', direction='increasing', interp_method='polynomial')
+    #print(str(knee.knee))
+
+    #print(f"\n{str(len(data))} : {str(math.ceil(len(data) * 0.001) + 1)}")
+
+    # use knee point to calculate clusters
+    # summary points count for every sweep they stand for once a neighborhood is weighed
+    if minSamples is None:
+        minSamples = math.ceil(len(data) * 0.001) + 1
+    dbClusters = DBSCAN(eps=distances[knee.knee], min_samples=minSamples).fit(data, sample_weight=weights)
+
+    return data, dbClusters.labels_
+
+def clusterData(dataList):
+    """
+    Generates clustering data, shared by Cactus and offline analysis of recorded sweeps
+
+    Args:
+        dataList (list): the list of data points to cluster
+
+    Returns:
+        list: list of clustered points
+    """
+
+    data, labels = clusterLabels(dataList)
+
+    # Number of Clusters
+    nClusters = int(labels.max()) + 1 if len(labels) > 0 else 0
+    #print(str(nClusters))
+
+    # group the points by label in one sort, un-clustered points sort first and are skipped
+    order = np.argsort(labels, kind='stable')
+    bounds = np.searchsorted(labels[order], np.arange(nClusters + 1))
+
+    return [data[order[bounds[i]:bounds[i + 1]]].tolist() for i in range(nClusters)]
+
+def signalFeatures(data, labels, weights=None, firstRow=0):
+    """
+    Computes every cluster's features at once with grouped reductions over the label array
+
+    Args:
+        data (numpy.ndarray): N x 3 array of [MHz, dBm, sweep] points
+        labels (numpy.ndarray): cluster label of each point, -1 for un-clustered points
+        weights (numpy.ndarray, optional): sweeps each point stands for, weights the centers and flatness. Defaults to None.
+        firstRow (int, optional): first row that is a single sweep, continuity only counts rows from here on
+            since a summary row stands for many sweeps. Defaults to 0.
+
+    Returns:
+        list: list of [center frequency, bandwidth, continuous, power difference, power weighted center, occupancy, spectral flatness, peak dBm]
+    """
+
+    clustered = labels >= 0
+    if not clustered.any():
+        return []
+
+    data = data[clustered]
+    labels = labels[clustered].astype(np.int64)
+    weights = np.ones(len(data)) if weights is None else weights[clustered]
+    freq = data[:, 0]
+    power = data[:, 1]
+    sweep = data[:, 2].astype(np.int64)
+
+    # sums come straight from bincount, clusters with no points are dropped at the end
+    counts = np.bincount(labels)
+    kept = np.flatnonzero(counts)
+    nClusters = len(counts)
+    counts = counts[kept].astype(np.float64)
+
+    weightSum = np.bincount(labels, weights, nClusters)[kept]
+    centerFreq = np.bincount(labels, weights * freq, nClusters)[kept] / weightSum
+
+    # one sort by cluster then frequency, extremes are then the ends of each group
+    span = freq.max() - freq.min() + 1
+    order = np.argsort(labels * span + (freq - freq.min()))
+    freqSorted = freq[order]
+    newCluster = np.r_[True, labels[order][1:] != labels[order][:-1]]
+    starts = np.flatnonzero(newCluster)
+    ends = np.r_[starts[1:], len(order)]
+
+    bandWidth = freqSorted[ends - 1] - freqSorted[starts]
+    powerSorted = power[order]
+    peak = np.maximum.reduceat(powerSorted, starts)
+    powerDiff = peak - np.minimum.reduceat(powerSorted, starts)
+
+    # sweeps each cluster shows up in, against the latest sweep it shows up in, over the single sweep rows only
+    sweeps = max(sweep.max() + 1, firstRow + 1)
+    seen = np.bincount(labels * sweeps + sweep, minlength=nClusters * sweeps).reshape(nClusters, sweeps)[kept] > 0
+    sweepCount = seen.sum(axis=1)
+    continuous = sweepContinuity(seen[:, firstRow:])
+
+    # power weighted center, in linear power so the strongest bins pull the center
+    linear = weights * np.power(10.0, power / 10.0)
+    linearSum = np.bincount(labels, linear, nClusters)[kept]
+    weightedCenter = np.bincount(labels, linear * freq, nClusters)[kept] / linearSum
+
+    # share of the cluster's frequency by sweep footprint that was above the floor
+    freqCount = np.add.reduceat(newCluster | np.r_[True, freqSorted[1:] != freqSorted[:-1]], starts)
+    occupancy = counts / (freqCount * sweepCount) * 100
+
+    # geometric over arithmetic mean of linear power, near 1 for flat digital signals and low for peaky analog ones
+    flatness = np.power(10.0, (np.bincount(labels, weights * power, nClusters)[kept] / weightSum) / 10.0) / (linearSum / weightSum)
+
+    signalList = []
+    for i in np.flatnonzero(np.round(bandWidth) > 0): # not a dud target
+        signalList.append([float(centerFreq[i]), float(bandWidth[i]), float(continuous[i]), float(powerDiff[i]),
+                           float(weightedCenter[i]), float(occupancy[i]), float(flatness[i]), float(peak[i])])
+
+    return signalList
+
+def sweepContinuity(seen):
+    """
+    Scores how steadily each signal shows up, the sweeps it's in against the latest sweep it's in
+
+    Args:
+        seen (numpy.ndarray): signals x sweeps array, True where the signal had targets in the sweep
+
+    Returns:
+        numpy.ndarray: continuity of each signal in percent, 0 for a signal only in the first sweep or in none
+    """
+
+    sweepCount = seen.sum(axis=1)
+    lastSweep = seen.shape[1] - 1 - np.argmax(seen[:, ::-1], axis=1)
+    return np.where((lastSweep > 0) & (sweepCount > 0), sweepCount / np.maximum(lastSweep, 1) * 100, 0.0)
+
+def extractSignals(clusteredData):
+    """
+    Turns clustered points into signal features
+
+    Args:
+        clusteredData (list): list of clusters, each a list of [MHz, dBm, sweep] points
+
+    Returns:
+        list: list of [center frequency, bandwidth, continuous, power difference, power weighted center, occupancy, spectral flatness]
+    """
+
+    clusters = [cluster for cluster in clusteredData if len(cluster) > 0]
+    if not clusters:
+        return []
+
+    data = np.concatenate([np.asarray(cluster, dtype=np.float64).reshape(-1, 3) for cluster in clusters])
+    labels = np.repeat(np.arange(len(clusters)), [len(cluster) for cluster in clusters])
+    return signalFeatures(data, labels)
+
+def clusterRanges(data, labels):
+    """
+    Finds the frequency span of the clusters signalFeatures reports, in the same order
+
+    Args:
+        data (numpy.ndarray): N x 3 array of [MHz, dBm, sweep] points
+        labels (numpy.ndarray): cluster label of each point, -1 for un-clustered points
+
+    Returns:
+        numpy.ndarray: S x 2 array of [low MHz, high MHz]
+    """
+
+    clustered = labels >= 0
+    if not clustered.any():
+        return np.zeros((0, 2))
+
+    freq = data[clustered, 0]
+    labels = labels[clustered].astype(np.int64)
+    lows = np.full(labels.max() + 1, np.inf)
+    highs = np.full(labels.max() + 1, -np.inf)
+    np.minimum.at(lows, labels, freq)
+    np.maximum.at(highs, labels, freq)
+
+    kept = np.isfinite(lows)
+    lows = lows[kept]
+    highs = highs[kept]
+    wide = np.round(highs - lows) > 0 # the same dud filter as signalFeatures
+    return np.column_stack((lows[wide], highs[wide]))
+
+def signalPresence(freqList, ranges):
+    """
+    Checks which signals a sweep had targets in
+
+    Args:
+        freqList (list): the sweep's frequencies in Hz
+        ranges (numpy.ndarray): S x 2 array of [low MHz, high MHz] from clusterRanges
+
+    Returns:
+        numpy.ndarray: one bool per signal
+    """
+
+    freqs = np.sort(np.asarray(freqList, dtype=np.float64)) / 1000000
+    return np.searchsorted(freqs, ranges[:, 1], side='right') > np.searchsorted(freqs, ranges[:, 0], side='left')
+
+def occupancyFingerprint(freqList, bucketHz=1000000):
+    """
+    Quantizes a sweep's targets into target counts per frequency bucket
+
+    Args:
+        freqList (list): the sweep's frequencies in Hz
+        bucketHz (int, optional): bucket width in Hertz. Defaults to 1000000.
+
+    Returns:
+        tuple: (sorted occupied bucket numbers, targets in each)
+    """
+
+    return np.unique((np.asarray(freqList, dtype=np.float64) // bucketHz).astype(np.int64), return_counts=True)
+
+def fingerprintChanged(first, second, threshold=0.8, minTargets=3):
+    """
+    Compares two occupancy fingerprints, a few noise targets flickering or a signal fading in and out of some bins isn't a change
+
+    Args:
+        first (tuple): fingerprint from occupancyFingerprint
+        second (tuple): fingerprint from occupancyFingerprint
+        threshold (float, optional): weighted Jaccard similarity below which the spectrum changed. Defaults to 0.8.
+        minTargets (int, optional): targets a single bucket has to gain or lose, and at least half its count, to be a change on its own. Defaults to 3.
+
+    Returns:
+        bool: True if something material changed
+    """
+
+    buckets = np.union1d(first[0], second[0])
+    firstCounts = np.zeros(len(buckets))
+    secondCounts = np.zeros(len(buckets))
+    firstCounts[np.searchsorted(buckets, first[0])] = first[1]
+    secondCounts[np.searchsorted(buckets, second[0])] = second[1]
+
+    # a signal appearing or vanishing, even when it's small next to the rest of the sweep
+    larger = np.maximum(firstCounts, secondCounts)
+    if np.any(np.abs(firstCounts - secondCounts) >= np.maximum(minTargets, larger / 2)):
+        return True
+
+    # broad changes, like the noise floor moving
+    total = larger.sum()
+    return total > 0 and np.minimum(firstCounts, secondCounts).sum() / total < threshold
+
+def formatScan(freqList, dbList):
+    """
+    Builds the scanSweep message body
+
+    Args:
+        freqList (list): list of frequencies
+        dbList (list): list of recorded power levels
+
+    Returns:
+        str: space separated frequency / power pairs
+    """
+
+    # initialize message and find min length
+    message = ''
+    listLen = min(len(freqList), len(dbList))
+
+    # build message
+    for i in range(listLen):
+        message += f"{str(freqList[i])} {str(dbList[i])} "
+
+    return message
+
+def formatSignals(signalList):
+    """
+    Builds the signalSweep message body
+
+    Args:
+        signalList (list): list of detected signals
+
+    Returns:
+        str: five space separated features per signal, center, bandwidth, continuous, power difference and peak dBm
+    """
+
+    message = ''
+    for i in range(len(signalList)):
+        message += f"{str(signalList[i][0])} {str(signalList[i][1])} {str(signalList[i][2])} {str(signalList[i][3])} {str(signalList[i][7])} "
+
+    return message
+
+def warmUp(display='table'):
+    """
+    Imports the clustering and display modules in the background, so sweeping starts right away and the first clustering run doesn't pay for them
+
+    Args:
+        display (str, optional): the display backend that will be used. Defaults to 'table'.
+
+    Returns:
+        Thread: the importing thread
+    """
+
+    def importModules():
+        import sklearn.cluster, sklearn.neighbors # needed for clusterData
+        import kneed # needed for clusterData
+        if display == 'table':
+            import pandas # needed for displaySignals
+
+    thread = Thread(target=importModules, daemon=True)
+    thread.start()
+    return thread
+
+def bandScans(router, freqList, dbList):
+    """
+    Splits a scan into one scanSweep style message per band
+
+    Args:
+        router (BandRouter): the band definitions
+        freqList (list): list of frequencies in Hz
+        dbList (list): list of recorded power levels
+
+    Returns:
+        list: (routing key, message) for every band with targets
+    """
+
+    return [(routingKey('scan', band), formatScan([freqList[i] for i in index], [dbList[i] for i in index]))
+            for band, index in router.split(freqList, scale=1e-6).items()]
+
+def bandSignals(router, signalList):
+    """
+    Splits the signals into one signalSweep style message per band, by center frequency
+
+    Args:
+        router (BandRouter): the band definitions
+        signalList (list): list of detected signals
+
+    Returns:
+        list: (routing key, message) for every band with signals
+    """
+
+    return [(routingKey('signal', band), formatSignals([signalList[i] for i in index]))
+            for band, index in router.split([signal[0] for signal in signalList]).items()]
+
+def displaySignals(signalList, display='table'):
+    """
+    Clears the terminal and prints the signal table
+
+    Args:
+        signalList (list): list of detected signals
+        display (str, optional): 'table' for a pandas data frame, 'plain' for plain text or 'none'. Defaults to 'table'.
+    """
+
+    if display == 'none':
+        return
+
+    pandaList = []
+    for signal in signalList:
+        #print(f"{str(round(signal[0]))} : {str(round(signal[1]))} : {str(round(signal[2]))} : {str(round(signal[3]))}")
+        pandaList.append([str(round(signal[0])), str(round(signal[1])), str(round(signal[2])), str(round(signal[3])), str(round(signal[4])), str(round(signal[5])), f"{signal[6]:.2f}", str(round(signal[7]))])
+
+    columns = ["Center Frequency (MHz)", "Bandwidth (MHz)", "Continuous", "Power Difference", "Weighted Center (MHz)", "Occupancy", "Flatness", "Peak (dBm)"]
+
+    if display == 'plain':
+        text = ' | '.join(columns)
+        for row in pandaList:
+            text += '\n' + ' | '.join(value.center(len(column)) for value, column in zip(row, columns))
+    else:
+        import pandas as pd # needed for data frames, only loaded for the table display
+
+        df = pd.DataFrame(pandaList, columns=columns)
+        pd.set_option('display.colheader_justify', 'center')
+        text = str(df)
+
+    # Clear the terminal screen
+    os.system("cls" if os.name == "nt" else "clear")
+
+    print(text)
+
+class SweepParser:
+    """
+    Tracks the noise floors of a hackrf_sweep stream and collects the bins above the top floor
+    """
+
+    def __init__(self, minFreq, dbmAdjust=0):
+        """
+        Initialization method
+
+        Args:
+            minFreq (int): The min frequency of the sweep in MHz, marks where each loop starts
+            dbmAdjust (float, optional): Adds to the calculated power cutoff. Defaults to 0.
+        """
+
+        self.startFreq = str(int(minFreq) * 1000000) # minFreq is in MHz, but output is in Hz
+        self.dbmAdjust = float(dbmAdjust)
+
+        self.floor50percent = float(-50)
+        self.floor25percent = float(-40)
+        self.floor12percent = float(-30)
+        self.floor6percent = float(-30)
+        self.floor3percent = float(-30)
+
+        self.floorSeconds = 0.0 # time the last floor update took
+        self.__reset()
+
+    def __reset(self):
+        ''' Reset temp variables '''
+
+        self.temp50floor = float(0)
+        self.counter50percent = float(0)
+        self.temp25floor = float(0)
+        self.counter25percent = float(0)
+        self.temp12floor = float(0)
+        self.counter12percent = float(0)
+        self.temp6floor = float(0)
+        self.counter6percent = float(0)
+        self.temp3floor = float(0)
+        self.counter3percent = float(0)
+
+        # temp variables for high power stuff
+        self.tempFreq = []
+        self.tempDBM = []
+
+    def parseLine(self, splitStr):
+        """
+        Handles one hackrf_sweep line that has already been split on ', '
+
+        Args:
+            splitStr (list): the fields of a data line, at least 11 long
+
+        Returns:
+            tuple: (frequencies, dBm) of the targets of the loop that just finished, or None mid loop
+        """
+
+        completed = None
+
+        self.temp50floor = self.temp50floor + float(splitStr[6]) + float(splitStr[7]) + float(splitStr[8]) + float(splitStr[9]) + float(splitStr[10])
+        self.counter50percent = self.counter50percent + 5
+
+        if splitStr[2] == self.startFreq: # check if a loop has finished
+
+            # update noise floor
+            floorStart = time.perf_counter()
+            if self.counter50percent > 0: # small edge case that counter is 0
+                self.floor50percent = (self.temp50floor / self.counter50percent)
+            if self.counter25percent > 0: # small edge case that counter is 0
+                self.floor25percent = (self.temp25floor / self.counter25percent)
+            if self.counter12percent > 0: # small edge case that counter is 0
+                self.floor12percent = (self.temp12floor / self.counter12percent)
+            if self.counter6percent > 0: # small edge case that counter is 0
+                self.floor6percent = (self.temp6floor / self.counter6percent)
+            if self.counter3percent > 0: # small edge case that counter is 0
+                self.floor3percent = (self.temp3floor / self.counter3percent) + self.dbmAdjust
+            self.floorSeconds = time.perf_counter() - floorStart
+
+            completed = (self.tempFreq, self.tempDBM)
+            self.__reset()
+
+        # each of the five bins in the line goes through the floors from lowest to highest
+        for k in range(5):
+            value = float(splitStr[6 + k])
+
+            if value > self.floor50percent: # frequency is worth checking out
+                # update 25% Counter
+                self.temp25floor = self.temp25floor + value
+                self.counter25percent = self.counter25percent + 1
+
+                if value > self.floor25percent: # frequency is worth checking out for HighPwr
+                    # update 12% Counter
+                    self.temp12floor = self.temp12floor + value
+                    self.counter12percent = self.counter12percent + 1
+
+                    if value > self.floor12percent: # frequency is worth checking out for HighPwr
+                        # update 6% Counter
+                        self.temp6floor = self.temp6floor + value
+                        self.counter6percent = self.counter6percent + 1
+
+                        if value > self.floor6percent: # frequency is a target
+                            self.tempFreq.append(int(splitStr[2]) + (k * round(float(splitStr[4]))))
+                            self.tempDBM.append(value)
+
+        return completed
+
+class SignalClusterer:
+    """
+    Keeps the rolling history of sweep targets and turns it into signals
+    """
+
+    def __init__(self, clusterHistory=60, changeThreshold=0.8, recomputeEvery=10, bucketHz=1000000, historyTiers=None, binSize=100000):
+        """
+        Initialization method
+
+        Args:
+            clusterHistory (int, optional): The amount of previous runs to include when clustering, defaults to 60.
+            changeThreshold (float, optional): Fingerprint similarity a sweep needs to reuse the last clustering, None always clusters. Defaults to 0.8.
+            recomputeEvery (int, optional): Sweeps between forced full clusterings, 1 always clusters. Defaults to 10.
+            bucketHz (int, optional): Width of the occupancy fingerprint buckets in Hertz. Defaults to 1000000.
+            historyTiers (list, optional): (sweeps per bucket, buckets kept) of the summary tiers sweeps go to after the raw window, None forgets them. Defaults to None.
+            binSize (int, optional): The width of each frequency bin in Hertz. Defaults to 100000.
+        """
+
+        self.clusterHistory = clusterHistory
+        self.dataList = []
+        self.dbList = []
+
+        # older sweeps as weighted per bin summaries
+        self.history = None if not historyTiers else TieredHistory(historyTiers, binSize)
+        self.sweepNumber = 0
+
+        # change gate, the last full result and what it was computed from
+        self.changeThreshold = changeThreshold
+        self.recomputeEvery = int(recomputeEvery)
+        self.bucketHz = bucketHz
+        self.cached = None
+        self.fingerprint = None
+        self.ranges = None
+        self.presence = [] # per sweep, which cached signals it had targets in
+        self.sinceRecompute = 0
+        self.lock = Lock()
+
+    def update(self, newFreq, newDB):
+        """
+        Adds a sweep's targets to the history and clusters the history, one sweep at a time whatever thread calls it
+
+        Args:
+            newFreq (list): list of newly detected frequencies
+            newDB (list): list of dBm associated with new frequencies
+
+        Returns:
+            tuple: (list of signalFeatures signals or None if there was too little to cluster, True if the cached result was reused)
+        """
+
+        # the history, the tiers and the change gate all move together
+        with self.lock:
+            return self.__update(newFreq, newDB)
+
+    def __update(self, newFreq, newDB):
+        ''' update without the lock '''
+
+        # pair freqs and dB lists
+        #tempList = []
+
+        #for i in range(len(newFreq)):
+        #    tempList.append([newFreq[i], newDB[i]])
+
+        #self.dataList.append(tempList)
+        self.dataList.append(newFreq)
+        self.dbList.append(newDB)
+        self.sweepNumber += 1
+
+        if (len(self.dataList) > self.clusterHistory) and (len(self.dbList) > self.clusterHistory):
+
+            oldFreq = self.dataList.pop(0)
+            oldDB = self.dbList.pop(0)
+            if self.history is not None:
+                self.history.fold(oldFreq, oldDB, self.sweepNumber - len(self.dataList))
+
+        # a sweep that looks like the one the cached result came from skips clustering
+        fingerprint = None
+        if self.changeThreshold is not None:
+            fingerprint = occupancyFingerprint(newFreq, self.bucketHz)
+            if self.cached is not None and self.sinceRecompute + 1 < self.recomputeEvery and not fingerprintChanged(fingerprint, self.fingerprint, self.changeThreshold):
+                self.sinceRecompute += 1
+                CLUSTER_REUSED.inc()
+                return self.__refreshCached(newFreq), True
+
+        self.cached = None
+
+        # summary rows come first, oldest to newest, then the raw sweeps
+        weights = None
+        summaryRows = 0
+        if self.history is not None:
+            summaryPoints, summaryWeights, summaryRows = self.history.points()
+
+        # data should look like [frequency, history row], converted to MHz to stop knee calc from going crazy
+        lengths = [len(freqs) for freqs in self.dataList]
+        extendedData = np.column_stack((
+            np.concatenate([np.asarray(freqs, dtype=np.float64) for freqs in self.dataList]) / 1000000,
+            np.concatenate([np.asarray(dbs, dtype=np.float64) for dbs in self.dbList]),
+            np.repeat(np.arange(len(self.dataList)) + summaryRows, lengths),
+        ))
+
+        if summaryRows > 0:
+            extendedData = np.concatenate((summaryPoints, extendedData))
+            weights = np.concatenate((summaryWeights, np.ones(sum(lengths))))
+
+        if len(extendedData) <= 12:
+            return None, False
+
+        CLUSTER_POINTS.set(len(extendedData))
+        with CLUSTER_SECONDS.time():
+            # the raw window sets the density a signal needs, summaries only add evidence
+            data, labels = clusterLabels(extendedData, weights, math.ceil(sum(lengths) * 0.001) + 1)
+        #print(f"Clusters: {str(labels.max() + 1)}")
+
+        # extract signal data straight from the labels
+        signalList = signalFeatures(data, labels, weights, summaryRows)
+        SIGNALS.set(len(signalList))
+
+        if fingerprint is not None:
+            self.cached = signalList
+            self.fingerprint = fingerprint
+            self.sinceRecompute = 0
+            self.ranges = clusterRanges(data, labels)
+            self.presence = [signalPresence(freqs, self.ranges) for freqs in self.dataList]
+
+        return signalList, False
+
+    def __refreshCached(self, newFreq):
+        """
+        Brings the cached signals' continuity up to date with the history window instead of re-clustering
+
+        Args:
+            newFreq (list): the new sweep's frequencies
+
+        Returns:
+            list: the cached signals with a fresh continuous value
+        """
+
+        self.presence.append(signalPresence(newFreq, self.ranges))
+        while len(self.presence) > len(self.dataList):
+            self.presence.pop(0)
+
+        # same continuity as signalFeatures, over the raw window only
+        continuous = sweepContinuity(np.array(self.presence).reshape(len(self.presence), len(self.ranges)).T)
+
+        return [[signal[0], signal[1], float(value)] + signal[3:] for signal, value in zip(self.cached, continuous)]
+
 class Cactus:
     """
     Class to handle RF stuff
     """
 
-    def __init__(self, minFreq=1, maxFreq=6000, ampEnable=1, lnaGain=32, vgaGain=20, binSize=100000, dbmAdjust=0, clusterHistory=60):
+    def __init__(self, minFreq=1, maxFreq=6000, ampEnable=1, lnaGain=32, vgaGain=20, binSize=100000, dbmAdjust=0, clusterHistory=60, recordDir=None, recordFormat='int8', metricsPort=None, statsInterval=None, profileDir='profiles', profileControl=False, clustering='dbscan', display='table', routing='both', bands=None, ringName=None, geoDir=None, position='gpsd', changeThreshold=0.8, recomputeEvery=10, historyTiers=None):
         """
         Initialization method
 
@@ -35,14 +689,57 @@ class Cactus:
             binSize (int, optional): The width of each frequency bin in Hertz. Defaults to 100000.
             dbmAdjust (float, optional): Adds to the calculated power cutoff for minimum dBm to be considered a signal. Defaults to 0.
             clusterHistory (int, optional): The amount of previous runs to include when clustering, defaults to 60.
+            recordDir (str, optional): Folder to record every full sweep into, None disables recording. Defaults to None.
+            recordFormat (str, optional): 'int8' or 'float16' storage for recorded dBm. Defaults to 'int8'.
+            metricsPort (int, optional): Port to serve Prometheus metrics on, None disables it. Defaults to None.
+            statsInterval (float, optional): Seconds between stats exchange messages, None disables them. Defaults to None.
+            profileDir (str, optional): Folder profiles and timing traces are dumped to. Defaults to 'profiles'.
+            profileControl (bool, optional): Also accept profiling commands on the control exchange. Defaults to False.
+            clustering (str, optional): 'dbscan' to cluster signals or 'none' to only publish scans. Defaults to 'dbscan'.
+            display (str, optional): 'table', 'plain' or 'none' for the signal display. Defaults to 'table'.
+            routing (str, optional): 'fanout' for the whole sweep exchanges, 'bands' for per band messages or 'both'. Defaults to 'both'.
+            bands (list, optional): (name, low MHz, high MHz) of the routed bands. Defaults to DEFAULT_BANDS.
+            ringName (str, optional): Also write scans and signals to shared memory rings <ringName>_scan and <ringName>_signal for consumers on this machine, None disables them. Defaults to None.
+            geoDir (str, optional): Folder to store position tagged scans and signals in, None disables it. Defaults to None.
+            position (str, optional): Position feed for the geo store, 'gpsd', 'gpsd:host:port', 'file:track.csv' or 'sim'. Defaults to 'gpsd'.
+            changeThreshold (float, optional): Occupancy similarity a sweep needs to reuse the last clustering, None always clusters. Defaults to 0.8.
+            recomputeEvery (int, optional): Sweeps between forced full clusterings. Defaults to 10.
+            historyTiers (list, optional): (sweeps per bucket, buckets kept) of the summary tiers kept after the clusterHistory window, like [(10, 30), (100, 33)] for about an hour. Defaults to None.
         """
 
+        if routing not in ('fanout', 'bands', 'both'):
+            raise ValueError(f"Unknown routing {routing}")
+        if clustering not in ('dbscan', 'none'):
+            raise ValueError(f"Unknown clustering backend {clustering}")
+        if display not in ('table', 'plain', 'none'):
+            raise ValueError(f"Unknown display backend {display}")
+
+        # the clustering modules load while the radio starts
+        self.clustering = clustering
+        self.display = display
+        if self.clustering != 'none':
+            warmUp(self.display)
+
         # rabbitMQ setup
         self.connection = pika.BlockingConnection(pika.ConnectionParameters(host='localhost'))
         self.channel = self.connection.channel()
         self.channel.exchange_declare(exchange='signalSweep', exchange_type='fanout')
         self.channel.exchange_declare(exchange='scanSweep', exchange_type='fanout')
+
+        # per band messages, consumers bind to routing keys like scan.2400
+        self.fanout = routing in ('fanout', 'both')
+        self.router = None
+        if routing in ('bands', 'both'):
+            self.router = BandRouter(DEFAULT_BANDS if bands is None else bands)
+            self.channel.exchange_declare(exchange=BAND_EXCHANGE, exchange_type='topic')
         
+        # shared memory rings, RabbitMQ stays for remote consumers
+        self.scanRing = None
+        self.signalRing = None
+        if ringName is not None:
+            self.scanRing = SweepRing(f"{ringName}_scan", columns=2)
+            self.signalRing = SweepRing(f"{ringName}_signal", capacity=1024, columns=8) # the signalFeatures columns
+
         # variable setup
         self.minFreq = int(minFreq)
         self.maxFreq = int(maxFreq)
@@ -59,8 +756,35 @@ class Cactus:
 
         # variables for clustering
         self.clusterHistory = clusterHistory
-        self.dataList = []
-        self.dbList = []
+        self.clusterer = SignalClusterer(clusterHistory, changeThreshold, recomputeEvery, historyTiers=historyTiers, binSize=self.binSize)
+
+        # one cluster thread works through the sweeps in order, the newest ones win if it falls behind
+        self.clusterQueue = queue.Queue(maxsize=2)
+        self.dataList = self.clusterer.dataList
+        self.dbList = self.clusterer.dbList
+
+        # optional full sweep recorder, writes happen on its own thread
+        self.recorder = None
+        if recordDir is not None:
+            self.recorder = SweepRecorder(recordDir, self.minFreq, self.maxFreq, self.binSize, dtype=recordFormat)
+
+        # optional geo tagged store for moving platforms, also written from its own thread
+        self.geoStore = None
+        if geoDir is not None:
+            self.geoStore = GeoStore(geoDir, openFeed(position), bands=DEFAULT_BANDS if bands is None else bands)
+
+        # optional stats outputs
+        if metricsPort is not None:
+            metrics.startMetricsServer(metricsPort)
+        if statsInterval is not None:
+            metrics.startStatsPublisher('cactus', statsInterval)
+
+        # profiling, SIGUSR1 profiles the next sweeps and SIGUSR2 dumps the per sweep timing trace
+        self.sweepId = 0
+        self.profiler = LoopProfiler('cactus', outputDir=profileDir)
+        self.profiler.installSignals()
+        if profileControl:
+            self.profiler.listenControl()
 
     def __publishScan(self, freqList, dbList):
         """
@@ -71,17 +795,22 @@ class Cactus:
             dbList (list): list of recorded power levels
         """
 
-        # initialize message and find min length
-        message = ''
-        listLen = min(len(freqList), len(dbList))
+        with PUBLISH_SCAN_SECONDS.time():
+            if self.scanRing is not None:
+                self.scanRing.write(np.column_stack((freqList, dbList)))
+
+            if self.geoStore is not None:
+                self.geoStore.addScan(freqList, dbList)
 
-        # build message
-        for i in range(listLen):
-            message += f"{str(freqList[i])} {str(dbList[i])} "
+            # transmit over RabbitMQ
+            if self.fanout:
+                message = formatScan(freqList, dbList)
+                if len(message) > 0: # check for string to not be empty
+                    self.channel.basic_publish(exchange='scanSweep', routing_key='', body=message)
 
-        # transmit over RabbitMQ
-        if len(message) > 0: # check for string to not be empty
-            self.channel.basic_publish(exchange='scanSweep', routing_key='', body=message)
+            if self.router is not None:
+                for key, message in bandScans(self.router, freqList, dbList):
+                    self.channel.basic_publish(exchange=BAND_EXCHANGE, routing_key=key, body=message)
         #print(message)
         #print('')
 
@@ -93,62 +822,20 @@ class Cactus:
             signalList (list): list of detected signals
         """
 
-        message = ''
-        for i in range(len(signalList)):
-            message += f"{str(signalList[i][0])} {str(signalList[i][1])} {str(signalList[i][2])} {str(signalList[i][3])} "
-
-        # transmit over RabbitMQ
-        if len(message) > 0: # check for string to not be empty
-            self.channel.basic_publish(exchange='signalSweep', routing_key='', body=message)
-        #print(message)
-
-    def __clusterData(self, dataList):
-        """
-        Generates clustering data
-
-        Args:
-            dataList (list): the list of data points to cluster
-
-        Returns:
-            list: list of clustered points
-        """
-
-        # gets distance from all neighbors
-        data = np.asarray(dataList)
-        neighbors = NearestNeighbors(n_neighbors=11).fit(data)
-        distances, indices = neighbors.kneighbors(data)
-        distances = np.sort(distances[:,len(distances[0])-1], axis=0)
-
-        # find knee point
-        knee = KneeLocator(np.arange(len(distances)), distances, S=1, curve='convex', direction='increasing', interp_method='polynomial')
-        #print(str(knee.knee))
-
-        #print(f"\n{str(len(data))} : {str(math.ceil(len(data) * 0.001) + 1)}")
+        with PUBLISH_SIGNAL_SECONDS.time():
+            if self.signalRing is not None:
+                self.signalRing.write(signalList)
 
-        # use knee point to calculate clusters
-        dbClusters = DBSCAN(eps=distances[knee.knee], min_samples=math.ceil(len(data) * 0.001) + 1).fit(data)
+            # transmit over RabbitMQ
+            if self.fanout:
+                message = formatSignals(signalList)
+                if len(message) > 0: # check for string to not be empty
+                    self.channel.basic_publish(exchange='signalSweep', routing_key='', body=message)
 
-        # Number of Clusters
-        nClusters=len(set(dbClusters.labels_))-(1 if -1 in dbClusters.labels_ else 0)
-        #print(str(nClusters))
-        
-        # creates a list of lists to hold each point in its cluster
-        clusterPoints = []
-        for i in range(nClusters):
-            clusterPoints.append([])
-
-        #print(str(clusterPoints))
-
-        # put each pixel in the cluster list its a part of
-        for i in range(len(dataList)):
-            if dbClusters.labels_[i] != -1: # if not a un-clustered point, add to list
-                clusterPoints[dbClusters.labels_[i]].append(dataList[i])
-         
-        # print method for debugging
-        #for i in range(len(clusterPoints)):
-            #print(str(len(clusterPoints[i])))
-
-        return clusterPoints
+            if self.router is not None:
+                for key, message in bandSignals(self.router, signalList):
+                    self.channel.basic_publish(exchange=BAND_EXCHANGE, routing_key=key, body=message)
+        #print(message)
 
     def signalCluster(self, newFreq, newDB):
         """
@@ -160,110 +847,72 @@ class Cactus:
             newDB (list): list of dBm associated with new frequencies
         """
 
-        # pair freqs and dB lists
-        #tempList = []
+        signalList, reused = self.clusterer.update(newFreq, newDB)
 
-        #for i in range(len(newFreq)):
-        #    tempList.append([newFreq[i], newDB[i]])
+        if signalList is not None:
 
-        #self.dataList.append(tempList)
-        self.dataList.append(newFreq)
-        self.dbList.append(newDB)
+            if len(signalList) > 0:
+                self.__publishSignal(signalList)
 
-        if (len(self.dataList) > self.clusterHistory) and (len(self.dbList) > self.clusterHistory):
+                # tagged with this sweep's strongest bin inside each signal
+                if self.geoStore is not None:
+                    self.geoStore.addSignals(signalList, newFreq, newDB)
 
-            self.dataList.pop(0)
-            self.dbList.pop(0)
-
-        extendedData = []
-        #for data in self.dataList:
-        #    extendedData.extend(data)
-        for i in range(len(self.dataList)):
-            for j in range(len(self.dataList[i])):
-                # data should look like [frequency, history row]
-                extendedData.append([self.dataList[i][j] / 1000000, self.dbList[i][j], i]) # convert to MHz to stop knee calc from going crazy
-                #extendedData.append([self.dataList[i][j] / 1000000, i]) # convert to MHz to stop knee calc from going crazy
-
-        if len(extendedData) > 12:
-            clusteredData = self.__clusterData(extendedData)
-            #print(f"Clusters: {str(len(clusteredData))}")
-            
-            # extract signal data from the cluster
-            signalList = []
-            pandaList = []
-            for cluster in clusteredData:
-                freq = []
-                bw = []
-                counterSet = set()
-                for i in range(len(cluster)):
-                    freq.append(cluster[i][0])
-                    bw.append(cluster[i][1])
-                    counterSet.add(cluster[i][2])
-
-                if len(freq) > 0:
-                    centerFreq = sum(freq) / len(freq)
-                else:
-                    centerFreq = 0
-                
-                bandWidth = max(freq) - min(freq)
-                
-                if max(counterSet) > 0:
-                    continuous =  (len(counterSet) / max(counterSet)) * 100
-                else:
-                    continuous =  0
-                powerDiff = max(bw) - min(bw)
-
-                if round(bandWidth) > 0: # not a dud target
-                    signalList.append([centerFreq, bandWidth, continuous, powerDiff])
-                    #print(f"{str(round(centerFreq))} : {str(round(bandWidth))}")
+            # a reused result is already on screen
+            if not reused:
+                displaySignals(signalList, self.display)
+    
+    def __clusterThread(self):
+        ''' clusters the queued sweeps in order, one at a time, each traced under its sweep id '''
 
-            if len(signalList) > 0:
-                self.__publishSignal(signalList)
+        while True:
+            sweepId, newFreq, newDB = self.clusterQueue.get()
+
+            CLUSTER_THREADS.inc()
+            try:
+                self.profiler.call(sweepId, 'cluster', self.signalCluster, newFreq, newDB)
+            finally:
+                CLUSTER_THREADS.dec()
+
+    def __queueCluster(self, sweepId, newFreq, newDB):
+        ''' hands a sweep to the cluster thread, dropping the oldest waiting one if clustering fell behind '''
+
+        try:
+            self.clusterQueue.put_nowait((sweepId, newFreq, newDB))
+        except queue.Full:
+            try:
+                self.clusterQueue.get_nowait()
+                CLUSTER_DROPPED.inc()
+            except queue.Empty: # the cluster thread just took it
+                pass
+            self.clusterQueue.put_nowait((sweepId, newFreq, newDB))
+
+    def sweepCommand(self):
+        """
+        Builds the hackrf_sweep command line
 
-            sorted(signalList, key=lambda x: x[0])
-            #print('')
-            for signal in signalList:
-                #print(f"{str(round(signal[0]))} : {str(round(signal[1]))} : {str(round(signal[2]))} : {str(round(signal[3]))}")
-                pandaList.append([str(round(signal[0])), str(round(signal[1])), str(round(signal[2])), str(round(signal[3]))])
-            
-            df = pd.DataFrame(pandaList, columns=["Center Frequency (MHz)", "Bandwidth (MHz)", "Continuous", "Power Difference"])
-            pd.set_option('display.colheader_justify', 'center')
+        Returns:
+            list: the program and its arguments
+        """
 
-            # Clear the terminal screen
-            os.system("cls" if os.name == "nt" else "clear")
+        return ["hackrf_sweep", f"-g {str(self.vgaGain)}", f"-l {str(self.lnaGain)}", f"-a {str(self.ampEnable)}", f"-f {str(self.minFreq)}:{str(self.maxFreq)}", f"-w {str(self.binSize)}"]
 
-            print(df)
-    
     def sweepFrequencies(self):
         ''' spawns the hackrf_sweep process and then acts on its output '''
 
-        self.bigSweep = subprocess.Popen(["hackrf_sweep", f"-g {str(self.vgaGain)}", f"-l {str(self.lnaGain)}", f"-a {str(self.ampEnable)}", f"-f {str(self.minFreq)}:{str(self.maxFreq)}", f"-w {str(self.binSize)}"], stderr=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        self.bigSweep = subprocess.Popen(self.sweepCommand(), stderr=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
         #self.bigSweep = subprocess.Popen(["hackrf_sweep", "-f 1:6000", "-w 1000000"], stderr=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
 
-        startFreq = str(self.minFreq * 1000000) # minFreq is in MHz, but output is in Hz
-
-        # temp values
-        temp50floor = float(0)
-        counter50percent = float(0)
-        temp25floor = float(0)
-        counter25percent = float(0)
-        temp12floor = float(0)
-        counter12percent = float(0)
-        temp6floor = float(0)
-        counter6percent = float(0)
-        temp3floor = float(0)
-        counter3percent = float(0)
-
-        floor50percent = float(-50)
-        floor25percent = float(-40)
-        floor12percent = float(-30)
-        floor6percent = float(-30)
-        floor3percent = float(-30)
+        # noise floor tracking and target collection
+        parser = SweepParser(self.minFreq, self.dbmAdjust)
 
-        # temp variables for high power stuff
-        tempFreq = []
-        tempDBM = []
-        
+        # start of the sweep in progress and its line parsing time, for timing
+        sweepStart = None
+        parseSeconds = 0.0
+
+        # full power vector of the sweep in progress, only when recording
+        if self.recorder is not None:
+            sweepVector = self.recorder.newVector()
 
         while True:
             #try:
@@ -272,162 +921,162 @@ class Cactus:
 
             if len(splitStr) >= 11: # reading a data string
 
-                temp50floor = temp50floor + float(splitStr[6]) + float(splitStr[7]) + float(splitStr[8]) + float(splitStr[9]) + float(splitStr[10])
-                counter50percent = counter50percent + 5
-
-                if splitStr[2] == startFreq: # check if a loop has finished
-
-                    # update noise floor
-                    if counter50percent > 0: # small edge case that counter is 0
-                        floor50percent = (temp50floor / counter50percent)
-                    if counter25percent > 0: # small edge case that counter is 0
-                        floor25percent = (temp25floor / counter25percent)
-                    if counter12percent > 0: # small edge case that counter is 0
-                        floor12percent = (temp12floor / counter12percent)
-                    if counter6percent > 0: # small edge case that counter is 0
-                        floor6percent = (temp6floor / counter6percent) 
-                    if counter3percent > 0: # small edge case that counter is 0
-                        floor3percent = (temp3floor / counter3percent) + self.dbmAdjust
-
-                    # spawn cluster thread
-                    Thread(target=self.signalCluster, args=(tempFreq, tempDBM), daemon=False).start()
+                lineStart = time.perf_counter()
+
+                completed = parser.parseLine(splitStr)
+
+                if completed is not None: # a loop has finished
+                    tempFreq, tempDBM = completed
+
+                    # sweep stats
+                    now = time.perf_counter()
+                    self.profiler.trace(self.sweepId, 'parse', parseSeconds)
+                    self.profiler.trace(self.sweepId, 'floor', parser.floorSeconds)
+                    parseSeconds = 0.0
+                    if sweepStart is not None:
+                        SWEEP_SECONDS.observe(now - sweepStart)
+                    sweepStart = now
+                    SWEEPS.inc()
+                    SWEEP_TARGETS.set(len(tempFreq))
+
+                    # hand off to the cluster thread
+                    if self.clustering != 'none':
+                        self.__queueCluster(self.sweepId, tempFreq, tempDBM)
                     
+                    publishStart = time.perf_counter()
                     self.__publishScan(freqList=tempFreq, dbList=tempDBM)
+                    self.profiler.trace(self.sweepId, 'publish', time.perf_counter() - publishStart)
+
+                    # hand the finished sweep to the recorder, never blocks
+                    if self.recorder is not None:
+                        self.recorder.record(time.time(), sweepVector)
+                        sweepVector = self.recorder.newVector()
+
+                    # next sweep, starts or stops a requested profile
+                    self.sweepId += 1
+                    self.profiler.tick(self.sweepId)
 
                     # display info for debugging
                     #localTime = time.asctime(time.localtime(time.time()))
                     #print(f"\nLoop completed at: {str(localTime)}")
-                    #print(f"New 50% floor: {str(floor50percent)}")
-                    #print(f"New 25% floor: {str(floor25percent)}")
-                    #print(f"New 12% floor: {str(floor12percent)}")
+                    #print(f"New 50% floor: {str(parser.floor50percent)}")
+                    #print(f"New 25% floor: {str(parser.floor25percent)}")
+                    #print(f"New 12% floor: {str(parser.floor12percent)}")
                     #print(f"Total High Power Targets: {str(len(tempFreq))}")
 
-                    # Reset temp variables
-                    counter50percent = float(0)
-                    temp50floor = float(0)
-                    temp25floor = float(0)
-                    counter25percent = float(0)
-                    temp12floor = float(0)
-                    counter12percent = float(0)
-                    temp6floor = float(0)
-                    counter6percent = float(0)
-                    temp3floor = float(0)
-                    counter3percent = float(0)
-                    tempFreq = []
-                    tempDBM = []
-             
-                if float(splitStr[6]) > floor50percent: # First frequency is worth checking out
-                    # update 25% Counter
-                    temp25floor = temp25floor + float(splitStr[6])
-                    counter25percent = counter25percent + 1
-
-                    if float(splitStr[6]) > floor25percent: # First frequency is worth checking out for HighPwr
-                        # update 12% Counter
-                        temp12floor = temp12floor + float(splitStr[6])
-                        counter12percent = counter12percent + 1
-
-                        if float(splitStr[6]) > floor12percent: # First frequency is worth checking out for HighPwr
-                            # update 6% Counter
-                            temp6floor = temp6floor + float(splitStr[6])
-                            counter6percent = counter6percent + 1
-
-                            if float(splitStr[6]) > floor6percent: # First frequency is a target
-                                tempFreq.append(int(splitStr[2]) + (0 * round(float(splitStr[4]))))
-                                tempDBM.append(float(splitStr[6]))
-
-                if float(splitStr[7]) > floor50percent: # Second frequency is worth checking out
-                    # update 25% Counter
-                    temp25floor = temp25floor + float(splitStr[7])
-                    counter25percent = counter25percent + 1
-
-                    if float(splitStr[7]) > floor25percent: # Second frequency is worth checking out for HighPwr
-                        # update 12% Counter
-                        temp12floor = temp12floor + float(splitStr[7])
-                        counter12percent = counter12percent + 1
-
-                        if float(splitStr[7]) > floor12percent: # Second frequency is worth checking out for HighPwr
-                            # update 6% Counter
-                            temp6floor = temp6floor + float(splitStr[7])
-                            counter6percent = counter6percent + 1
-
-                            if float(splitStr[7]) > floor6percent: # Second frequency is a target
-                                tempFreq.append(int(splitStr[2]) + (1 * round(float(splitStr[4]))))
-                                tempDBM.append(float(splitStr[7]))
-
-                if float(splitStr[8]) > floor50percent: # Third frequency is worth checking out
-                    # update 25% Counter
-                    temp25floor = temp25floor + float(splitStr[8])
-                    counter25percent = counter25percent + 1
-
-                    if float(splitStr[8]) > floor25percent: # Third frequency is worth checking out for HighPwr
-                        # update 12% Counter
-                        temp12floor = temp12floor + float(splitStr[8])
-                        counter12percent = counter12percent + 1
-
-                        if float(splitStr[8]) > floor12percent: # Third frequency is worth checking out for HighPwr
-                        # update 6% Counter
-                            temp6floor = temp6floor + float(splitStr[8])
-                            counter6percent = counter6percent + 1
-
-                            if float(splitStr[8]) > floor6percent: # Third frequency is a target
-                                tempFreq.append(int(splitStr[2]) + (2 * round(float(splitStr[4]))))
-                                tempDBM.append(float(splitStr[8]))
-
-                if float(splitStr[9]) > floor50percent: # Fourth frequency is worth checking out
-                    # update 25% Counter
-                    temp25floor = temp25floor + float(splitStr[9])
-                    counter25percent = counter25percent + 1
-
-                    if float(splitStr[9]) > floor25percent: # Fourth frequency is worth checking out for HighPwr
-                        # update 12% Counter
-                        temp12floor = temp12floor + float(splitStr[9])
-                        counter12percent = counter12percent + 1
-
-                        if float(splitStr[9]) > floor12percent: # Fourth frequency is worth checking out for HighPwr
-                            # update 6% Counter
-                            temp6floor = temp6floor + float(splitStr[9])
-                            counter6percent = counter6percent + 1
-
-                            if float(splitStr[9]) > floor6percent: # Fourth frequency is a target
-                                tempFreq.append(int(splitStr[2]) + (3 * round(float(splitStr[4]))))
-                                tempDBM.append(float(splitStr[9]))
-
-                if float(splitStr[10]) > floor50percent: # Fifth frequency is worth checking out
-                    # update 25% Counter
-                    temp25floor = temp25floor + float(splitStr[10])
-                    counter25percent = counter25percent + 1
-
-                    if float(splitStr[10]) > floor25percent: # Fifth frequency is worth checking out for HighPwr
-                        # update 12% Counter
-                        temp12floor = temp12floor + float(splitStr[10])
-                        counter12percent = counter12percent + 1
-
-                        if float(splitStr[10]) > floor12percent: # Fifth frequency is worth checking out for HighPwr
-                            # update 6% Counter
-                            temp6floor = temp6floor + float(splitStr[10])
-                            counter6percent = counter6percent + 1
-
-                            if float(splitStr[10]) > floor6percent: # Fifth frequency is a target
-                                tempFreq.append(int(splitStr[2]) + (4 * round(float(splitStr[4]))))
-                                tempDBM.append(float(splitStr[10]))                 
+                # keep every bin of the line for the recorder
+                if self.recorder is not None:
+                    self.recorder.addLine(sweepVector, int(splitStr[2]), splitStr[6:])
+
+                lineSeconds = time.perf_counter() - lineStart
+                LINE_SECONDS.observe(lineSeconds)
+                parseSeconds += lineSeconds
                 
             else:
                 print("Something went wrong with splitting bigSweep response")
                 print(str(splitStr))
                 self.bigSweep.kill()
                 self.connection.close()
+                if self.recorder is not None:
+                    self.recorder.close()
+                if self.geoStore is not None:
+                    self.geoStore.close()
+                for ring in (self.scanRing, self.signalRing):
+                    if ring is not None:
+                        ring.close()
                 sys.exit()
 
     def startSweeper(self):
         ''' spawns all the sweeper threads'''
 
+        if self.clustering != 'none':
+            self.clusterThread = Thread(target=self.__clusterThread, daemon=True)
+            self.clusterThread.start()
+
         self.sweepThread = Thread(target=self.sweepFrequencies, daemon=False)
         self.sweepThread.start()
         
-if __name__ == "__main__":
+# options only the threaded runtime has
+THREADED_ONLY = ('recordDir', 'geoDir', 'ringName', 'statsInterval', 'profileControl')
+
+def main(argv=None):
+    """
+    Command line entry point, runs the threaded runtime or the asyncio one with one sweep source per radio
+
+    Args:
+        argv (list, optional): arguments to parse. Defaults to sys.argv.
+    """
+
+    parser = argparse.ArgumentParser(description="Wide sweep with a HackRF, publishes scans and clustered signals over RabbitMQ")
+    parser.add_argument("--runtime", choices=["threads", "async"], default="threads", help="thread per sweep, or one event loop for every radio in --radios")
+    parser.add_argument("--radios", help="JSON file of per radio settings for the async runtime, like [{\"name\": \"hackrf0\", \"serial\": \"...\", \"maxFreq\": 3000}]")
+    parser.add_argument("--cluster-workers", dest="clusterWorkers", type=int, default=2, help="clustering threads shared by the async runtime's radios")
+    parser.add_argument("--min-freq", dest="minFreq", type=int, default=400, help="min frequency in MHz")
+    parser.add_argument("--max-freq", dest="maxFreq", type=int, default=6000, help="max frequency in MHz")
+    parser.add_argument("--amp", dest="ampEnable", type=int, default=1, help="0 disables the RF amplifier")
+    parser.add_argument("--lna-gain", dest="lnaGain", type=int, default=32, help="LNA gain, 0-40 dB")
+    parser.add_argument("--vga-gain", dest="vgaGain", type=int, default=20, help="VGA gain, 0-62 dB")
+    parser.add_argument("--bin-size", dest="binSize", type=int, default=100000, help="bin width in Hz")
+    parser.add_argument("--dbm-adjust", dest="dbmAdjust", type=float, default=0, help="added to the power cutoff")
+    parser.add_argument("--cluster-history", dest="clusterHistory", type=int, default=60, help="sweeps included when clustering")
+    parser.add_argument("--clustering", choices=["dbscan", "none"], default="dbscan", help="'none' only publishes scans")
+    parser.add_argument("--history-tiers", dest="historyTiers", help="summary tiers after the raw window, <sweeps per bucket>x<buckets> like 10x30,100x33 for about an hour")
+    parser.add_argument("--change-threshold", dest="changeThreshold", type=float, default=0.8, help="occupancy similarity a sweep needs to reuse the last clustering")
+    parser.add_argument("--recompute-every", dest="recomputeEvery", type=int, default=10, help="sweeps between forced full clusterings, 1 always clusters")
+    parser.add_argument("--display", choices=["table", "plain", "none"], default="table", help="how signals are shown")
+    parser.add_argument("--routing", choices=["fanout", "bands", "both"], default="both", help="whole sweep exchanges, per band routing keys or both")
+    parser.add_argument("--bands", help="JSON file of [name, low MHz, high MHz] bands to route")
+    parser.add_argument("--ring", dest="ringName", help="also write to shared memory rings with this name prefix for consumers on this machine")
+    parser.add_argument("--record-dir", dest="recordDir", help="folder to record every sweep into")
+    parser.add_argument("--record-format", dest="recordFormat", choices=["int8", "float16"], default="int8")
+    parser.add_argument("--geo-dir", dest="geoDir", help="folder to store position tagged scans and signals in")
+    parser.add_argument("--position", default="gpsd", help="position feed for --geo-dir: gpsd, gpsd:host:port, file:track.csv or sim")
+    parser.add_argument("--metrics-port", dest="metricsPort", type=int, help="port for Prometheus metrics")
+    parser.add_argument("--stats-interval", dest="statsInterval", type=float, help="seconds between stats messages")
+    parser.add_argument("--profile-dir", dest="profileDir", default="profiles", help="folder for profiles and traces")
+    parser.add_argument("--profile-control", dest="profileControl", action="store_true", help="accept profiling commands on the control exchange")
+    args = parseArgs(parser, 'cactus', argv)
+    if isinstance(args.bands, str): # a file, the config file can also list the bands directly
+        args.bands = loadBands(args.bands)
+    if isinstance(args.historyTiers, str):
+        args.historyTiers = parseTiers(args.historyTiers)
+    if isinstance(args.radios, str):
+        with open(args.radios, 'r') as infile:
+            args.radios = json.load(infile)
+
+    runtime = args.runtime
+    radios = args.radios
+    clusterWorkers = args.clusterWorkers
+    del args.runtime, args.radios, args.clusterWorkers
+
+    if runtime == 'async':
+        unsupported = [name for name in THREADED_ONLY if getattr(args, name) not in (None, False)]
+        if args.clustering == 'none':
+            unsupported.append('clustering')
+        if unsupported:
+            flags = {action.dest: action.option_strings[0] for action in parser._actions if action.option_strings}
+            parser.error(f"not supported by the async runtime: {', '.join(flags[name] for name in unsupported)}")
+
+        from cactusAsync import AsyncCactus, buildSources # aio_pika is only loaded for the async runtime
+
+        sources = buildSources(radios, minFreq=args.minFreq, maxFreq=args.maxFreq, ampEnable=args.ampEnable, lnaGain=args.lnaGain, vgaGain=args.vgaGain,
+                               binSize=args.binSize, dbmAdjust=args.dbmAdjust, clusterHistory=args.clusterHistory, changeThreshold=args.changeThreshold,
+                               recomputeEvery=args.recomputeEvery, historyTiers=args.historyTiers)
+
+        print(f"Starting CACTUS with {len(sources)} radio(s) on one event loop")
+        sweeper = AsyncCactus(sources, clusterWorkers=clusterWorkers, display=args.display, metricsPort=args.metricsPort, routing=args.routing, bands=args.bands)
+        sweeper.start()
+        return
+
+    if radios:
+        parser.error("--radios needs --runtime async")
 
     print("Starting CACTUS")
-    sweeper = Cactus(minFreq=400)
+    sweeper = Cactus(**vars(args))
 
     print(f"Beginning Sweeper at {str(time.asctime(time.localtime(time.time())))}")
-    sweeper.startSweeper()
\ No newline at end of file
+    sweeper.startSweeper()
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,355 @@
+# asyncio runtime for cactus, runs several sweep sources and consumers in one event loop
+
+import asyncio # needed for the event loop
+import signal # needed for clean shutdown
+import sys # needed for command line args
+import time # needed for timing
+import traceback # needed for reporting failed tasks
+from concurrent.futures import ThreadPoolExecutor # needed for clustering off the loop
+
+import aio_pika # needed for async rabbitMQ
+
+import metrics # needed for runtime stats
+from bands import BandRouter, DEFAULT_BANDS, BAND_EXCHANGE # needed for band routed publishing
+from cactus import SweepParser, SignalClusterer, formatScan, formatSignals, bandScans, bandSignals, displaySignals, warmUp # needed for the shared sweep logic
+from cactus import CLUSTER_DROPPED, SWEEPS, SWEEP_SECONDS, SWEEP_TARGETS, LINE_SECONDS, CLUSTER_THREADS, PUBLISH_SCAN_SECONDS, PUBLISH_SIGNAL_SECONDS # needed for the shared metrics
+
+CLUSTER_ERRORS = metrics.counter('cactus_cluster_errors_total', 'Sweeps whose clustering raised an error')
+
+class SweepSource:
+    """
+    Settings and state of one hackrf_sweep process
+    """
+
+    def __init__(self, name, minFreq=1, maxFreq=6000, ampEnable=1, lnaGain=32, vgaGain=20, binSize=100000, dbmAdjust=0, clusterHistory=60, serial=None, queueSize=2, changeThreshold=0.8, recomputeEvery=10, historyTiers=None):
+        """
+        Initialization method
+
+        Args:
+            name (str): Name used in messages, like 'hackrf0'
+            minFreq (int, optional): The min frequency to scan in MHz. Defaults to 1.
+            maxFreq (int, optional): The max frequency to scan in MHz. Defaults to 6000.
+            ampEnable (int, optional): Enables or disables the RX/TX RF amplifier. Defaults to 1.
+            lnaGain (int, optional): The RX LNA (IF) gain, 0-40dB, 8dB steps. Defaults to 32.
+            vgaGain (int, optional): The RX VGA (baseband) gain, 0-62dB, 2dB steps. Defaults to 20.
+            binSize (int, optional): The width of each frequency bin in Hertz. Defaults to 100000.
+            dbmAdjust (float, optional): Adds to the calculated power cutoff. Defaults to 0.
+            clusterHistory (int, optional): The amount of previous runs to include when clustering. Defaults to 60.
+            serial (str, optional): Serial number of the HackRF, needed when more than one is plugged in. Defaults to None.
+            queueSize (int, optional): Sweeps waiting for clustering before the oldest is dropped. Defaults to 2.
+            changeThreshold (float, optional): Occupancy similarity a sweep needs to reuse the last clustering, None always clusters. Defaults to 0.8.
+            recomputeEvery (int, optional): Sweeps between forced full clusterings. Defaults to 10.
+            historyTiers (list, optional): (sweeps per bucket, buckets kept) of the summary tiers kept after the clusterHistory window. Defaults to None.
+        """
+
+        self.name = name
+        self.minFreq = int(minFreq)
+        self.maxFreq = int(maxFreq)
+        self.ampEnable = int(ampEnable)
+        self.lnaGain = int(lnaGain)
+        self.vgaGain = int(vgaGain)
+        self.binSize = int(binSize)
+        self.dbmAdjust = float(dbmAdjust)
+        self.serial = serial
+
+        self.parser = SweepParser(self.minFreq, self.dbmAdjust)
+        self.clusterer = SignalClusterer(clusterHistory, changeThreshold, recomputeEvery, historyTiers=historyTiers, binSize=self.binSize)
+        self.queueSize = int(queueSize)
+        self.queue = None # made inside the running loop
+        self.process = None
+        self.sweepId = 0
+
+    def command(self):
+        """
+        Builds the hackrf_sweep command line
+
+        Returns:
+            list: the program and its arguments
+        """
+
+        command = ["hackrf_sweep", f"-g {str(self.vgaGain)}", f"-l {str(self.lnaGain)}", f"-a {str(self.ampEnable)}", f"-f {str(self.minFreq)}:{str(self.maxFreq)}", f"-w {str(self.binSize)}"]
+        if self.serial is not None:
+            command.append(f"-d {str(self.serial)}")
+        return command
+
+def buildSources(radios=None, **options):
+    """
+    Makes one SweepSource per radio, each radio's own settings win over the shared ones
+
+    Args:
+        radios (list, optional): dicts of SweepSource options like {"name": "hackrf1", "serial": "...", "minFreq": 2400}, None for a single radio. Defaults to None.
+        options: SweepSource options shared by every radio
+
+    Returns:
+        list: the SweepSources
+    """
+
+    if not radios:
+        radios = [{}]
+
+    sources = []
+    for number, radio in enumerate(radios):
+        settings = dict(options, **radio)
+        settings.setdefault('name', f"hackrf{number}")
+        sources.append(SweepSource(**settings))
+    return sources
+
+async def readLines(stream, readSize=65536):
+    """
+    Reads a stream in large chunks and yields its lines
+
+    Args:
+        stream (asyncio.StreamReader): the stream to read
+        readSize (int, optional): bytes per read. Defaults to 64 KiB.
+    """
+
+    remainder = ''
+    while True:
+        chunk = await stream.read(readSize)
+        if not chunk:
+            if remainder:
+                yield remainder
+            return
+
+        lines = (remainder + chunk.decode()).split('\n')
+        remainder = lines.pop() # partial line, finished by the next chunk
+        for line in lines:
+            yield line
+
+class AsyncCactus:
+    """
+    Event loop version of Cactus, sweeps, publishes and clusters without a thread per sweep
+    """
+
+    def __init__(self, sources, host='localhost', clusterWorkers=2, readSize=65536, display='table', metricsPort=None, routing='both', bands=None):
+        """
+        Initialization method
+
+        Args:
+            sources (list): the SweepSources to run
+            host (str, optional): the RabbitMQ host. Defaults to 'localhost'.
+            clusterWorkers (int, optional): Threads clustering runs on, shared by every source. Defaults to 2.
+            readSize (int, optional): Bytes read from hackrf_sweep at a time. Defaults to 64 KiB.
+            display (str, optional): 'table', 'plain' or 'none' for the signal display. Defaults to 'table'.
+            metricsPort (int, optional): Port to serve Prometheus metrics on, None to disable. Defaults to None.
+            routing (str, optional): 'fanout' for the whole sweep exchanges, 'bands' for per band messages or 'both'. Defaults to 'both'.
+            bands (list, optional): (name, low MHz, high MHz) of the routed bands. Defaults to DEFAULT_BANDS.
+        """
+
+        self.sources = list(sources)
+        self.host = host
+        self.readSize = int(readSize)
+        self.display = display
+        self.fanout = routing in ('fanout', 'both')
+        self.router = BandRouter(DEFAULT_BANDS if bands is None else bands) if routing in ('bands', 'both') else None
+        self.executor = ThreadPoolExecutor(max_workers=int(clusterWorkers), thread_name_prefix='cluster')
+        self.displayExecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='display') # one thread so sources don't draw over each other
+
+        self.consumers = [] # (exchange, callback, routing keys)
+        self.connection = None
+        self.exchanges = {}
+        self.tasks = []
+        self.stopEvent = None
+
+        if metricsPort is not None:
+            metrics.startMetricsServer(metricsPort)
+
+    def addConsumer(self, exchange, callback, routingKeys=None):
+        """
+        Subscribes a callback to an exchange once the loop is running
+
+        Args:
+            exchange (str): the exchange, like 'scanSweep', 'signalSweep' or BAND_EXCHANGE
+            callback (function): called with each message body, may be a coroutine function
+            routingKeys (list, optional): keys like 'scan.2400' to bind on the topic exchange, None for a fanout exchange. Defaults to None.
+        """
+
+        self.consumers.append((exchange, callback, routingKeys))
+
+    async def __publish(self, exchange, message, routingKey=''):
+        ''' publishes a message to one of the exchanges '''
+
+        if len(message) > 0: # check for string to not be empty
+            await self.exchanges[exchange].publish(aio_pika.Message(body=message.encode()), routing_key=routingKey)
+
+    async def __sweep(self, source):
+        ''' reads one hackrf_sweep process and hands each finished sweep on '''
+
+        source.process = await asyncio.create_subprocess_exec(*source.command(), stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+        sweepStart = None
+
+        async for line in readLines(source.process.stdout, self.readSize):
+            splitStr = line.split(", ")
+
+            if len(splitStr) < 11:
+                print(f"Something went wrong with splitting {source.name} response")
+                print(str(splitStr))
+                break
+
+            lineStart = time.perf_counter()
+            completed = source.parser.parseLine(splitStr)
+            LINE_SECONDS.observe(time.perf_counter() - lineStart)
+
+            if completed is None:
+                continue
+
+            tempFreq, tempDBM = completed
+
+            # sweep stats
+            now = time.perf_counter()
+            if sweepStart is not None:
+                SWEEP_SECONDS.observe(now - sweepStart)
+            sweepStart = now
+            SWEEPS.inc()
+            SWEEP_TARGETS.set(len(tempFreq))
+
+            # clustering only ever works on the newest sweeps, drop the oldest waiting one if it fell behind
+            if source.queue.full():
+                source.queue.get_nowait()
+                CLUSTER_DROPPED.inc()
+            source.queue.put_nowait((source.sweepId, tempFreq, tempDBM))
+            source.sweepId += 1
+
+            with PUBLISH_SCAN_SECONDS.time():
+                if self.fanout:
+                    await self.__publish('scanSweep', formatScan(tempFreq, tempDBM))
+                if self.router is not None:
+                    for key, message in bandScans(self.router, tempFreq, tempDBM):
+                        await self.__publish(BAND_EXCHANGE, message, key)
+
+        print(f"{source.name} stopped sweeping")
+        self.stop()
+
+    async def __cluster(self, source):
+        ''' clusters a source's sweeps in order, one at a time, on the executor '''
+
+        loop = asyncio.get_running_loop()
+
+        while True:
+            sweepId, newFreq, newDB = await source.queue.get()
+
+            CLUSTER_THREADS.inc()
+            try:
+                signalList, reused = await loop.run_in_executor(self.executor, source.clusterer.update, newFreq, newDB)
+            except Exception as e: # one bad sweep shouldn't stop the source
+                CLUSTER_ERRORS.inc()
+                print(f"{source.name} failed to cluster sweep {sweepId}: {e!r}")
+                continue
+            finally:
+                CLUSTER_THREADS.dec()
+
+            if signalList is None:
+                continue
+
+            if len(signalList) > 0:
+                with PUBLISH_SIGNAL_SECONDS.time():
+                    if self.fanout:
+                        await self.__publish('signalSweep', formatSignals(signalList))
+                    if self.router is not None:
+                        for key, message in bandSignals(self.router, signalList):
+                            await self.__publish(BAND_EXCHANGE, message, key)
+
+            # a reused result is already on screen, clearing and rendering the table stays off the loop
+            if not reused and self.display != 'none':
+                await loop.run_in_executor(self.displayExecutor, displaySignals, signalList, self.display)
+
+    async def __consume(self, exchange, callback, routingKeys):
+        ''' feeds every message of an exchange, or of its bound routing keys, to a callback '''
+
+        channel = await self.connection.channel()
+        queue = await channel.declare_queue('', exclusive=True)
+        if routingKeys is None:
+            await queue.bind(await channel.declare_exchange(exchange, aio_pika.ExchangeType.FANOUT))
+        else:
+            consumeExchange = await channel.declare_exchange(exchange, aio_pika.ExchangeType.TOPIC)
+            for key in routingKeys:
+                await queue.bind(consumeExchange, routing_key=key)
+
+        async with queue.iterator(no_ack=True) as messages:
+            async for message in messages:
+                result = callback(message.body)
+                if asyncio.iscoroutine(result):
+                    await result
+
+    def __taskDone(self, task):
+        ''' reports a task that died with an error and shuts down, the rest can't run without it '''
+
+        if task.cancelled() or task.exception() is None:
+            return
+
+        print(f"{task.get_name()} failed, stopping")
+        traceback.print_exception(task.exception())
+        self.stop()
+
+    def stop(self):
+        ''' Asks the runtime to shut down, safe to call from signal handlers and tasks '''
+
+        if self.stopEvent is not None:
+            self.stopEvent.set()
+
+    async def run(self):
+        ''' Connects, starts every source and consumer, and runs until stopped '''
+
+        loop = asyncio.get_running_loop()
+        self.stopEvent = asyncio.Event()
+        warmUp(self.display)
+
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, self.stop)
+            except (NotImplementedError, RuntimeError): # not on this platform or not the main thread
+                pass
+
+        self.connection = await aio_pika.connect_robust(host=self.host)
+        channel = await self.connection.channel()
+        for exchange in ('scanSweep', 'signalSweep'):
+            self.exchanges[exchange] = await channel.declare_exchange(exchange, aio_pika.ExchangeType.FANOUT)
+        self.exchanges[BAND_EXCHANGE] = await channel.declare_exchange(BAND_EXCHANGE, aio_pika.ExchangeType.TOPIC)
+
+        for source in self.sources:
+            source.queue = asyncio.Queue(maxsize=source.queueSize)
+            for task in (asyncio.create_task(self.__cluster(source), name=f"{source.name}-cluster"), asyncio.create_task(self.__sweep(source), name=f"{source.name}-sweep")):
+                task.add_done_callback(self.__taskDone)
+                self.tasks.append(task)
+
+        for exchange, callback, routingKeys in self.consumers:
+            self.tasks.append(asyncio.create_task(self.__consume(exchange, callback, routingKeys), name=f"{exchange}-consumer"))
+
+        try:
+            await self.stopEvent.wait()
+        finally:
+            await self.__shutdown()
+
+    async def __shutdown(self):
+        ''' cancels the tasks, stops the sweeps and closes the connection '''
+
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+        for source in self.sources:
+            if source.process is not None and source.process.returncode is None:
+                source.process.terminate()
+                try:
+                    await asyncio.wait_for(source.process.wait(), timeout=5)
+                except asyncio.TimeoutError:
+                    source.process.kill()
+                    await source.process.wait()
+
+        if self.connection is not None:
+            await self.connection.close()
+
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.displayExecutor.shutdown(wait=False, cancel_futures=True)
+
+    def start(self):
+        ''' Runs the event loop until SIGINT or SIGTERM '''
+
+        asyncio.run(self.run())
+
+if __name__ == "__main__":
+
+    import cactus # the command line lives with the threaded runtime
+
+    cactus.main(['--runtime', 'async'] + sys.argv[1:])
@@ -0,0 +1,48 @@
+# Command line options on top of a JSON config file, shared by the cactus entry points
+
+import json # needed for the config file
+
+def loadConfig(fileName, section):
+    """
+    Reads one program's section of a config file
+
+    Args:
+        fileName (str): JSON file like {"cactus": {"minFreq": 400}, "wifi": {"interface": ["wlan1"]}}
+        section (str): the program's section, like 'cactus' or 'wifi'
+
+    Returns:
+        dict: option name -> value, empty if the section is missing
+    """
+
+    with open(fileName, 'r') as infile:
+        config = json.load(infile)
+
+    return config.get(section, {})
+
+def parseArgs(parser, section, argv=None):
+    """
+    Parses the command line, options given there win over the config file and the config file wins over the defaults
+
+    Args:
+        parser (argparse.ArgumentParser): the program's options, their dest names are the config file keys
+        section (str): the program's section of the config file
+        argv (list, optional): arguments to parse. Defaults to sys.argv.
+
+    Returns:
+        argparse.Namespace: the options, without the config file name
+    """
+
+    parser.add_argument("--config", help=f"JSON file, options are read from its '{section}' section")
+    known, _ = parser.parse_known_args(argv)
+
+    if known.config is not None:
+        config = loadConfig(known.config, section)
+        names = {action.dest for action in parser._actions}
+        unknown = sorted(set(config) - names)
+        if unknown:
+            parser.error(f"unknown option(s) in {known.config}: {', '.join(unknown)}")
+        parser.set_defaults(**config)
+
+    args = parser.parse_args(argv)
+    del args.config
+    return args
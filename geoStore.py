@@ -0,0 +1,789 @@
+# Geo tagged detection store, cell sorted chunks with per chunk summaries so aggregations skip most of the data
+
+import os # needed for file paths
+import json # needed for the chunk index
+import queue # needed for the bounded write buffer
+import time # needed for timestamps
+import argparse # needed for command line options
+import fcntl # needed for sharing a store between writers
+from threading import Thread, Lock # needed for the writer thread
+
+import numpy as np # needed for the records and index
+
+from bands import BandRouter, DEFAULT_BANDS # needed for tagging bands
+
+# what an observation came from
+KIND_SCAN = 0
+KIND_SIGNAL = 1
+KIND_WIFI = 2
+KINDS = ('scan', 'signal', 'wifi')
+
+# scans aren't tied to one emitter, they only feed heatmaps
+NO_KEY = -1
+
+# one observation, freq in MHz and value in dBm
+RECORD = np.dtype([('time', 'f8'), ('lat', 'f8'), ('lon', 'f8'), ('freq', 'f8'), ('value', 'f4'), ('key', 'i4'), ('kind', 'u1'), ('band', 'u1')])
+
+# built when a chunk is sealed, the row of each key's strongest observation and the max and count per cell, band and kind
+KEY_SUMMARY = np.dtype([('key', 'i4'), ('row', 'i8')])
+TILE_SUMMARY = np.dtype([('cell', 'i8'), ('band', 'u1'), ('kind', 'u1'), ('max', 'f4'), ('count', 'i8')])
+
+def wifiFreq(channel):
+    """
+    Converts a wifi channel to its center frequency
+
+    Args:
+        channel (str or int): the channel
+
+    Returns:
+        float: center frequency in MHz, NaN if the channel isn't known
+    """
+
+    try:
+        ch = int(channel)
+    except (TypeError, ValueError):
+        return float('nan')
+
+    if 1 <= ch <= 13:
+        return 2407.0 + 5 * ch
+    if ch == 14:
+        return 2484.0
+    if 32 <= ch <= 177:
+        return 5000.0 + 5 * ch
+    return float('nan')
+
+class GeoStore:
+    """
+    Appends position tagged observations from a background thread and answers spatial and time aggregations.
+    Chunks are sorted by grid cell when they're sealed, so box queries read contiguous row ranges and whole chunk aggregates come from small summaries.
+    Several processes can write one store, each holds a lock on the chunk it's filling and key ids are handed out under a lock on keys.txt.
+    """
+
+    def __init__(self, directory, feed=None, cellDegrees=0.0005, bands=DEFAULT_BANDS, chunkRows=1 << 20, chunkSeconds=900, bufferBatches=4096, flushEvery=100, readOnly=False):
+        """
+        Initialization method
+
+        Args:
+            directory (str): Folder the store is written to, created if needed
+            feed (PositionFeed, optional): Where positions come from, observations without a fix are skipped. Defaults to None.
+            cellDegrees (float, optional): Size of a grid cell, 0.0005 is about 50 m. Defaults to 0.0005.
+            bands (list, optional): (name, low MHz, high MHz) observations are tagged with. Defaults to DEFAULT_BANDS.
+            chunkRows (int, optional): Observations in a chunk before it's sealed. Defaults to 1048576.
+            chunkSeconds (float, optional): Age a chunk is sealed at, keeps time pruning fine grained. Defaults to 900.
+            bufferBatches (int, optional): Batches that can wait for the writer before new ones are dropped. Defaults to 4096.
+            flushEvery (int, optional): Batches between flushing the open chunk and its index to disk. Defaults to 100.
+            readOnly (bool, optional): Only query, no writer thread. Defaults to False.
+        """
+
+        self.directory = str(directory)
+        self.feed = feed
+        self.chunkRows = int(chunkRows)
+        self.chunkSeconds = float(chunkSeconds)
+        self.flushEvery = int(flushEvery)
+
+        os.makedirs(self.directory, exist_ok=True)
+        info = self.__loadInfo(float(cellDegrees), bands)
+        self.cellDegrees = info['cellDegrees']
+        self.router = BandRouter(info['bands'])
+        self.gridWidth = int(round(360 / self.cellDegrees))
+
+        # key names, the line number in keys.txt is the id, writers append under a lock on the file
+        self.keyLock = Lock()
+        self.keyFile = os.path.join(self.directory, 'keys.txt')
+        self.keyNames = []
+        self.keyIds = {}
+        self.__readKeys()
+
+        # sealed chunks never change, so their indexes are loaded once
+        self.indexes = {}
+
+        self.dropped = 0
+        self.noFix = 0
+        self.recorded = 0
+
+        self.writerThread = None
+        if not readOnly:
+            self.chunkNumber = self.__nextChunkNumber()
+            self.chunk = None
+            self.batches = 0
+
+            # callers only ever do a non blocking put
+            self.buffer = queue.Queue(maxsize=int(bufferBatches))
+            self.writerThread = Thread(target=self.__writeLoop, daemon=True)
+            self.writerThread.start()
+
+    def __loadInfo(self, cellDegrees, bands):
+        ''' reads the grid and bands of an existing store, or writes them for a new one '''
+
+        infoFile = os.path.join(self.directory, 'store.json')
+        if not os.path.exists(infoFile):
+            info = {'cellDegrees': cellDegrees, 'bands': [[str(name), float(low), float(high)] for name, low, high in bands]}
+            tmpFile = f"{infoFile}.{os.getpid()}.tmp"
+            with open(tmpFile, 'w') as outfile:
+                json.dump(info, outfile)
+            try:
+                os.link(tmpFile, infoFile) # fails if another writer got there first, then its grid wins
+            except FileExistsError:
+                pass
+            finally:
+                os.remove(tmpFile)
+
+        with open(infoFile, 'r') as infile:
+            return json.load(infile)
+
+    def __readKeys(self):
+        ''' picks up keys added since the last read, the writer may be another process '''
+
+        if not os.path.exists(self.keyFile):
+            return
+        with open(self.keyFile, 'r') as infile:
+            names = infile.read().split('\n')[:-1] # the last piece is empty or a line still being written
+        for name in names[len(self.keyNames):]:
+            self.keyIds[name] = len(self.keyNames)
+            self.keyNames.append(name)
+
+    def keyId(self, name):
+        """
+        Gets the id of a key like a BSSID, adding it if it's new
+
+        Args:
+            name (str): the key
+
+        Returns:
+            int: the id stored with observations
+        """
+
+        keyId = self.keyIds.get(name)
+        if keyId is not None:
+            return keyId
+
+        with self.keyLock, open(self.keyFile, 'a') as outfile:
+            # another writer may have added keys, so the ids are only settled under the file lock
+            fcntl.flock(outfile, fcntl.LOCK_EX)
+            try:
+                self.__readKeys()
+                if name not in self.keyIds:
+                    outfile.write(name + '\n')
+                    outfile.flush()
+                    self.keyIds[name] = len(self.keyNames)
+                    self.keyNames.append(name)
+            finally:
+                fcntl.flock(outfile, fcntl.LOCK_UN)
+            return self.keyIds[name]
+
+    def keyName(self, keyId):
+        ''' Gets the key for an id, None for NO_KEY '''
+
+        if keyId < 0:
+            return None
+        if keyId >= len(self.keyNames):
+            self.__readKeys()
+        return self.keyNames[keyId]
+
+    def cellIndex(self, lat, lon):
+        """
+        Finds the grid cell of positions
+
+        Args:
+            lat (numpy.ndarray): latitudes in degrees
+            lon (numpy.ndarray): longitudes in degrees
+
+        Returns:
+            numpy.ndarray: cell ids, row major from the south west corner
+        """
+
+        row, col = self.__rowCol(lat, lon)
+        return row * self.gridWidth + col
+
+    def __rowCol(self, lat, lon):
+        ''' grid row and column of positions '''
+
+        row = np.floor((np.asarray(lat, dtype=np.float64) + 90) / self.cellDegrees).astype(np.int64)
+        col = np.floor((np.asarray(lon, dtype=np.float64) + 180) / self.cellDegrees).astype(np.int64)
+        return row, np.clip(col, 0, self.gridWidth - 1)
+
+    def observe(self, kind, freqs, values, keys=None, timestamp=None, position=None):
+        """
+        Tags a batch of observations with the current position and hands it to the writer without blocking
+
+        Args:
+            kind (int): KIND_SCAN, KIND_SIGNAL or KIND_WIFI
+            freqs (list): frequency of each observation in MHz
+            values (list): dBm of each observation
+            keys (list, optional): key id of each observation, None for NO_KEY. Defaults to None.
+            timestamp (float, optional): seconds since the epoch. Defaults to now.
+            position (tuple, optional): (lat, lon) to use instead of the feed. Defaults to None.
+
+        Returns:
+            bool: False if there was no fix or the buffer was full
+        """
+
+        if position is None:
+            position = None if self.feed is None else self.feed.position()
+            if position is None:
+                self.noFix += 1
+                return False
+
+        batch = np.zeros(len(freqs), dtype=RECORD)
+        if len(batch) == 0:
+            return True
+        batch['time'] = time.time() if timestamp is None else timestamp
+        batch['lat'] = position[0]
+        batch['lon'] = position[1]
+        batch['freq'] = freqs
+        batch['value'] = values
+        batch['key'] = NO_KEY if keys is None else keys
+        batch['kind'] = kind
+        batch['band'] = self.router.bandIndex(batch['freq'])
+
+        try:
+            self.buffer.put_nowait(batch)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def addScan(self, freqList, dbList):
+        """
+        Stores a scan as the peak of each band, every bin of every sweep would be far more than heatmaps need
+
+        Args:
+            freqList (list): list of frequencies in Hz
+            dbList (list): list of recorded power levels
+        """
+
+        freqs = np.asarray(freqList, dtype=np.float64) / 1000000
+        values = np.asarray(dbList, dtype=np.float64)
+        if len(freqs) == 0:
+            return False
+
+        band = self.router.bandIndex(freqs)
+        order = np.lexsort((-values, band))
+        _, first = np.unique(band[order], return_index=True)
+        peaks = order[first]
+        return self.observe(KIND_SCAN, freqs[peaks], values[peaks])
+
+    def addSignals(self, signalList, freqList, dbList):
+        """
+        Stores clustered signals at the strongest power this sweep saw inside each one
+
+        Args:
+            signalList (list): list of [center frequency, bandwidth, ...] in MHz
+            freqList (list): the sweep's frequencies in Hz
+            dbList (list): the sweep's power levels
+        """
+
+        if len(signalList) == 0 or len(freqList) == 0:
+            return False
+
+        signals = np.asarray(signalList, dtype=np.float64)[:, :2]
+        freqs = np.asarray(freqList, dtype=np.float64) / 1000000
+        order = np.argsort(freqs)
+        freqs = freqs[order]
+        values = np.asarray(dbList, dtype=np.float64)[order]
+
+        # bins inside each signal, signals this sweep didn't hear aren't stored
+        starts = np.searchsorted(freqs, signals[:, 0] - signals[:, 1] / 2, side='left')
+        ends = np.searchsorted(freqs, signals[:, 0] + signals[:, 1] / 2, side='right')
+        heard = np.flatnonzero(ends > starts)
+        if len(heard) == 0:
+            return False
+
+        strongest = np.maximum.reduceat(np.r_[values, -np.inf], np.column_stack((starts[heard], ends[heard])).ravel())[::2]
+        keys = [self.keyId(f"signal:{signals[i, 0]:.1f}") for i in heard]
+        return self.observe(KIND_SIGNAL, signals[heard, 0], strongest, keys)
+
+    def addWifi(self, bssid, dBm, channel):
+        """
+        Stores one beacon
+
+        Args:
+            bssid (str): the network's MAC address
+            dBm (float): received power, anything that isn't a number is stored as NaN
+            channel (str or int): the channel it was heard on
+        """
+
+        try:
+            value = float(dBm)
+        except (TypeError, ValueError):
+            value = float('nan')
+        return self.observe(KIND_WIFI, [wifiFreq(channel)], [value], [self.keyId(str(bssid))])
+
+    def close(self):
+        ''' Writes out everything still buffered and seals the open chunk '''
+
+        if self.writerThread is not None:
+            self.buffer.put(None)
+            self.writerThread.join()
+            self.writerThread = None
+        if self.feed is not None:
+            self.feed.close()
+
+    def __nextChunkNumber(self):
+        ''' finds the chunk number after the last one, sealing any chunk a crashed writer left open '''
+
+        numbers = []
+        for base, meta in self.chunks():
+            numbers.append(int(os.path.basename(base)[6:12]))
+            if not meta['sealed']:
+                self.__recoverChunk(base)
+        return max(numbers) + 1 if numbers else 0
+
+    def __recoverChunk(self, base):
+        ''' seals an open chunk if no writer holds its lock, a live writer's chunk is left alone '''
+
+        with open(base + '.lock', 'a') as lockFile:
+            try:
+                fcntl.flock(lockFile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError: # its writer is still running
+                return
+
+            # another writer may have sealed it between listing and locking
+            with open(base + '.json', 'r') as infile:
+                meta = json.load(infile)
+            if meta['sealed']:
+                return
+
+            records = np.memmap(base + '.rec', dtype=RECORD, mode='r', shape=(meta['rows'],))
+            self.__sealChunk({'base': base, 'records': records, 'rows': meta['rows'], 'startTime': meta['startTime'], 'endTime': meta['endTime']})
+            os.remove(base + '.lock')
+
+    def __openChunk(self):
+        ''' creates the record memmap for a new chunk, skipping numbers other writers have taken '''
+
+        while True:
+            base = os.path.join(self.directory, f"chunk_{self.chunkNumber:06d}")
+            try:
+                fd = os.open(base + '.rec', os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o644)
+                break
+            except FileExistsError:
+                self.chunkNumber += 1
+
+        # held until the chunk is sealed, so a writer starting up doesn't seal it under us
+        lockFile = open(base + '.lock', 'a')
+        fcntl.flock(lockFile, fcntl.LOCK_EX)
+
+        with os.fdopen(fd, 'r+b') as recFile:
+            recFile.truncate(self.chunkRows * RECORD.itemsize)
+
+        self.chunk = {
+            'base': base,
+            'lock': lockFile,
+            'records': np.memmap(base + '.rec', dtype=RECORD, mode='r+', shape=(self.chunkRows,)),
+            'rows': 0,
+            'startTime': None,
+            'endTime': None,
+            'opened': time.time(),
+        }
+
+    def __writeMeta(self, base, meta):
+        ''' write then rename so a reader never sees a half written index '''
+
+        with open(base + '.json.tmp', 'w') as outfile:
+            json.dump(meta, outfile)
+        os.replace(base + '.json.tmp', base + '.json')
+
+    def __flushChunk(self):
+        ''' flushes the open chunk so queries see it, it's scanned in full until it's sealed '''
+
+        chunk = self.chunk
+        chunk['records'].flush()
+        self.__writeMeta(chunk['base'], {'rows': chunk['rows'], 'startTime': chunk['startTime'], 'endTime': chunk['endTime'], 'sealed': False})
+
+    def __sealChunk(self, chunk):
+        ''' sorts a finished chunk by cell and writes its cell index and summaries '''
+
+        base = chunk['base']
+        rows = chunk['rows']
+        records = np.array(chunk['records'][:rows])
+        chunk['records'] = None
+
+        cells = self.cellIndex(records['lat'], records['lon'])
+        order = np.argsort(cells, kind='stable')
+        records = records[order]
+        cells = cells[order]
+
+        # first row of every occupied cell
+        uniqueCells, starts = np.unique(cells, return_index=True)
+        starts = np.r_[starts, rows].astype(np.int64)
+
+        # strongest row of every key, NaN powers sort last
+        keyed = np.flatnonzero(records['key'] >= 0)
+        byKey = keyed[np.lexsort((-records['value'][keyed], records['key'][keyed]))]
+        _, first = np.unique(records['key'][byKey], return_index=True)
+        keys = np.zeros(len(first), dtype=KEY_SUMMARY)
+        keys['key'] = records['key'][byKey[first]]
+        keys['row'] = byKey[first]
+
+        # max and count per cell, band and kind, cell is the most significant part so tiles stay in cell order
+        groups, inverse = np.unique((cells * 256 + records['band']) * 4 + records['kind'], return_inverse=True)
+        maxes = np.full(len(groups), np.nan, dtype=np.float32)
+        np.fmax.at(maxes, inverse, records['value'])
+        tiles = np.zeros(len(groups), dtype=TILE_SUMMARY)
+        tiles['cell'] = groups // 1024
+        tiles['band'] = (groups // 4) % 256
+        tiles['kind'] = groups % 4
+        tiles['max'] = maxes
+        tiles['count'] = np.bincount(inverse, minlength=len(groups))
+
+        records.tofile(base + '.rec.tmp')
+        with open(base + '.idx.tmp', 'wb') as outfile:
+            np.savez(outfile, cells=uniqueCells, starts=starts, keys=keys, tiles=tiles)
+        os.replace(base + '.idx.tmp', base + '.idx.npz')
+        os.replace(base + '.rec.tmp', base + '.rec')
+
+        bbox = [float(records['lat'].min()), float(records['lon'].min()), float(records['lat'].max()), float(records['lon'].max())] if rows else None
+        self.__writeMeta(base, {'rows': rows, 'startTime': chunk['startTime'], 'endTime': chunk['endTime'], 'sealed': True, 'bbox': bbox})
+
+    def __closeChunk(self):
+        ''' seals the open chunk, releases it and moves on to the next number '''
+
+        self.__sealChunk(self.chunk)
+        os.remove(self.chunk['base'] + '.lock')
+        self.chunk['lock'].close()
+        self.chunk = None
+        self.chunkNumber += 1
+
+    def __writeLoop(self):
+        ''' writer thread, drains the buffer into the open chunk '''
+
+        while True:
+            batch = self.buffer.get()
+
+            if batch is None: # close was called
+                if self.chunk is not None:
+                    self.__closeChunk()
+                return
+
+            while len(batch) > 0:
+                if self.chunk is None:
+                    self.__openChunk()
+
+                chunk = self.chunk
+                row = chunk['rows']
+                count = min(len(batch), self.chunkRows - row)
+                part = batch[:count]
+                chunk['records'][row:row + count] = part
+                chunk['rows'] = row + count
+                low = float(part['time'].min())
+                high = float(part['time'].max())
+                chunk['startTime'] = low if chunk['startTime'] is None else min(chunk['startTime'], low)
+                chunk['endTime'] = high if chunk['endTime'] is None else max(chunk['endTime'], high)
+                self.recorded += count
+                batch = batch[count:]
+
+                if chunk['rows'] >= self.chunkRows or time.time() - chunk['opened'] > self.chunkSeconds:
+                    self.__closeChunk()
+
+            self.batches += 1
+            if self.chunk is not None and self.batches % self.flushEvery == 0:
+                self.__flushChunk()
+
+    def chunks(self):
+        """
+        Reads the chunk index, re-read every query so a live store can be queried
+
+        Returns:
+            list: (base path, meta dict) for every chunk holding rows, oldest first
+        """
+
+        chunkList = []
+        for name in sorted(os.listdir(self.directory)):
+            if name.startswith('chunk_') and name.endswith('.json'):
+                with open(os.path.join(self.directory, name), 'r') as infile:
+                    meta = json.load(infile)
+                if meta['rows'] > 0:
+                    chunkList.append((os.path.join(self.directory, name[:-5]), meta))
+        return chunkList
+
+    def __index(self, base):
+        ''' cell index and summaries of a sealed chunk '''
+
+        index = self.indexes.get(base)
+        if index is None:
+            with np.load(base + '.idx.npz') as arrays:
+                index = {name: arrays[name] for name in ('cells', 'starts', 'keys', 'tiles')}
+            self.indexes[base] = index
+        return index
+
+    def __cellSpans(self, sortedCells, bbox):
+        """
+        Finds the stretches of a cell sorted array inside a box, one per grid row
+
+        Returns:
+            tuple: (start indexes, end indexes), None when the box spans more grid rows than there are cells and a scan is cheaper
+        """
+
+        minLat, minLon, maxLat, maxLon = bbox
+        (firstRow, lastRow), (firstCol, lastCol) = self.__rowCol([minLat, maxLat], [minLon, maxLon])
+        if lastRow - firstRow + 1 > len(sortedCells):
+            return None
+
+        gridRows = np.arange(firstRow, lastRow + 1) * self.gridWidth
+        starts = np.searchsorted(sortedCells, gridRows + firstCol, side='left')
+        ends = np.searchsorted(sortedCells, gridRows + lastCol, side='right')
+        keep = ends > starts
+        return starts[keep], ends[keep]
+
+    @staticmethod
+    def __overlaps(meta, bbox, startTime, endTime):
+        ''' chunk level pruning on the time range and bounding box '''
+
+        if startTime is not None and meta['endTime'] < startTime:
+            return False
+        if endTime is not None and meta['startTime'] > endTime:
+            return False
+        if bbox is not None and meta.get('bbox') is not None:
+            minLat, minLon, maxLat, maxLon = meta['bbox']
+            if minLat > bbox[2] or maxLat < bbox[0] or minLon > bbox[3] or maxLon < bbox[1]:
+                return False
+        return True
+
+    @staticmethod
+    def __covers(meta, bbox, startTime, endTime):
+        ''' True when a sealed chunk is entirely inside the query, so its summaries answer it '''
+
+        if not meta['sealed']:
+            return False
+        if startTime is not None and meta['startTime'] < startTime:
+            return False
+        if endTime is not None and meta['endTime'] > endTime:
+            return False
+        if bbox is not None:
+            minLat, minLon, maxLat, maxLon = meta['bbox']
+            if minLat < bbox[0] or minLon < bbox[1] or maxLat > bbox[2] or maxLon > bbox[3]:
+                return False
+        return True
+
+    def __chunkRecords(self, base, meta, bbox):
+        ''' records of a chunk that can be in the box, only the matching cells are read from sealed chunks '''
+
+        records = np.memmap(base + '.rec', dtype=RECORD, mode='r', shape=(meta['rows'],))
+        if bbox is None or not meta['sealed']:
+            return np.array(records) # the open chunk is bounded by chunkRows
+
+        index = self.__index(base)
+        spans = self.__cellSpans(index['cells'], bbox)
+        if spans is None:
+            return np.array(records)
+
+        starts = index['starts']
+        return np.concatenate([records[starts[start]:starts[end]] for start, end in zip(*spans)] + [np.zeros(0, dtype=RECORD)])
+
+    def __filter(self, records, bbox, startTime, endTime, kind=None, key=None, band=None):
+        ''' exact row filter after the index has narrowed things down '''
+
+        mask = np.ones(len(records), dtype=bool)
+        if bbox is not None:
+            mask &= (records['lat'] >= bbox[0]) & (records['lat'] <= bbox[2]) & (records['lon'] >= bbox[1]) & (records['lon'] <= bbox[3])
+        if startTime is not None:
+            mask &= records['time'] >= startTime
+        if endTime is not None:
+            mask &= records['time'] <= endTime
+        if kind is not None:
+            mask &= records['kind'] == kind
+        if key is not None:
+            mask &= records['key'] == key
+        if band is not None:
+            mask &= records['band'] == band
+        return records[mask]
+
+    def kindIndex(self, kind):
+        ''' Accepts a kind name or number, None for any '''
+
+        if kind is None or isinstance(kind, (int, np.integer)):
+            return kind
+        return KINDS.index(kind)
+
+    def observations(self, bbox=None, startTime=None, endTime=None, kind=None, key=None):
+        """
+        Gets the raw observations in a box and time range
+
+        Args:
+            bbox (tuple, optional): (min lat, min lon, max lat, max lon), None for everywhere. Defaults to None.
+            startTime (float, optional): seconds since the epoch. Defaults to the start of the store.
+            endTime (float, optional): seconds since the epoch. Defaults to the end of the store.
+            kind (str, optional): 'scan', 'signal' or 'wifi', None for all. Defaults to None.
+            key (str, optional): only this BSSID or signal key. Defaults to None.
+
+        Returns:
+            numpy.ndarray: RECORD array
+        """
+
+        kind = self.kindIndex(kind)
+        keyId = None
+        if key is not None:
+            self.__readKeys()
+            keyId = self.keyIds.get(key)
+            if keyId is None:
+                return np.zeros(0, dtype=RECORD)
+
+        found = [np.zeros(0, dtype=RECORD)]
+        for base, meta in self.chunks():
+            if not self.__overlaps(meta, bbox, startTime, endTime):
+                continue
+            if keyId is not None and meta['sealed'] and keyId not in self.__index(base)['keys']['key']:
+                continue
+            found.append(self.__filter(self.__chunkRecords(base, meta, bbox), bbox, startTime, endTime, kind, keyId))
+        return np.concatenate(found)
+
+    def strongest(self, kind=None, key=None, bbox=None, startTime=None, endTime=None):
+        """
+        Where each BSSID or signal was strongest
+
+        Args:
+            kind (str, optional): 'signal' or 'wifi', None for both. Defaults to None.
+            key (str, optional): only this BSSID or signal key. Defaults to None.
+            bbox (tuple, optional): (min lat, min lon, max lat, max lon), None for everywhere. Defaults to None.
+            startTime (float, optional): seconds since the epoch. Defaults to the start of the store.
+            endTime (float, optional): seconds since the epoch. Defaults to the end of the store.
+
+        Returns:
+            dict: key -> {'kind', 'value', 'lat', 'lon', 'freq', 'band', 'time'}
+        """
+
+        kind = self.kindIndex(kind)
+        self.__readKeys()
+        keyId = None
+        if key is not None:
+            keyId = self.keyIds.get(key)
+            if keyId is None:
+                return {}
+
+        candidates = [np.zeros(0, dtype=RECORD)]
+        for base, meta in self.chunks():
+            if not self.__overlaps(meta, bbox, startTime, endTime):
+                continue
+
+            if self.__covers(meta, bbox, startTime, endTime):
+                # the chunk's own strongest rows answer it, only those rows are read
+                summary = self.__index(base)['keys']
+                if keyId is not None:
+                    summary = summary[summary['key'] == keyId]
+                records = np.memmap(base + '.rec', dtype=RECORD, mode='r', shape=(meta['rows'],))
+                candidates.append(self.__filter(records[summary['row']], None, None, None, kind))
+            else:
+                records = self.__filter(self.__chunkRecords(base, meta, bbox), bbox, startTime, endTime, kind, keyId)
+                candidates.append(records[records['key'] >= 0])
+
+        candidates = np.concatenate(candidates)
+        order = np.lexsort((-candidates['value'], candidates['key']))
+        _, first = np.unique(candidates['key'][order], return_index=True)
+
+        results = {}
+        for record in candidates[order[first]]:
+            results[self.keyName(int(record['key']))] = {
+                'kind': KINDS[record['kind']],
+                'value': float(record['value']),
+                'lat': float(record['lat']),
+                'lon': float(record['lon']),
+                'freq': float(record['freq']),
+                'band': self.router.names[record['band']],
+                'time': float(record['time']),
+            }
+        return results
+
+    def heatmap(self, band, bbox, tileCells=1, kind=None, startTime=None, endTime=None):
+        """
+        Max power and observation count per tile for one band
+
+        Args:
+            band (str): band name, like '2400'
+            bbox (tuple): (min lat, min lon, max lat, max lon)
+            tileCells (int, optional): Grid cells along each side of a tile. Defaults to 1.
+            kind (str, optional): 'scan', 'signal' or 'wifi', None for all. Defaults to None.
+            startTime (float, optional): seconds since the epoch. Defaults to the start of the store.
+            endTime (float, optional): seconds since the epoch. Defaults to the end of the store.
+
+        Returns:
+            dict: 'values' (max dBm, NaN for empty tiles) and 'counts', both indexed [row from the south, column from the west],
+                plus 'lat' and 'lon' of the south west corner and 'tileDegrees'
+        """
+
+        kind = self.kindIndex(kind)
+        bandId = self.router.names.index(str(band))
+        tileCells = max(1, int(tileCells))
+
+        (firstRow, lastRow), (firstCol, lastCol) = self.__rowCol([bbox[0], bbox[2]], [bbox[1], bbox[3]])
+        shape = ((lastRow - firstRow) // tileCells + 1, (lastCol - firstCol) // tileCells + 1)
+        values = np.full(shape, np.nan, dtype=np.float32)
+        counts = np.zeros(shape, dtype=np.int64)
+
+        def accumulate(cells, cellMax, cellCount):
+            row = cells // self.gridWidth
+            col = cells % self.gridWidth
+            inside = (row >= firstRow) & (row <= lastRow) & (col >= firstCol) & (col <= lastCol)
+            tile = ((row[inside] - firstRow) // tileCells, (col[inside] - firstCol) // tileCells)
+            np.fmax.at(values, tile, cellMax[inside])
+            np.add.at(counts, tile, cellCount[inside])
+
+        for base, meta in self.chunks():
+            if not self.__overlaps(meta, bbox, startTime, endTime):
+                continue
+
+            if self.__covers(meta, None, startTime, endTime):
+                # whole chunk in the time range, the per cell summary is enough
+                tiles = self.__index(base)['tiles']
+                spans = self.__cellSpans(tiles['cell'], bbox)
+                if spans is not None:
+                    tiles = np.concatenate([tiles[start:end] for start, end in zip(*spans)] + [np.zeros(0, dtype=TILE_SUMMARY)])
+                mask = tiles['band'] == bandId
+                if kind is not None:
+                    mask &= tiles['kind'] == kind
+                tiles = tiles[mask]
+                accumulate(tiles['cell'], tiles['max'], tiles['count'])
+            else:
+                # cut at cell edges like the summaries, accumulate drops cells outside the box
+                records = self.__filter(self.__chunkRecords(base, meta, bbox), None, startTime, endTime, kind, band=bandId)
+                accumulate(self.cellIndex(records['lat'], records['lon']), records['value'], np.ones(len(records), dtype=np.int64))
+
+        return {
+            'values': values,
+            'counts': counts,
+            'lat': firstRow * self.cellDegrees - 90,
+            'lon': firstCol * self.cellDegrees - 180,
+            'tileDegrees': tileCells * self.cellDegrees,
+        }
+
+def parseBox(value):
+    ''' Reads a 'min lat,min lon,max lat,max lon' box '''
+
+    if value is None:
+        return None
+    box = tuple(float(part) for part in value.split(','))
+    if len(box) != 4:
+        raise argparse.ArgumentTypeError("a box is min lat,min lon,max lat,max lon")
+    return box
+
+if __name__ == "__main__":
+
+    from sweepQuery import parseTime # same time formats as the sweep archive
+
+    parser = argparse.ArgumentParser(description="Query a geo tagged detection store")
+    parser.add_argument("directory", help="store folder written by cactus or the wifi scanner")
+    parser.add_argument("query", choices=["strongest", "heatmap"])
+    parser.add_argument("--kind", choices=KINDS, help="only this kind of observation")
+    parser.add_argument("--key", help="only this BSSID or signal key, like signal:433.9")
+    parser.add_argument("--band", help="band name for heatmaps")
+    parser.add_argument("--box", type=parseBox, help="min lat,min lon,max lat,max lon")
+    parser.add_argument("--tile", type=int, default=1, help="grid cells along each side of a heatmap tile")
+    parser.add_argument("--start", help="start time, epoch seconds or ISO")
+    parser.add_argument("--end", help="end time, epoch seconds or ISO")
+    args = parser.parse_args()
+
+    store = GeoStore(args.directory, readOnly=True)
+    startTime = parseTime(args.start)
+    endTime = parseTime(args.end)
+
+    if args.query == "strongest":
+        for key, best in sorted(store.strongest(args.kind, args.key, args.box, startTime, endTime).items()):
+            print(f"{key} : {best['kind']} : {best['value']:.1f} dBm : {best['lat']:.6f}, {best['lon']:.6f} : {best['freq']:.3f} MHz")
+    else:
+        if args.band is None or args.box is None:
+            parser.error("heatmap needs --band and --box")
+        heat = store.heatmap(args.band, args.box, args.tile, args.kind, startTime, endTime)
+        rows, cols = np.nonzero(heat['counts'])
+        for row, col in zip(rows, cols):
+            lat = heat['lat'] + (row + 0.5) * heat['tileDegrees']
+            lon = heat['lon'] + (col + 0.5) * heat['tileDegrees']
+            print(f"{lat:.6f}, {lon:.6f} : {heat['values'][row, col]:.1f} dBm : {heat['counts'][row, col]}")
@@ -0,0 +1,273 @@
+# Lightweight counters, gauges and histograms for the cactus modules
+
+import time # needed for timing
+import json # needed for the stats messages
+import bisect # needed for histogram buckets
+from threading import Thread, Lock # needed for thread safety
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer # needed for the metrics endpoint
+
+# seconds, covers per packet parsing up to a slow clustering run
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+
+class Counter:
+    ''' Value that only goes up '''
+
+    kind = 'counter'
+
+    def __init__(self, name, help=''):
+        self.name = name
+        self.help = help
+        self.value = 0
+        self.lock = Lock()
+
+    def inc(self, amount=1):
+        ''' Adds to the counter '''
+
+        with self.lock:
+            self.value += amount
+
+    def samples(self):
+        return [(self.name, '', self.value)]
+
+class Gauge:
+    ''' Value that can go up and down '''
+
+    kind = 'gauge'
+
+    def __init__(self, name, help=''):
+        self.name = name
+        self.help = help
+        self.value = 0
+        self.lock = Lock()
+
+    def set(self, value):
+        ''' Sets the gauge '''
+
+        self.value = value
+
+    def inc(self, amount=1):
+        ''' Adds to the gauge '''
+
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        ''' Subtracts from the gauge '''
+
+        with self.lock:
+            self.value -= amount
+
+    def samples(self):
+        return [(self.name, '', self.value)]
+
+class _Timer:
+    ''' Context manager that observes the time spent inside it '''
+
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+class Histogram:
+    ''' Distribution of observed values in fixed buckets '''
+
+    kind = 'histogram'
+
+    def __init__(self, name, help='', buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1) # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.lock = Lock()
+
+    def observe(self, value):
+        ''' Records one value '''
+
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        ''' Returns a context manager that observes how long its block took '''
+
+        return _Timer(self)
+
+    def samples(self):
+        with self.lock:
+            counts = list(self.counts)
+            total = self.sum
+            count = self.count
+
+        samples = []
+        cumulative = 0
+        for bound, bucketCount in zip(self.buckets, counts):
+            cumulative += bucketCount
+            samples.append((self.name + '_bucket', f'{{le="{bound}"}}', cumulative))
+        samples.append((self.name + '_bucket', '{le="+Inf"}', count))
+        samples.append((self.name + '_sum', '', total))
+        samples.append((self.name + '_count', '', count))
+        return samples
+
+class Registry:
+    ''' Holds every metric, get or create by name '''
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = Lock()
+
+    def __get(self, metricClass, name, help, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = metricClass(name, help, **kwargs)
+                self.metrics[name] = metric
+            elif not isinstance(metric, metricClass):
+                raise ValueError(f"{name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, help=''):
+        ''' Returns the counter with this name, creating it if needed '''
+
+        return self.__get(Counter, name, help)
+
+    def gauge(self, name, help=''):
+        ''' Returns the gauge with this name, creating it if needed '''
+
+        return self.__get(Gauge, name, help)
+
+    def histogram(self, name, help='', buckets=DEFAULT_BUCKETS):
+        ''' Returns the histogram with this name, creating it if needed '''
+
+        return self.__get(Histogram, name, help, buckets=buckets)
+
+    def render(self):
+        """
+        Formats every metric in the Prometheus text exposition format
+
+        Returns:
+            str: the exposition text
+        """
+
+        with self.lock:
+            metrics = list(self.metrics.values())
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """
+        Summarizes every metric as plain values
+
+        Returns:
+            dict: name -> value, histograms give count, sum and mean
+        """
+
+        with self.lock:
+            metrics = list(self.metrics.values())
+
+        values = {}
+        for metric in metrics:
+            if metric.kind == 'histogram':
+                values[metric.name] = {'count': metric.count, 'sum': metric.sum, 'mean': metric.sum / metric.count if metric.count else 0.0}
+            else:
+                values[metric.name] = metric.value
+        return values
+
+# shared registry for the process
+REGISTRY = Registry()
+
+def counter(name, help=''):
+    ''' Returns a counter from the shared registry '''
+
+    return REGISTRY.counter(name, help)
+
+def gauge(name, help=''):
+    ''' Returns a gauge from the shared registry '''
+
+    return REGISTRY.gauge(name, help)
+
+def histogram(name, help='', buckets=DEFAULT_BUCKETS):
+    ''' Returns a histogram from the shared registry '''
+
+    return REGISTRY.histogram(name, help, buckets)
+
+def startMetricsServer(port, registry=REGISTRY, host=''):
+    """
+    Serves the registry as Prometheus text on /metrics from a daemon thread
+
+    Args:
+        port (int): the port to listen on
+        registry (Registry, optional): the metrics to serve. Defaults to the shared registry.
+        host (str, optional): the address to bind. Defaults to all interfaces.
+
+    Returns:
+        ThreadingHTTPServer: the running server
+    """
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass # keep scrapes off the terminal
+
+    server = ThreadingHTTPServer((host, int(port)), MetricsHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def startStatsPublisher(source, interval=10, registry=REGISTRY, host='localhost'):
+    """
+    Publishes a JSON snapshot of the registry to the stats fanout exchange from a daemon thread
+
+    Args:
+        source (str): name of the publishing module, like 'cactus' or 'wifi'
+        interval (float, optional): seconds between snapshots. Defaults to 10.
+        registry (Registry, optional): the metrics to publish. Defaults to the shared registry.
+        host (str, optional): the RabbitMQ host. Defaults to 'localhost'.
+
+    Returns:
+        Thread: the publishing thread
+    """
+
+    def publishLoop():
+        import pika # needed for rabbitMQ, only when stats are published
+
+        # own connection, pika connections can't be shared between threads
+        connection = pika.BlockingConnection(pika.ConnectionParameters(host=host))
+        channel = connection.channel()
+        channel.exchange_declare(exchange='stats', exchange_type='fanout')
+
+        while True:
+            time.sleep(interval)
+            message = json.dumps({'source': source, 'time': time.time(), 'metrics': registry.snapshot()})
+            channel.basic_publish(exchange='stats', routing_key='', body=message)
+
+    thread = Thread(target=publishLoop, daemon=True)
+    thread.start()
+    return thread
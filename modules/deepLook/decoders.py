@@ -0,0 +1,195 @@
+# Deep look decoder adapters, each one drives a single dedicated radio
+
+import time # needed for dwell timing
+import random # needed for the simulated worker
+import shlex # needed for building commands
+import subprocess # needed for command decoders
+
+class DecoderWorker:
+    """
+    Base adapter for one deep look radio, subclasses override tune and decode
+    """
+
+    kind = 'base'
+
+    def __init__(self, name, minFreq, maxFreq, maxBandwidth=None, settleSeconds=0.05, retuneSecondsPerMHz=0.0):
+        """
+        Initialization method
+
+        Args:
+            name (str): Name of the radio, like 'rtl0'
+            minFreq (float): Lowest frequency the radio and decoder handle in MHz
+            maxFreq (float): Highest frequency the radio and decoder handle in MHz
+            maxBandwidth (float, optional): Widest signal the decoder can take in MHz, None for any. Defaults to None.
+            settleSeconds (float, optional): Fixed cost of any retune. Defaults to 0.05.
+            retuneSecondsPerMHz (float, optional): Extra retune cost per MHz moved, for radios with slow synthesizers. Defaults to 0.
+        """
+
+        self.name = name
+        self.minFreq = float(minFreq)
+        self.maxFreq = float(maxFreq)
+        self.maxBandwidth = None if maxBandwidth is None else float(maxBandwidth)
+        self.settleSeconds = float(settleSeconds)
+        self.retuneSecondsPerMHz = float(retuneSecondsPerMHz)
+
+        self.freq = None # where the radio is tuned, MHz
+
+    def capable(self, centerFreq, bandWidth):
+        """
+        Checks whether this radio and decoder can look at a signal
+
+        Args:
+            centerFreq (float): center frequency in MHz
+            bandWidth (float): bandwidth in MHz
+
+        Returns:
+            bool: True if the signal is in range
+        """
+
+        if not (self.minFreq <= centerFreq <= self.maxFreq):
+            return False
+        return self.maxBandwidth is None or bandWidth <= self.maxBandwidth
+
+    def retuneCost(self, centerFreq):
+        """
+        Estimates the seconds lost moving the radio to a frequency
+
+        Args:
+            centerFreq (float): the new center frequency in MHz
+
+        Returns:
+            float: seconds, 0 when the radio is already there
+        """
+
+        if self.freq is not None and abs(self.freq - centerFreq) < 0.001:
+            return 0.0
+        distance = 0.0 if self.freq is None else abs(self.freq - centerFreq)
+        return self.settleSeconds + distance * self.retuneSecondsPerMHz
+
+    def tune(self, centerFreq, bandWidth):
+        ''' Moves the radio, the base adapter only records the frequency \n decoders that tune as they start report that time as startupSeconds from decode instead '''
+
+        self.freq = centerFreq
+
+    def decode(self, centerFreq, bandWidth, seconds):
+        """
+        Listens to a signal for a dwell and decodes what it hears
+
+        Args:
+            centerFreq (float): center frequency in MHz
+            bandWidth (float): bandwidth in MHz
+            seconds (float): dwell time
+
+        Returns:
+            dict: decoder output, at least 'decoded' (bool)
+        """
+
+        raise NotImplementedError
+
+    def close(self):
+        ''' Releases the radio '''
+
+        pass
+
+class SimulatedWorker(DecoderWorker):
+    """
+    Stand in radio for testing the dispatcher, sleeps for the retune and dwell and makes up frames
+    """
+
+    kind = 'simulated'
+
+    def __init__(self, name, minFreq=1, maxFreq=6000, maxBandwidth=None, settleSeconds=0.05, retuneSecondsPerMHz=0.0, speed=1.0, successRate=0.8, seed=None):
+        """
+        Initialization method
+
+        Args:
+            name (str): Name of the radio
+            minFreq (float, optional): Lowest frequency in MHz. Defaults to 1.
+            maxFreq (float, optional): Highest frequency in MHz. Defaults to 6000.
+            maxBandwidth (float, optional): Widest signal in MHz. Defaults to None.
+            settleSeconds (float, optional): Fixed cost of any retune. Defaults to 0.05.
+            retuneSecondsPerMHz (float, optional): Extra retune cost per MHz moved. Defaults to 0.
+            speed (float, optional): Divides every sleep, so tests can run faster than real time. Defaults to 1.
+            successRate (float, optional): Chance a dwell decodes something. Defaults to 0.8.
+            seed (int, optional): Random seed for repeatable runs. Defaults to None.
+        """
+
+        super().__init__(name, minFreq, maxFreq, maxBandwidth, settleSeconds, retuneSecondsPerMHz)
+        self.speed = float(speed)
+        self.successRate = float(successRate)
+        self.random = random.Random(seed)
+
+    def tune(self, centerFreq, bandWidth):
+        ''' Sleeps for the retune cost then records the frequency '''
+
+        time.sleep(self.retuneCost(centerFreq) / self.speed)
+        self.freq = centerFreq
+
+    def decode(self, centerFreq, bandWidth, seconds):
+        ''' Sleeps for the dwell and reports a made up number of frames '''
+
+        time.sleep(seconds / self.speed)
+        decoded = self.random.random() < self.successRate
+        return {'decoded': decoded, 'frames': self.random.randint(1, 20) if decoded else 0}
+
+class CommandWorker(DecoderWorker):
+    """
+    Runs an external decoder for each dwell, like rtl_433 or a gnuradio flowgraph
+    """
+
+    kind = 'command'
+
+    def __init__(self, name, command, minFreq, maxFreq, maxBandwidth=None, settleSeconds=0.5, retuneSecondsPerMHz=0.0):
+        """
+        Initialization method
+
+        Args:
+            name (str): Name of the radio
+            command (str): Command line with {freq} (MHz), {hz}, {bandwidth} (MHz) and {seconds} filled in per dwell,
+                like 'rtl_433 -d 0 -f {hz} -T {seconds} -F json'
+            minFreq (float): Lowest frequency in MHz
+            maxFreq (float): Highest frequency in MHz
+            maxBandwidth (float, optional): Widest signal in MHz. Defaults to None.
+            settleSeconds (float, optional): Start up cost of the decoder. Defaults to 0.5.
+            retuneSecondsPerMHz (float, optional): Extra retune cost per MHz moved. Defaults to 0.
+        """
+
+        super().__init__(name, minFreq, maxFreq, maxBandwidth, settleSeconds, retuneSecondsPerMHz)
+        self.command = command
+
+    def decode(self, centerFreq, bandWidth, seconds):
+        """
+        Runs the decoder for the dwell, every output line counts as a frame.
+        The decoder opens and tunes the radio itself, so the time it runs past the dwell is reported as startupSeconds.
+        """
+
+        listen = max(1, round(seconds))
+        args = shlex.split(self.command.format(freq=centerFreq, hz=int(centerFreq * 1000000), bandwidth=bandWidth, seconds=listen))
+        start = time.perf_counter()
+        try:
+            result = subprocess.run(args, capture_output=True, text=True, timeout=seconds + 10)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            return {'decoded': False, 'frames': 0, 'error': str(e), 'startupSeconds': 0.0}
+        startup = max(time.perf_counter() - start - listen, 0.0)
+
+        lines = [line for line in result.stdout.splitlines() if line.strip()]
+        return {'decoded': len(lines) > 0, 'frames': len(lines), 'output': lines[-20:], 'startupSeconds': startup}
+
+def buildWorker(spec):
+    """
+    Makes a worker from a config entry
+
+    Args:
+        spec (dict): {'type': 'simulated' or 'command', 'name': ..., plus that worker's options}
+
+    Returns:
+        DecoderWorker: the worker
+    """
+
+    spec = dict(spec)
+    kind = spec.pop('type', 'simulated')
+    if kind == 'simulated':
+        return SimulatedWorker(**spec)
+    if kind == 'command':
+        return CommandWorker(**spec)
+    raise ValueError(f"Unknown decoder type {kind}")
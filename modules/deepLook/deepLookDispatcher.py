@@ -0,0 +1,433 @@
+# Schedules dedicated deep look radios onto the signals cactus finds
+
+import os # needed for file paths
+import sys # needed for system
+import json # needed for result messages
+import time # needed for timing
+import queue # needed for the result hand off
+import argparse # needed for command line options
+from collections import deque # needed for the decode rate window
+from threading import Thread, Lock # needed for the worker threads
+
+import pika # needed for rabbitMQ
+
+from decoders import SimulatedWorker, buildWorker # needed for the decoder adapters
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')) # needed for the shared cactus modules
+import metrics # needed for runtime stats
+from cactusConfig import parseArgs # needed for the config file
+from bands import BAND_EXCHANGE, routingKey # needed for band routed signals
+from sweepRing import SweepRing # needed for the shared memory transport
+
+DECODES = metrics.counter('deeplook_decodes_total', 'Dwells that decoded something')
+DWELLS = metrics.counter('deeplook_dwells_total', 'Dwells completed')
+DWELL_SECONDS = metrics.histogram('deeplook_dwell_seconds', 'Time spent listening to one signal')
+RETUNE_SECONDS = metrics.histogram('deeplook_retune_seconds', 'Time spent moving a radio or starting its decoder')
+TRACKS = metrics.gauge('deeplook_tracks', 'Signals being tracked')
+
+# how much each part of the priority counts, all parts are scaled to 0 - 1
+DEFAULT_WEIGHTS = {'power': 1.0, 'novelty': 2.0, 'duty': 1.0, 'capability': 0.5}
+
+# peak levels scored from 0 at the floor to 1 at floor + span, roughly hackrf_sweep's noise floor to a strong nearby emitter
+POWER_FLOOR = -90.0
+POWER_SPAN = 60.0
+
+class SignalTrack:
+    ''' A signal seen in signalSweep, merged across sweeps by center frequency '''
+
+    __slots__ = ('key', 'centerFreq', 'bandWidth', 'continuous', 'powerDiff', 'peakPower', 'firstSeen', 'lastSeen', 'sightings',
+                 'lastDecoded', 'dwells', 'decodes', 'frames', 'dwellSeconds', 'capableWorkers', 'worker')
+
+    def __init__(self, key, now):
+        self.key = key
+        self.centerFreq = 0.0
+        self.bandWidth = 0.0
+        self.continuous = 0.0
+        self.powerDiff = 0.0
+        self.peakPower = None # strongest bin in dBm, None from a cactus that doesn't send it
+        self.firstSeen = now
+        self.lastSeen = now
+        self.sightings = 0
+        self.lastDecoded = None # last dwell on it, None if never looked at
+        self.dwells = 0
+        self.decodes = 0
+        self.frames = 0
+        self.dwellSeconds = 0.0
+        self.capableWorkers = 0
+        self.worker = None # the worker looking at it right now
+
+    def update(self, centerFreq, bandWidth, continuous, powerDiff, peakPower, now):
+        ''' takes the newest features from signalSweep '''
+
+        self.centerFreq = centerFreq
+        self.bandWidth = bandWidth
+        self.continuous = continuous
+        self.powerDiff = powerDiff
+        self.peakPower = peakPower
+        self.lastSeen = now
+        self.sightings += 1
+
+class Dispatcher:
+    """
+    Keeps the signals from signalSweep and hands the best one to each free deep look radio
+    """
+
+    def __init__(self, workers, dwellSeconds=5.0, mergeMHz=0.5, trackTimeout=30.0, revisitSeconds=60.0, weights=None, retuneWeight=1.0, idleSeconds=0.2):
+        """
+        Initialization method
+
+        Args:
+            workers (list): the DecoderWorkers, one per radio
+            dwellSeconds (float, optional): How long a radio listens to a signal. Defaults to 5.
+            mergeMHz (float, optional): Signals whose centers round to the same step are the same signal. Defaults to 0.5.
+            trackTimeout (float, optional): Seconds a signal can go unseen before it's dropped. Defaults to 30.
+            revisitSeconds (float, optional): Seconds after a dwell before a signal counts as fully new again. Defaults to 60.
+            weights (dict, optional): Weights for 'power', 'novelty', 'duty' and 'capability'. Defaults to DEFAULT_WEIGHTS.
+            retuneWeight (float, optional): Priority lost per dwell length of retune time. Defaults to 1.
+            idleSeconds (float, optional): How long a radio waits when nothing is left to look at. Defaults to 0.2.
+        """
+
+        self.workers = list(workers)
+        self.dwellSeconds = float(dwellSeconds)
+        self.mergeMHz = float(mergeMHz)
+        self.trackTimeout = float(trackTimeout)
+        self.revisitSeconds = float(revisitSeconds)
+        self.weights = dict(DEFAULT_WEIGHTS)
+        if weights is not None:
+            self.weights.update(weights)
+        self.retuneWeight = float(retuneWeight)
+        self.idleSeconds = float(idleSeconds)
+
+        self.tracks = {}
+        self.lock = Lock()
+        self.running = False
+        self.workerThreads = []
+
+        # per worker accounting
+        self.accounts = {worker.name: {'dwells': 0, 'decodes': 0, 'retunes': 0, 'retuneSeconds': 0.0, 'dwellSeconds': 0.0, 'idleSeconds': 0.0} for worker in self.workers}
+        self.decodeTimes = deque() # when each decode finished, for the per minute rate
+        self.results = queue.Queue(maxsize=1000)
+
+    def updateSignals(self, signalList, now=None):
+        """
+        Merges a signalSweep worth of signals into the tracks
+
+        Args:
+            signalList (list): [center frequency, bandwidth, continuous, power difference, peak dBm] for each signal, peak dBm is optional
+            now (float, optional): time of the sweep. Defaults to now.
+        """
+
+        now = time.time() if now is None else now
+
+        with self.lock:
+            for signal in signalList:
+                centerFreq, bandWidth, continuous, powerDiff = (float(value) for value in signal[:4])
+                peakPower = float(signal[4]) if len(signal) > 4 else None
+                key = round(centerFreq / self.mergeMHz)
+
+                track = self.tracks.get(key)
+                if track is None:
+                    track = SignalTrack(key, now)
+                    track.capableWorkers = sum(1 for worker in self.workers if worker.capable(centerFreq, bandWidth))
+                    self.tracks[key] = track
+                track.update(centerFreq, bandWidth, continuous, powerDiff, peakPower, now)
+
+            # forget signals that went away, unless a radio is on them
+            for key in [key for key, track in self.tracks.items() if now - track.lastSeen > self.trackTimeout and track.worker is None]:
+                del self.tracks[key]
+
+            TRACKS.set(len(self.tracks))
+
+    def priority(self, track, worker, now):
+        """
+        Scores a signal for a worker, higher goes first
+
+        Args:
+            track (SignalTrack): the signal
+            worker (DecoderWorker): the free radio
+            now (float): the current time
+
+        Returns:
+            float: the score
+        """
+
+        # absolute level, a strong flat carrier should outrank a weak ragged one
+        power = 0.0 if track.peakPower is None else min(max((track.peakPower - POWER_FLOOR) / POWER_SPAN, 0.0), 1.0)
+        novelty = 1.0 if track.lastDecoded is None else min((now - track.lastDecoded) / self.revisitSeconds, 1.0)
+        duty = min(max(track.continuous / 100.0, 0.0), 1.0)
+        capability = 1.0 / max(track.capableWorkers, 1) # signals few radios can take go to those radios
+
+        score = self.weights['power'] * power + self.weights['novelty'] * novelty + self.weights['duty'] * duty + self.weights['capability'] * capability
+        return score - self.retuneWeight * worker.retuneCost(track.centerFreq) / self.dwellSeconds
+
+    def nextSignal(self, worker, now=None):
+        """
+        Claims the best free signal this worker can decode
+
+        Args:
+            worker (DecoderWorker): the free radio
+            now (float, optional): the current time. Defaults to now.
+
+        Returns:
+            SignalTrack: the claimed signal, None if there is nothing for it
+        """
+
+        now = time.time() if now is None else now
+
+        with self.lock:
+            best = None
+            bestScore = None
+            for track in self.tracks.values():
+                if track.worker is not None or not worker.capable(track.centerFreq, track.bandWidth):
+                    continue
+                score = self.priority(track, worker, now)
+                if bestScore is None or score > bestScore:
+                    best = track
+                    bestScore = score
+
+            if best is not None:
+                best.worker = worker.name
+            return best
+
+    def dwell(self, worker, track):
+        """
+        Tunes a worker to a claimed signal, decodes it and does the accounting
+
+        Args:
+            worker (DecoderWorker): the radio
+            track (SignalTrack): the signal it claimed
+
+        Returns:
+            dict: the decoder output
+        """
+
+        account = self.accounts[worker.name]
+        centerFreq = track.centerFreq
+        bandWidth = track.bandWidth
+
+        try:
+            retune = 0.0
+            if worker.retuneCost(centerFreq) > 0:
+                start = time.perf_counter()
+                worker.tune(centerFreq, bandWidth)
+                retune = time.perf_counter() - start
+                account['retunes'] += 1
+
+            start = time.perf_counter()
+            result = worker.decode(centerFreq, bandWidth, self.dwellSeconds)
+            listened = time.perf_counter() - start
+        finally:
+            with self.lock:
+                track.worker = None
+
+        # decoders that open the radio themselves spend part of the dwell starting up, that's retune time too
+        startup = min(float(result.get('startupSeconds', 0.0)), listened)
+        listened -= startup
+        retune += startup
+        if retune > 0:
+            RETUNE_SECONDS.observe(retune)
+            account['retuneSeconds'] += retune
+
+        DWELLS.inc()
+        DWELL_SECONDS.observe(listened)
+        account['dwells'] += 1
+        account['dwellSeconds'] += listened
+
+        with self.lock:
+            track.lastDecoded = time.time()
+            track.dwells += 1
+            track.dwellSeconds += listened
+            if result.get('decoded'):
+                track.decodes += 1
+                track.frames += int(result.get('frames', 0))
+                account['decodes'] += 1
+                self.decodeTimes.append(track.lastDecoded)
+                DECODES.inc()
+
+        message = dict(result, worker=worker.name, decoder=worker.kind, centerFreq=centerFreq, bandWidth=bandWidth, time=track.lastDecoded)
+        try:
+            self.results.put_nowait(message)
+        except queue.Full: # nobody is publishing, keep the newest
+            self.results.get_nowait()
+            self.results.put_nowait(message)
+        return result
+
+    def workerLoop(self, worker):
+        ''' One thread per radio, keeps it on the best signal it can take '''
+
+        account = self.accounts[worker.name]
+        while self.running:
+            track = self.nextSignal(worker)
+            if track is None:
+                time.sleep(self.idleSeconds)
+                account['idleSeconds'] += self.idleSeconds
+                continue
+            try:
+                self.dwell(worker, track)
+            except Exception as e: # a broken decoder shouldn't stop the radio
+                print(f"{worker.name} failed on {track.centerFreq:.3f} MHz: {e}")
+
+    def decodesPerMinute(self, now=None):
+        ''' Decodes finished in the last minute across every radio '''
+
+        now = time.time() if now is None else now
+        with self.lock:
+            while self.decodeTimes and now - self.decodeTimes[0] > 60:
+                self.decodeTimes.popleft()
+            return len(self.decodeTimes)
+
+    def stats(self):
+        """
+        Summarizes the dispatcher
+
+        Returns:
+            dict: tracks, decodes per minute and the accounting of every worker
+        """
+
+        with self.lock:
+            tracks = len(self.tracks)
+            accounts = {name: dict(account) for name, account in self.accounts.items()}
+        return {'tracks': tracks, 'decodesPerMinute': self.decodesPerMinute(), 'workers': accounts}
+
+    def rabbitCallback(self, ch, method, properties, body):
+        """Callback method for rabbitMQ
+
+        Args:
+            ch ([type]): [description]
+            method ([type]): [description]
+            properties ([type]): [description]
+            body (String): The message body as a string
+        """
+
+        data = body.split()
+        self.updateSignals([data[i:i + 5] for i in range(0, len(data) - 4, 5)])
+
+    def linkRabbit(self, bands=None):
+        """Setup and start listening for RabbitMQ messages
+
+        Args:
+            bands (list, optional): only take signals from these cactus bands, None for every signal. Defaults to None.
+        """
+
+        print("Listening for RabbitMQ messages")
+
+        connection = pika.BlockingConnection(pika.ConnectionParameters(host='localhost'))
+        channel = connection.channel()
+
+        result = channel.queue_declare(queue='', exclusive=True)
+        queue_name = result.method.queue
+
+        if bands is None:
+            channel.exchange_declare(exchange='signalSweep', exchange_type='fanout')
+            channel.queue_bind(exchange='signalSweep', queue=queue_name)
+        else:
+            channel.exchange_declare(exchange=BAND_EXCHANGE, exchange_type='topic')
+            for band in bands:
+                channel.queue_bind(exchange=BAND_EXCHANGE, queue=queue_name, routing_key=routingKey('signal', band))
+
+        channel.basic_consume(queue=queue_name, on_message_callback=self.rabbitCallback, auto_ack=True)
+        channel.start_consuming()
+
+    def linkRing(self, ringName):
+        ''' Follows the signal lists cactus writes to shared memory instead of RabbitMQ '''
+
+        print(f"Reading signals from shared memory ring {ringName}_signal")
+        ring = SweepRing.attach(f"{ringName}_signal")
+
+        for seq, timestamp, view in ring.entries():
+            signalList = view[:, [0, 1, 2, 3, 7]].tolist()
+            if ring.valid(seq):
+                self.updateSignals(signalList, timestamp)
+
+    def publishResults(self):
+        ''' Publishes decoder output to the deepLook fanout exchange, pika needs its own thread '''
+
+        connection = pika.BlockingConnection(pika.ConnectionParameters(host='localhost'))
+        channel = connection.channel()
+        channel.exchange_declare(exchange='deepLook', exchange_type='fanout')
+
+        while self.running:
+            try:
+                message = self.results.get(timeout=1)
+            except queue.Empty:
+                continue
+            channel.basic_publish(exchange='deepLook', routing_key='', body=json.dumps(message))
+
+    def start(self, source='rabbit', bands=None, ringName=None, publish=True):
+        """
+        Starts the signal listener and one thread per radio
+
+        Args:
+            source (str, optional): 'rabbit' or 'ring' for where signals come from, 'none' to feed updateSignals directly. Defaults to 'rabbit'.
+            bands (list, optional): cactus bands to take signals from, None for every signal. Defaults to None.
+            ringName (str, optional): the shared memory ring prefix when source is 'ring'. Defaults to None.
+            publish (bool, optional): publish decoder output to the deepLook exchange. Defaults to True.
+        """
+
+        self.running = True
+
+        if source == 'rabbit':
+            Thread(target=self.linkRabbit, args=(bands,), daemon=True).start()
+        elif source == 'ring':
+            Thread(target=self.linkRing, args=(ringName,), daemon=True).start()
+
+        if publish:
+            Thread(target=self.publishResults, daemon=True).start()
+
+        for worker in self.workers:
+            thread = Thread(target=self.workerLoop, args=(worker,), name=worker.name, daemon=True)
+            thread.start()
+            self.workerThreads.append(thread)
+
+    def stop(self):
+        ''' Lets every radio finish its dwell and releases them '''
+
+        self.running = False
+        for thread in self.workerThreads:
+            thread.join()
+        for worker in self.workers:
+            worker.close()
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Schedules deep look radios onto the signals cactus publishes")
+    parser.add_argument("--simulated", type=int, default=0, help="add this many simulated radios")
+    parser.add_argument("--workers", help="JSON file of decoder worker specs, like [{\"type\": \"command\", \"name\": \"rtl0\", ...}]")
+    parser.add_argument("--dwell", dest="dwellSeconds", type=float, default=5.0, help="seconds a radio listens to a signal")
+    parser.add_argument("--revisit", dest="revisitSeconds", type=float, default=60.0, help="seconds before a looked at signal counts as new again")
+    parser.add_argument("--track-timeout", dest="trackTimeout", type=float, default=30.0, help="seconds a signal can go unseen before it's dropped")
+    parser.add_argument("--merge", dest="mergeMHz", type=float, default=0.5, help="MHz step signal centers are merged on")
+    parser.add_argument("--bands", nargs="+", help="only take signals from these cactus bands")
+    parser.add_argument("--ring", dest="ringName", help="read signals from cactus' shared memory rings with this name prefix instead of RabbitMQ")
+    parser.add_argument("--metrics-port", dest="metricsPort", type=int, help="port for Prometheus metrics")
+    args = parseArgs(parser, 'deepLook')
+
+    specs = args.workers
+    if isinstance(specs, str): # a file, the config file can also list the workers directly
+        with open(specs, 'r') as infile:
+            specs = json.load(infile)
+    workers = [buildWorker(spec) for spec in (specs or [])]
+    workers += [SimulatedWorker(f"sim{i}") for i in range(args.simulated)]
+
+    if not workers:
+        print("No deep look radios, use --simulated or --workers")
+        sys.exit(1)
+
+    if args.metricsPort is not None:
+        metrics.startMetricsServer(args.metricsPort)
+
+    dispatcher = Dispatcher(workers, dwellSeconds=args.dwellSeconds, mergeMHz=args.mergeMHz, trackTimeout=args.trackTimeout, revisitSeconds=args.revisitSeconds)
+    dispatcher.start(source='ring' if args.ringName else 'rabbit', bands=args.bands, ringName=args.ringName)
+
+    print(f"Dispatching to {', '.join(worker.name for worker in workers)}")
+
+    try:
+        while True:
+            time.sleep(5)
+            stats = dispatcher.stats()
+            print(f"{stats['tracks']} signals tracked, {stats['decodesPerMinute']} decodes in the last minute")
+            for name, account in stats['workers'].items():
+                print(f"  {name}: {account['dwells']} dwells, {account['decodes']} decodes, {account['retuneSeconds']:.1f}s retuning, {account['idleSeconds']:.1f}s idle")
+    except KeyboardInterrupt:
+        print("shutting Down")
+        dispatcher.stop()
@@ -0,0 +1,99 @@
+# Dispatcher checks with simulated radios and a scripted signal list, run with python -m pytest modules/deepLook
+
+import time # needed for timing the runs
+
+import pytest # needed for approx
+
+from deepLookDispatcher import Dispatcher # needed for the scheduler under test
+from decoders import SimulatedWorker, CommandWorker # needed for the radios
+
+# [center frequency, bandwidth, continuous, power difference, peak dBm] like a signalSweep message
+SIGNALS = [
+    [433.9, 0.2, 50.0, 20.0, -70.0], # weak and ragged
+    [915.0, 0.5, 50.0, 2.0, -35.0], # strong and flat
+    [2437.0, 20.0, 50.0, 5.0, -50.0], # too wide for the narrow radio
+]
+
+def simulated(name, **options):
+    ''' a fast, always decoding simulated radio '''
+
+    settings = dict(speed=100.0, successRate=1.0, seed=1, settleSeconds=0.5)
+    settings.update(options)
+    return SimulatedWorker(name, **settings)
+
+def test_priority_order():
+    ''' the strongest signal goes first, then novelty moves the radio on to the ones not looked at yet '''
+
+    worker = simulated('sdr0')
+    dispatcher = Dispatcher([worker], dwellSeconds=1.0)
+    dispatcher.updateSignals(SIGNALS)
+
+    order = []
+    for _ in range(len(SIGNALS)):
+        track = dispatcher.nextSignal(worker)
+        order.append(track.centerFreq)
+        dispatcher.dwell(worker, track)
+
+    assert order == [915.0, 2437.0, 433.9]
+    assert dispatcher.nextSignal(worker).centerFreq == 915.0 # everything looked at, the strongest again
+
+def test_capability():
+    ''' a radio never claims a signal wider than it can take, a claimed signal isn't handed out twice '''
+
+    narrow = simulated('narrow', maxBandwidth=1.0)
+    wide = simulated('wide')
+    dispatcher = Dispatcher([narrow, wide], dwellSeconds=1.0)
+    dispatcher.updateSignals(SIGNALS)
+
+    claimed = [dispatcher.nextSignal(narrow), dispatcher.nextSignal(narrow)]
+    assert sorted(track.centerFreq for track in claimed) == [433.9, 915.0]
+    assert dispatcher.nextSignal(narrow) is None
+    assert dispatcher.nextSignal(wide).centerFreq == 2437.0
+
+def test_dwell_and_retune_accounting():
+    ''' a move costs one retune, staying put costs none, dwell time is the listening time '''
+
+    worker = simulated('sdr0')
+    dispatcher = Dispatcher([worker], dwellSeconds=1.0)
+    dispatcher.updateSignals(SIGNALS[:1])
+
+    for _ in range(3):
+        dispatcher.dwell(worker, dispatcher.nextSignal(worker))
+
+    account = dispatcher.accounts['sdr0']
+    assert account['dwells'] == 3
+    assert account['decodes'] == 3
+    assert account['retunes'] == 1
+    assert account['retuneSeconds'] == pytest.approx(0.5 / 100, abs=0.004)
+    assert account['dwellSeconds'] == pytest.approx(3 * 1.0 / 100, abs=0.01)
+
+def test_command_startup_counts_as_retune():
+    ''' a decoder that tunes while it starts reports that time as retune, not dwell '''
+
+    worker = CommandWorker('cmd0', 'sh -c "sleep 0.3; echo frame; sleep {seconds}"', 1, 6000)
+    dispatcher = Dispatcher([worker], dwellSeconds=1.0)
+    dispatcher.updateSignals(SIGNALS[:1])
+
+    result = dispatcher.dwell(worker, dispatcher.nextSignal(worker))
+
+    account = dispatcher.accounts['cmd0']
+    assert result['frames'] == 1
+    assert account['retuneSeconds'] == pytest.approx(0.3, abs=0.15)
+    assert account['dwellSeconds'] == pytest.approx(1.0, abs=0.15)
+
+def decodeRate(workerCount, seconds=1.0):
+    ''' decodes per minute with some simulated radios running freely over the scripted signals '''
+
+    workers = [simulated(f"sdr{number}", speed=50.0) for number in range(workerCount)]
+    dispatcher = Dispatcher(workers, dwellSeconds=1.0, idleSeconds=0.01)
+    dispatcher.updateSignals(SIGNALS)
+
+    dispatcher.start(source='none', publish=False)
+    time.sleep(seconds)
+    dispatcher.stop()
+    return dispatcher.decodesPerMinute()
+
+def test_more_workers_more_decodes():
+    ''' each radio adds its own dwells, so two radios decode well over what one does '''
+
+    assert decodeRate(2) > 1.5 * decodeRate(1)
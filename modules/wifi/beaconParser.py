@@ -0,0 +1,428 @@
+# Lightweight beacon parser that skips scapy for the hot path
+
+import socket # needed for raw sockets
+import struct # needed for unpacking headers
+import ctypes # needed for building the BPF program
+import sys # needed for command line args
+import os # needed for the bundled test capture
+
+# 802.11 frame control bytes for the management frames we care about
+BEACON_FC = 0x80
+PROBE_RESP_FC = 0x50
+
+# pcap link types
+LINKTYPE_IEEE802_11 = 105
+LINKTYPE_RADIOTAP = 127
+
+# socket constants that are not always exported by the socket module
+ETH_P_ALL = 0x0003
+SO_ATTACH_FILTER = 26
+
+# classic BPF program that only accepts beacons and probe responses behind a radiotap header
+# equivalent to tcpdump -y IEEE802_11_RADIO "type mgt subtype beacon or type mgt subtype probe-resp"
+BEACON_FILTER = [
+    (0x30, 0, 0, 0x00000003), # ldb [3]         high byte of the radiotap length
+    (0x64, 0, 0, 0x00000008), # lsh #8
+    (0x07, 0, 0, 0x00000000), # tax
+    (0x30, 0, 0, 0x00000002), # ldb [2]         low byte of the radiotap length
+    (0x4c, 0, 0, 0x00000000), # or x
+    (0x07, 0, 0, 0x00000000), # tax             x = radiotap length
+    (0x50, 0, 0, 0x00000000), # ldb [x + 0]     802.11 frame control
+    (0x15, 2, 0, BEACON_FC), # jeq #0x80       beacon
+    (0x15, 1, 0, PROBE_RESP_FC), # jeq #0x50       probe response
+    (0x06, 0, 0, 0x00000000), # ret #0          drop
+    (0x06, 0, 0, 0x00040000), # ret #262144     accept
+]
+
+# scapy filter string used when falling back to scapy
+SCAPY_FILTER = "type mgt subtype beacon or type mgt subtype probe-resp"
+
+# radiotap fields in present bit order as (alignment, size), up to dBm antenna signal
+RADIOTAP_FIELDS = [
+    (8, 8), # 0 TSFT
+    (1, 1), # 1 Flags
+    (1, 1), # 2 Rate
+    (2, 4), # 3 Channel
+    (1, 2), # 4 FHSS
+    (1, 1), # 5 dBm antenna signal
+]
+
+# Microsoft OUI + type 1 marks the legacy WPA vendor element
+WPA_OUI = b'\x00\x50\xf2\x01'
+
+# AKM suite types to the names scapy uses in network_stats()
+AKM_NAMES = {1: "802.1X", 2: "PSK", 8: "SAE"}
+
+class _SockFilter(ctypes.Structure):
+    ''' Mirror of struct sock_filter from linux/filter.h '''
+
+    _fields_ = [("code", ctypes.c_uint16), ("jt", ctypes.c_uint8), ("jf", ctypes.c_uint8), ("k", ctypes.c_uint32)]
+
+def freqToChannel(freq):
+    """
+    Converts a center frequency into a wifi channel number
+
+    Args:
+        freq (int): center frequency in MHz
+
+    Returns:
+        int: the channel number, or None if the frequency is not a wifi channel
+    """
+
+    if freq == 2484:
+        return 14
+    if 2412 <= freq <= 2472:
+        return (freq - 2407) // 5
+    if 5000 <= freq <= 5900:
+        return (freq - 5000) // 5
+    return None
+
+def parseRadiotap(frame):
+    """
+    Parses the parts of a radiotap header we need
+
+    Args:
+        frame (bytes): the captured frame starting with the radiotap header
+
+    Returns:
+        tuple: (header length, dBm signal or None, channel frequency in MHz or None, has FCS)
+    """
+
+    if len(frame) < 8:
+        return None
+
+    version, _, length, present = struct.unpack_from('<BBHI', frame, 0)
+    if version != 0 or length > len(frame):
+        return None
+
+    # skip over any extended present bitmaps
+    offset = 8
+    word = present
+    while word & 0x80000000:
+        if offset + 4 > length:
+            return None
+        word = struct.unpack_from('<I', frame, offset)[0]
+        offset += 4
+
+    signal = None
+    freq = None
+    fcs = False
+
+    for bit, (align, size) in enumerate(RADIOTAP_FIELDS):
+        if not present & (1 << bit):
+            continue
+
+        # fields are aligned relative to the start of the header
+        offset = (offset + align - 1) & ~(align - 1)
+        if offset + size > length:
+            break
+
+        if bit == 1:
+            fcs = bool(frame[offset] & 0x10)
+        elif bit == 3:
+            freq = struct.unpack_from('<H', frame, offset)[0]
+        elif bit == 5:
+            signal = struct.unpack_from('<b', frame, offset)[0]
+
+        offset += size
+
+    return length, signal, freq, fcs
+
+def parseElements(body, offset):
+    """
+    Walks the information elements of a beacon body
+
+    Args:
+        body (bytes): the 802.11 frame
+        offset (int): where the first information element starts
+
+    Returns:
+        tuple: (ssid, DS channel or None, HT primary channel or None, set of crypto strings)
+    """
+
+    ssid = None
+    dsChannel = None
+    htChannel = None
+    crypto = set()
+    end = len(body)
+
+    while offset + 2 <= end:
+        elementID = body[offset]
+        elementLen = body[offset + 1]
+        data = body[offset + 2: offset + 2 + elementLen]
+        offset += 2 + elementLen
+
+        if len(data) < elementLen: # truncated frame
+            break
+
+        if elementID == 0 and ssid is None:
+            ssid = data.decode('utf-8', errors='replace')
+        elif elementID == 3 and elementLen >= 1:
+            dsChannel = data[0]
+        elif elementID == 61 and elementLen >= 1:
+            htChannel = data[0]
+        elif elementID == 48:
+            crypto.add(f"WPA2/{parseAkm(data, 2)}")
+        elif elementID == 221 and data[:4] == WPA_OUI:
+            crypto.add(f"WPA/{parseAkm(data, 6)}")
+
+    return ssid, dsChannel, htChannel, crypto
+
+def parseAkm(data, offset):
+    """
+    Pulls the first AKM suite name out of an RSN or WPA element
+
+    Args:
+        data (bytes): the element payload
+        offset (int): where the group cipher suite starts
+
+    Returns:
+        str: name of the authentication suite
+    """
+
+    try:
+        offset += 4 # group cipher suite
+        pairwiseCount = struct.unpack_from('<H', data, offset)[0]
+        offset += 2 + (4 * pairwiseCount)
+        akmCount = struct.unpack_from('<H', data, offset)[0]
+        if akmCount > 0:
+            return AKM_NAMES.get(data[offset + 5], "UNKNOWN")
+    except (struct.error, IndexError):
+        pass
+    return "UNKNOWN"
+
+def parseBeacon(frame, radiotap=True):
+    """
+    Parses a beacon or probe response into the fields used by WifiTarget
+
+    Args:
+        frame (bytes): the captured frame
+        radiotap (bool, optional): True if the frame starts with a radiotap header. Defaults to True.
+
+    Returns:
+        tuple: (bssid, ssid, dBm, channel, crypto), or None if the frame is not a usable beacon
+    """
+
+    signal = None
+    freq = None
+    fcs = False
+
+    if radiotap:
+        header = parseRadiotap(frame)
+        if header is None:
+            return None
+        length, signal, freq, fcs = header
+        frame = frame[length:]
+
+    if fcs:
+        frame = frame[:-4]
+
+    # 24 byte header + 12 bytes of fixed beacon fields
+    if len(frame) < 36 or frame[0] not in (BEACON_FC, PROBE_RESP_FC):
+        return None
+
+    bssid = ':'.join(f"{b:02x}" for b in frame[10:16])
+    capability = struct.unpack_from('<H', frame, 34)[0]
+
+    ssid, dsChannel, htChannel, crypto = parseElements(frame, 36)
+
+    if ssid is None:
+        ssid = ""
+
+    # prefer the advertised channel, then HT info, then what the radio was tuned to
+    channel = dsChannel
+    if channel is None:
+        channel = htChannel
+    if channel is None and freq is not None:
+        channel = freqToChannel(freq)
+
+    if not crypto:
+        if capability & 0x0010: # privacy bit without RSN / WPA means WEP
+            crypto.add("WEP")
+        else:
+            crypto.add("OPN")
+
+    if signal is None:
+        signal = "N/A"
+
+    return bssid, ssid, signal, channel, crypto
+
+def openBeaconSocket(interface):
+    """
+    Opens a raw socket on a monitor mode interface with the beacon BPF filter attached
+
+    Args:
+        interface (str): the monitor mode interface
+
+    Returns:
+        socket: raw packet socket that only delivers beacons and probe responses
+    """
+
+    sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+
+    program = (_SockFilter * len(BEACON_FILTER))(*[_SockFilter(*ins) for ins in BEACON_FILTER])
+    fprog = struct.pack('HL', len(BEACON_FILTER), ctypes.addressof(program)) # kernel copies the program
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+
+    sock.bind((interface, 0))
+
+    return sock
+
+def sniffBeacons(interface, callback, stopCheck=None):
+    """
+    Reads beacons off a raw socket and hands parsed results to the callback
+
+    Args:
+        interface (str): the monitor mode interface
+        callback (function): called with (bssid, ssid, dBm, channel, crypto) for each beacon
+        stopCheck (function, optional): returns True when sniffing should stop. Defaults to None.
+    """
+
+    sock = openBeaconSocket(interface)
+    try:
+        while stopCheck is None or not stopCheck():
+            frame = sock.recv(65535)
+            result = parseBeacon(frame)
+            if result is not None:
+                callback(*result)
+    finally:
+        sock.close()
+
+def readPcap(fileName):
+    """
+    Reads frames out of a pcap file
+
+    Args:
+        fileName (str): path to the pcap file
+
+    Yields:
+        tuple: (timestamp, frame bytes, True if the frame has a radiotap header)
+    """
+
+    with open(fileName, 'rb') as infile:
+        header = infile.read(24)
+        if len(header) < 24:
+            return
+
+        magic = struct.unpack('<I', header[:4])[0]
+        if magic in (0xa1b2c3d4, 0xa1b23c4d):
+            endian = '<'
+        elif magic in (0xd4c3b2a1, 0x4d3cb2a1):
+            endian = '>'
+        else:
+            raise ValueError(f"{fileName} is not a pcap file")
+
+        # nanosecond resolution pcaps use a different magic
+        divisor = 1e9 if magic in (0xa1b23c4d, 0x4d3cb2a1) else 1e6
+        linkType = struct.unpack(endian + 'I', header[20:24])[0]
+
+        if linkType not in (LINKTYPE_RADIOTAP, LINKTYPE_IEEE802_11):
+            raise ValueError(f"Unsupported pcap link type {linkType}")
+
+        radiotap = linkType == LINKTYPE_RADIOTAP
+
+        while True:
+            record = infile.read(16)
+            if len(record) < 16:
+                break
+            tsSec, tsFrac, inclLen, _ = struct.unpack(endian + 'IIII', record)
+            frame = infile.read(inclLen)
+            if len(frame) < inclLen:
+                break
+            yield tsSec + (tsFrac / divisor), frame, radiotap
+
+def parseFrames(frames, radiotap=True):
+    """
+    Parses every beacon in a sequence of captured frames
+
+    Args:
+        frames (iterable): raw frames as bytes
+        radiotap (bool, optional): True if the frames start with a radiotap header. Defaults to True.
+
+    Returns:
+        list: list of (bssid, ssid, dBm, channel, crypto) tuples
+    """
+
+    beacons = []
+    for frame in frames:
+        result = parseBeacon(frame, radiotap)
+        if result is not None:
+            beacons.append(result)
+    return beacons
+
+def parsePcap(fileName):
+    """
+    Parses every beacon in a pcap file, useful for testing the parser offline
+
+    Args:
+        fileName (str): path to the pcap file
+
+    Returns:
+        list: list of (bssid, ssid, dBm, channel, crypto) tuples
+    """
+
+    beacons = []
+    for _, frame, radiotap in readPcap(fileName):
+        beacons.extend(parseFrames([frame], radiotap))
+    return beacons
+
+def parseScapyPcap(fileName):
+    """
+    Parses a pcap read with scapy's rdpcap, for checking the fast path against captures scapy can open and readPcap can't
+
+    Args:
+        fileName (str): path to the capture
+
+    Returns:
+        list: list of (bssid, ssid, dBm, channel, crypto) tuples
+    """
+
+    from scapy.all import rdpcap, RadioTap # only needed for the cross check
+
+    beacons = []
+    for packet in rdpcap(fileName):
+        beacons.extend(parseFrames([bytes(packet)], packet.haslayer(RadioTap)))
+    return beacons
+
+def readExpected(fileName):
+    """
+    Reads the expected parse of a capture, one beacon tuple per line as printed by this script
+
+    Args:
+        fileName (str): path to the expected output
+
+    Returns:
+        list: list of (bssid, ssid, dBm, channel, crypto) tuples
+    """
+
+    from ast import literal_eval # only needed for the check
+
+    with open(fileName, 'r') as infile:
+        return [literal_eval(line) for line in infile if line.strip()]
+
+if __name__ == "__main__":
+
+    import argparse # needed for the command line
+
+    parser = argparse.ArgumentParser(description="Parses the beacons in a pcap file with the fast path parser")
+    parser.add_argument("pcap", nargs='?', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "testdata", "beacons.pcap"),
+                        help="capture to parse, defaults to the bundled radiotap beacon capture")
+    parser.add_argument("--scapy", action="store_true", help="read the capture with scapy's rdpcap instead of the built in reader")
+    parser.add_argument("--expect", help="file of expected beacon tuples to check the parse against, testdata/beacons.expected goes with the bundled capture")
+    args = parser.parse_args()
+
+    beacons = parseScapyPcap(args.pcap) if args.scapy else parsePcap(args.pcap)
+    for beacon in beacons:
+        print(beacon)
+
+    if args.expect is not None:
+        expected = readExpected(args.expect)
+        if beacons != expected:
+            print(f"Parse doesn't match {args.expect}")
+            for line, (got, want) in enumerate(zip(beacons, expected)):
+                if got != want:
+                    print(f"  beacon {line}: got {got}, expected {want}")
+            if len(beacons) != len(expected):
+                print(f"  got {len(beacons)} beacons, expected {len(expected)}")
+            sys.exit(1)
+        print(f"{len(beacons)} beacons match {args.expect}")
@@ -0,0 +1,72 @@
+# Splits the wifi channels to scan across several monitor mode interfaces
+
+from targetTable import channelNumber # needed to compare channels
+
+class ChannelScheduler:
+    ''' Balanced channel to interface assignment, with busy channels sticking to the interface already on them '''
+
+    def __init__(self, validChannels, busyThreshold=3):
+        """
+        Initialization method
+
+        Args:
+            validChannels (dict): interface name -> set of channel strings that interface can tune to
+            busyThreshold (int, optional): Targets on a channel before it counts as busy and stays put. Defaults to 3.
+        """
+
+        self.validChannels = validChannels
+        self.interfaces = list(validChannels.keys())
+        self.busyThreshold = int(busyThreshold)
+        self.previous = {} # channel -> interface it was last assigned to
+
+    def capable(self, channel):
+        ''' Returns the interfaces that can tune to the channel '''
+
+        return [iface for iface in self.interfaces if channel in self.validChannels[iface]]
+
+    def assign(self, channels, busyCounts=None):
+        """
+        Partitions the channels across the interfaces
+
+        Args:
+            channels (iterable): channel strings to scan this round
+            busyCounts (dict, optional): channel number -> number of active targets on it. Defaults to None.
+
+        Returns:
+            dict: interface name -> list of channels, sorted by channel number
+        """
+
+        if busyCounts is None:
+            busyCounts = {}
+
+        assignments = {iface: [] for iface in self.interfaces}
+        channels = [ch for ch in set(channels) if self.capable(ch)]
+        if not channels:
+            return assignments
+
+        # no interface should get more than its fair share because of stickiness
+        fairShare = -(-len(channels) // len(self.interfaces))
+
+        # busy channels stay on the interface that has been hearing them
+        remaining = []
+        for ch in sorted(channels, key=lambda c: -busyCounts.get(channelNumber(c), 0)):
+            iface = self.previous.get(ch)
+            busy = busyCounts.get(channelNumber(ch), 0) >= self.busyThreshold
+            if busy and iface in assignments and ch in self.validChannels[iface] and len(assignments[iface]) < fairShare:
+                assignments[iface].append(ch)
+            else:
+                remaining.append(ch)
+
+        # most constrained channels first, each to the least loaded interface that can hear it
+        remaining.sort(key=lambda c: (len(self.capable(c)), channelNumber(c) or 0))
+        for ch in remaining:
+            iface = min(self.capable(ch), key=lambda i: (len(assignments[i]), self.interfaces.index(i)))
+            assignments[iface].append(ch)
+
+        self.previous = {}
+        for iface, assigned in assignments.items():
+            assigned.sort(key=lambda c: channelNumber(c) or 0)
+            for ch in assigned:
+                self.previous[ch] = iface
+
+        return assignments
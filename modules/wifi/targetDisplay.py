@@ -0,0 +1,108 @@
+# Incremental terminal view of the wifi targets
+
+from collections import deque # needed for the lock free hand off from the sniffers
+import heapq # needed for the top N view
+import time # needed for recency
+
+# ANSI escapes used to redraw in place instead of clearing the screen
+CURSOR_HOME = "\033[H"
+CLEAR_LINE = "\033[K"
+CLEAR_BELOW = "\033[J"
+
+HEADER = f"{'BSSID':<18} {'SSID':<32} {'Vendor':<24} {'dBm':>5} {'Ch':>4}  Crypto"
+
+class TargetDisplay:
+    ''' Keeps one formatted row per BSSID and only reformats the rows that changed '''
+
+    def __init__(self, maxRows=40, sortBy='signal'):
+        """
+        Initialization method
+
+        Args:
+            maxRows (int, optional): The number of rows shown. Defaults to 40.
+            sortBy (str, optional): 'signal' for strongest first or 'recent' for last heard first. Defaults to 'signal'.
+        """
+
+        self.maxRows = int(maxRows)
+        self.sortBy = sortBy
+
+        # sniffer threads append, the printer thread pops, deque makes both ends atomic
+        self.incoming = deque()
+
+        self.rows = {} # bssid -> (sort signal, last seen, formatted line)
+        self.changed = True
+        self.lastFrame = ''
+
+    def push(self, target):
+        ''' Queues a snapshot of the target, safe to call from any sniffer thread '''
+
+        self.incoming.append((target.bssid, target.ssid, target.vendor, target.dBm, target.ch, target.crypto, time.time()))
+
+    def drain(self):
+        """
+        Applies every queued update to the rows
+
+        Returns:
+            int: the number of updates applied
+        """
+
+        count = 0
+        while True:
+            try:
+                bssid, ssid, vendor, dBm, ch, crypto, seen = self.incoming.popleft()
+            except IndexError:
+                break
+
+            try:
+                signal = float(dBm)
+            except (TypeError, ValueError): # N/A
+                signal = float('-inf')
+
+            line = f"{bssid:<18} {str(ssid)[:32]:<32} {str(vendor)[:24]:<24} {str(dBm):>5} {str(ch):>4}  {', '.join(sorted(crypto)) if crypto else ''}"
+            self.rows[bssid] = (signal, seen, line)
+            count += 1
+
+        if count:
+            self.changed = True
+        return count
+
+    def remove(self, bssids):
+        ''' Drops the rows of targets that are no longer tracked '''
+
+        for bssid in bssids:
+            if self.rows.pop(bssid, None) is not None:
+                self.changed = True
+
+    def view(self):
+        """
+        Picks the rows to show
+
+        Returns:
+            list: the formatted lines of the top rows
+        """
+
+        if self.sortBy == 'recent':
+            key = lambda row: row[1]
+        else:
+            key = lambda row: (row[0], row[1])
+
+        return [row[2] for row in heapq.nlargest(self.maxRows, self.rows.values(), key=key)]
+
+    def render(self, total):
+        """
+        Builds the frame to print, reusing the last one when nothing changed
+
+        Args:
+            total (int): the number of targets in the hot table
+
+        Returns:
+            str: the frame, starting with a cursor home so it draws over the last one
+        """
+
+        if self.changed:
+            lines = [HEADER] + self.view()
+            lines.append(f"Showing {len(lines) - 1} of {total} targets, sorted by {self.sortBy}")
+            self.lastFrame = CURSOR_HOME + ''.join(line + CLEAR_LINE + '\n' for line in lines) + CLEAR_BELOW
+            self.changed = False
+
+        return self.lastFrame
@@ -0,0 +1,193 @@
+# Bounded table of the wifi targets that are currently nearby
+
+from collections import OrderedDict # needed for LRU ordering
+from threading import Lock # needed for thread safety
+import pickle # needed for data writing / reading
+
+def channelNumber(ch):
+    """
+    Normalizes a channel to an int so '06' from the hopper matches 6 from a beacon
+
+    Args:
+        ch (str or int): the channel
+
+    Returns:
+        int: the channel number, or None if it can't be converted
+    """
+
+    try:
+        return int(ch)
+    except (TypeError, ValueError):
+        return None
+
+class TargetTable:
+    ''' Hot table of active targets, with LRU and channel visit aging into a persistent archive '''
+
+    def __init__(self, maxTargets=2000, archiveFile='wifiArchive.pkl'):
+        """
+        Initialization method
+
+        Args:
+            maxTargets (int, optional): The max number of targets kept in memory. Defaults to 2000.
+            archiveFile (str, optional): File evicted targets are appended to. Defaults to 'wifiArchive.pkl'.
+        """
+
+        self.maxTargets = int(maxTargets)
+        self.archiveFile = archiveFile
+
+        self.active = OrderedDict() # bssid -> WifiTarget, least recently heard first
+        self.channelIndex = {} # channel -> set of bssids on that channel
+        self.pending = [] # evicted targets waiting to be written to the archive
+        self.evicted = set() # evicted bssids the display hasn't dropped yet
+        self.lock = Lock()
+
+    def __len__(self):
+        return len(self.active)
+
+    def __indexAdd(self, target):
+        ''' adds a target to the channel index '''
+
+        self.channelIndex.setdefault(channelNumber(target.ch), set()).add(target.bssid)
+
+    def __indexRemove(self, target):
+        ''' removes a target from the channel index '''
+
+        bssids = self.channelIndex.get(channelNumber(target.ch))
+        if bssids is not None:
+            bssids.discard(target.bssid)
+            if not bssids:
+                del self.channelIndex[channelNumber(target.ch)]
+
+    def __evict(self, bssid):
+        ''' moves a target from the hot table to the archive queue, lock must be held '''
+
+        target = self.active.pop(bssid)
+        self.__indexRemove(target)
+        self.pending.append(target)
+        self.evicted.add(bssid)
+
+    def update(self, newTarget):
+        """
+        Adds a new target or refreshes the matching one
+
+        Args:
+            newTarget (WifiTarget): the freshly parsed target
+
+        Returns:
+            int: the number of least recently heard targets evicted to stay under the cap
+        """
+
+        with self.lock:
+            target = self.active.get(newTarget.bssid)
+
+            if target is not None:
+                self.__indexRemove(target)
+                target.matchTarget(newTarget)
+                self.__indexAdd(target)
+                self.active.move_to_end(target.bssid)
+                return 0
+
+            self.active[newTarget.bssid] = newTarget
+            self.__indexAdd(newTarget)
+
+            # over the cap, drop the least recently heard targets
+            evicted = 0
+            while len(self.active) > self.maxTargets:
+                self.__evict(next(iter(self.active)))
+                evicted += 1
+
+            return evicted
+
+    def visitChannel(self, ch):
+        """
+        Ages the targets on the channel that was just scanned, evicting the ones that timed out
+
+        Args:
+            ch (str or int): the channel that was just scanned
+
+        Returns:
+            int: the number of targets evicted
+        """
+
+        with self.lock:
+            bssids = self.channelIndex.get(channelNumber(ch))
+            if not bssids:
+                return 0
+
+            expired = [bssid for bssid in bssids if self.active[bssid].updateTimeout(ch)]
+            for bssid in expired:
+                self.__evict(bssid)
+
+            return len(expired)
+
+    def busyCounts(self):
+        ''' Returns a dict of channel number -> number of active targets on it '''
+
+        with self.lock:
+            return {ch: len(bssids) for ch, bssids in self.channelIndex.items()}
+
+    def popEvicted(self):
+        ''' Returns and clears the bssids evicted since the last call, skipping the ones heard again since '''
+
+        with self.lock:
+            evicted = self.evicted
+            self.evicted = set()
+            return [bssid for bssid in evicted if bssid not in self.active]
+
+    def contains(self, bssid):
+        ''' Returns True if the bssid is in the hot table '''
+
+        return bssid in self.active
+
+    def targets(self):
+        ''' Returns a snapshot list of the active targets '''
+
+        with self.lock:
+            return list(self.active.values())
+
+    def archive(self, targets):
+        ''' Queues already known targets, like an old log, straight into the archive '''
+
+        with self.lock:
+            self.pending.extend(targets)
+
+    def flushArchive(self):
+        """
+        Appends the evicted targets to the archive file and drops them from memory
+
+        Returns:
+            int: number of targets written
+        """
+
+        with self.lock:
+            pending = self.pending
+            self.pending = []
+
+        if pending:
+            with open(self.archiveFile, 'ab') as archiveFile:
+                pickle.dump(pending, archiveFile, -1)
+
+        return len(pending)
+
+def loadArchive(fileName='wifiArchive.pkl'):
+    """
+    Reads every batch out of an archive file
+
+    Args:
+        fileName (str, optional): the archive file. Defaults to 'wifiArchive.pkl'.
+
+    Returns:
+        list: all archived targets, oldest first
+    """
+
+    targets = []
+    try:
+        with open(fileName, 'rb') as archiveFile:
+            while True:
+                try:
+                    targets.extend(pickle.load(archiveFile))
+                except EOFError:
+                    break
+    except FileNotFoundError:
+        pass
+    return targets
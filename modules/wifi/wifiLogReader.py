@@ -1,6 +1,7 @@
 # Displays the wiki logs for easy reading
 
 from wifiScanner import WifiTarget # needed for wifi targets
+from targetTable import loadArchive # needed for archived targets
 
 import pandas # used for pretty print to screen
 import time # needed for sleep
@@ -21,6 +22,9 @@ try:
 except:
     print("Load file does not exist")
 
+# archived targets come first so the latest sighting of each BSSID wins
+targetList = loadArchive('wifiArchive.pkl') + targetList
+
 
 # initialize the networks dataframe that will contain all access points nearby 
 pandas.set_option('display.max_rows', None)
@@ -32,4 +36,4 @@ for target in targetList:
     networks.loc[target.bssid] = (target.ssid, target.vendor, target.dBm, target.ch, target.crypto)
 
 print(networks)
-print(f"Total length: {len(targetList)}\n")
\ No newline at end of file
+print(f"Total length: {len(networks)}\n")
\ No newline at end of file
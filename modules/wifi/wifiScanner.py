@@ -1,6 +1,4 @@
-from scapy.all import * # needed for reading the packets
 from threading import Thread # needed for multithreading
-import pandas # used for pretty print to screen
 import time # needed for sleep
 import os # needed to run commands
 import sys # needed for system
@@ -9,17 +7,43 @@ import subprocess # needed for subprocess calls
 import csv # needed for manufacturer lookup
 import pickle # needed for data writing / reading
 
+import argparse # needed for command line options
+
 import pika # needed for rabbitMQ
 
+import beaconParser # needed for the fast beacon path
+from targetDisplay import TargetDisplay # needed for the incremental display
+from targetTable import TargetTable, channelNumber # needed for the bounded target table
+from channelScheduler import ChannelScheduler # needed to split channels across interfaces
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')) # needed for the shared cactus modules
+import metrics # needed for runtime stats
+from cactusConfig import parseArgs # needed for the config file
+from bands import BAND_EXCHANGE, routingKey # needed for band routed scans
+from sweepRing import SweepRing # needed for the shared memory transport
+from profiler import LoopProfiler # needed for on demand profiling
+from geoStore import GeoStore # needed for geo tagged beacons
+from position import openFeed # needed for geo tagged beacons
+
+# per stage metrics for the scanner
+BEACONS = metrics.counter('wifi_beacons_total', 'Beacons and probe responses parsed')
+BEACON_SECONDS = metrics.histogram('wifi_beacon_seconds', 'Time handling one parsed beacon')
+HOP_SECONDS = metrics.histogram('wifi_channel_hop_seconds', 'Time to retune an interface')
+CHANNEL_VISITS = metrics.counter('wifi_channel_visits_total', 'Channel dwells completed')
+TARGETS = metrics.gauge('wifi_targets', 'Targets in the hot table')
+EVICTIONS = metrics.counter('wifi_evictions_total', 'Targets aged out of or pushed over the cap of the hot table')
+
 # Note, must run as root for wifi stuff
 
 class WifiTarget:
     ''' Class that handles the wifi targets found by the sweeper '''
 
-    def __init__(self, bssid, ssid, dBm, ch, crypto):
-        ''' init method '''
+    __slots__ = ('maxTimeout', 'bssid', 'ssid', 'dBm', 'ch', 'crypto', 'timeOut', 'key', 'vendor')
 
-        self.maxTimeout = 3
+    def __init__(self, bssid, ssid, dBm, ch, crypto, maxTimeout=3):
+        ''' init method \n maxTimeout: number of visits to the target's channel without hearing it before it times out '''
+
+        self.maxTimeout = maxTimeout
 
         self.bssid = bssid
         self.ssid = ssid
@@ -32,6 +56,26 @@ class WifiTarget:
         self.key = str(self.bssid).replace(':','').upper()[0:6]
         self.vendor = "Unknown"
 
+    def __getstate__(self):
+        ''' pickles the slots as a dict so logs stay readable across versions '''
+
+        return {name: getattr(self, name) for name in self.__slots__ if hasattr(self, name)}
+
+    def __setstate__(self, state):
+        ''' restores from a slots dict or from a log written before WifiTarget used slots '''
+
+        if isinstance(state, tuple): # (dict state, slots state)
+            state = {**(state[0] or {}), **(state[1] or {})}
+
+        for name in self.__slots__:
+            if name in state:
+                setattr(self, name, state[name])
+
+        if not hasattr(self, 'maxTimeout'):
+            self.maxTimeout = 3
+        if not hasattr(self, 'timeOut'):
+            self.timeOut = self.maxTimeout
+
     def setVendor(self, vendor):
         ''' Updates the vendor '''
 
@@ -41,7 +85,7 @@ class WifiTarget:
         ''' updates the timeout of the target object, \n ch: the channel currently being scanned \n Return True when timeout hits zero '''
 
         # if the channel being scanned is the channel the target should be on
-        if ch == self.ch :
+        if channelNumber(ch) == channelNumber(self.ch) :
             self.timeOut = self.timeOut - 1
             
             # if the timout has been reduced to zero
@@ -72,18 +116,21 @@ class WifiTarget:
 class WifiScanner:
     ''' Class that handles independently searching wifi frequencies for wifi networks '''
 
-    def setupInterface(self):
-        ''' Puts the interface into monitor mode '''
+    def setupInterface(self, interface=None):
+        ''' Puts the interface into monitor mode \n interface: defaults to the first interface '''
 
-        print(f"Placing {self.interface} into monitor mode")
-        os.system('ifconfig ' + self.interface + ' down')
+        if interface is None:
+            interface = self.interface
+
+        print(f"Placing {interface} into monitor mode")
+        os.system('ifconfig ' + interface + ' down')
         try:
-            os.system('iwconfig ' + self.interface + ' mode monitor')
+            os.system('iwconfig ' + interface + ' mode monitor')
         except:
             print("Failed to setup monitor mode")
             return False
 
-        os.system('ifconfig ' + self.interface + ' up')
+        os.system('ifconfig ' + interface + ' up')
         
         return True
 
@@ -104,22 +151,62 @@ class WifiScanner:
             newFreqs.append(data[i].decode("utf-8"))
 
         #print(f"New Freqs: {len(newFreqs)}")
-        self.updateChannels(newFreqs)
-
-
-    def __init__(self, interface):
-        ''' init method '''
+        # band routed scans come one message per band, so each band keeps its own channels until its next message
+        self.updateChannels(newFreqs, None if self.routing == 'fanout' else method.routing_key)
+
+
+    def __init__(self, interface, maxTargets=2000, maxTimeout=3, displayRows=40, displaySort='signal', metricsPort=None, statsInterval=None, profileDir='profiles', profileControl=False, routing='fanout', bands=('2400', '5000'), ringName=None, geoDir=None, position='gpsd'):
+        ''' init method \n interface: one interface name or a list of them \n maxTargets: cap on the targets held in memory \n maxTimeout: channel visits without a beacon before a target is archived \n displayRows / displaySort: size and order ('signal' or 'recent') of the screen view \n metricsPort / statsInterval: Prometheus port and stats exchange period, None disables them \n profileDir / profileControl: where profiles go and whether the control exchange can start them \n routing / bands: 'fanout' receives every sweep, 'bands' only the named wifi bands from a cactus publishing per band \n ringName: read scans from cactus' shared memory ring instead of RabbitMQ when both run on this machine \n geoDir / position: folder for position tagged beacons and the feed tagging them ('gpsd', 'file:track.csv' or 'sim'), None disables it '''
+
+        self.ringName = ringName
+        self.routing = routing
+        self.bands = [str(band) for band in bands]
+
+        # every beacon is stored with where it was heard, written from the store's own thread
+        self.geoStore = None
+        if geoDir is not None:
+            self.geoStore = GeoStore(geoDir, openFeed(position))
+
+        # optional stats outputs
+        if metricsPort is not None:
+            metrics.startMetricsServer(metricsPort)
+        if statsInterval is not None:
+            metrics.startStatsPublisher('wifi', statsInterval)
+
+        # profiling, SIGUSR1 profiles every sniffer and hopper thread and SIGUSR2 dumps the hop timing trace
+        # sniffers tick once per beacon, so captures are bounded by time rather than iterations
+        self.hopId = 0
+        self.profiler = LoopProfiler('wifi', outputDir=profileDir, defaultIterations=1000000)
+        self.profiler.installSignals()
+        if profileControl:
+            self.profiler.listenControl()
+
+        if isinstance(interface, str):
+            self.interfaces = [interface]
+        else:
+            self.interfaces = [str(iface) for iface in interface]
+        self.interface = self.interfaces[0]
 
-        self.interface = str(interface)
         self.ch = 1
-        self.targetList = []
-        self.quickList = []
+        self.currentChannel = {iface: 1 for iface in self.interfaces}
+        self.maxTimeout = maxTimeout
+        self.targets = TargetTable(maxTargets=maxTargets)
+        self.display = TargetDisplay(maxRows=displayRows, sortBy=displaySort)
         self.loadDictionary()
-        self.setupInterface()
+        for iface in self.interfaces:
+            self.setupInterface(iface)
         #self.validChannel = {'1', '2', '3', '4', '5', '6', '7', '8', '9', '10', '11', '12', '13', '14', '36', '38', '40', '42', '44', '46', '48', '52', '54', '56', '58', '60', '62', '64', '100', '102', '104', '106'}
-        self.validChannel = self.getValidChannels(interface)
+        self.validChannels = {iface: self.getValidChannels(iface) for iface in self.interfaces}
+        self.validChannel = set().union(*self.validChannels.values())
         self.loadTargets()
         self.channelList = []
+        self.bandChannels = {} # routing key -> (time received, channel set) of the newest scan of each band
+        self.bandMaxAge = 10 # seconds a band's channels count without a new scan, cactus sends nothing for an empty band
+
+        # every interface gets its own share of the channels
+        self.scheduler = ChannelScheduler(self.validChannels)
+        self.defaultAssignments = ChannelScheduler(self.validChannels).assign(self.validChannel)
+        self.channelAssignments = {}
 
     def getValidChannels(self, interface):
         """
@@ -173,42 +260,53 @@ class WifiScanner:
             #print(f"{len(self.vendorDict)}")
 
     def callback(self, packet):
-        ''' method to parse out the packet data and add it to the target list '''
-        if packet.haslayer(Dot11Beacon): # else do nothing
+        ''' method to parse out the packet data and add it to the target list \n only used by the scapy fallback '''
+        from scapy.all import Dot11, Dot11Beacon, Dot11ProbeResp, Dot11Elt # already loaded by the fallback, just a lookup here
+
+        if packet.haslayer(Dot11Beacon) or packet.haslayer(Dot11ProbeResp): # else do nothing
             # extract the MAC address of the network
             bssid = packet[Dot11].addr2
             # get the name of it
-            ssid = packet[Dot11Elt].info.decode()
+            ssid = packet[Dot11Elt].info.decode(errors='replace')
             try:
                 dbm_signal = packet.dBm_AntSignal
             except:
                 dbm_signal = "N/A"
             # extract network stats
-            stats = packet[Dot11Beacon].network_stats()
+            if packet.haslayer(Dot11Beacon):
+                stats = packet[Dot11Beacon].network_stats()
+            else:
+                stats = packet[Dot11ProbeResp].network_stats()
             # get the channel of the AP
             channel = stats.get("channel")
             # get the crypto
             crypto = stats.get("crypto")
-            
-            newTarget = WifiTarget(bssid, ssid, dbm_signal, channel, crypto)
+
+            self.addTarget(bssid, ssid, dbm_signal, channel, crypto)
+
+    def addTarget(self, bssid, ssid, dBm, channel, crypto):
+        ''' adds a parsed beacon to the quick list and the target list '''
+
+        self.profiler.tick(BEACONS.value)
+
+        with BEACON_SECONDS.time():
+            newTarget = WifiTarget(bssid, ssid, dBm, channel, crypto, self.maxTimeout)
             newTarget.setVendor(self.vendorDict.get(newTarget.key))
 
-            self.quickList.append(newTarget)
+            # Adding Target to the hot table, matches by BSSID
+            EVICTIONS.inc(self.targets.update(newTarget))
 
-            # Adding Target to Target List
-            matched = False
-            for target in self.targetList: 
-                
-                if target.matchTarget(newTarget) : 
-                    matched = True
-                    break # found match, exit loop
+            # pushed once it's in the table, so an eviction notice never hides a fresh row
+            self.display.push(newTarget)
 
-            if not matched : 
+            if self.geoStore is not None:
+                self.geoStore.addWifi(bssid, dBm, channel)
 
-                self.targetList.append(newTarget)
+        BEACONS.inc()
+        TARGETS.set(len(self.targets))
 
-    def updateChannels(self, freqList):
-        ''' updates the scanner list based off of seen frequencies from the wide sweeper '''
+    def updateChannels(self, freqList, band=None):
+        ''' updates the scanner list based off of seen frequencies from the wide sweeper \n band: routing key when freqList only covers one band, the other bands keep their channels '''
 
         channelSet = set()
         #print(str(freqList) + '\n')
@@ -348,56 +446,77 @@ class WifiScanner:
                 if abs(int(freq) - 5865000000) <= 10000000 and '173' in self.validChannel :
                     channelSet.add('173')
                 
+        if band is not None:
+            now = time.time()
+            self.bandChannels[band] = (now, channelSet)
+            channelSet = set().union(*[channels for received, channels in self.bandChannels.values() if now - received <= self.bandMaxAge])
+
         self.channelList = list(channelSet)
 
+        # split the channels across the interfaces, busy channels stay where they are
+        self.channelAssignments = self.scheduler.assign(channelSet, self.targets.busyCounts())
+
         #print(self.channelList)
 
-    def loop_channels(self):
-        ''' loops through the possible wifi channels \n needs to be a separate thread'''
+    def tuneChannel(self, interface, channel):
+        ''' tunes the interface, dwells on the channel, then ages out targets that stayed quiet '''
+
+        self.ch = channel
+        self.currentChannel[interface] = channel
+        #print(self.ch)
+        self.hopId += 1
+        hopId = self.hopId
+        self.profiler.tick(hopId)
+
+        hopStart = time.perf_counter()
+        with HOP_SECONDS.time():
+            os.system(f"iwconfig {interface} channel {channel}")
+        self.profiler.trace(hopId, f"hop {interface} {channel}", time.perf_counter() - hopStart)
+        time.sleep(0.2) # scanning time
+
+        ageStart = time.perf_counter()
+        EVICTIONS.inc(self.targets.visitChannel(channel))
+        self.profiler.trace(hopId, 'age', time.perf_counter() - ageStart)
+        CHANNEL_VISITS.inc()
+        TARGETS.set(len(self.targets))
+
+    def loop_channels(self, interface=None):
+        ''' loops through the possible wifi channels \n interface: defaults to the first interface \n needs to be a separate thread'''
+
+        if interface is None:
+            interface = self.interface
 
         while True:
 
-            #print(f"Channel List len: {len(self.channelList)}")
+            # pop so a new assignment from the sweeper is never lost
+            tempList = self.channelAssignments.pop(interface, None)
 
-            if not self.channelList: # if channel list is empty sweep sequentially
-                print("Empty Target list, using default scan")
-                for channel in self.validChannel:
-                    self.ch = channel
-                    #print(self.ch)
-                    os.system(f"iwconfig {self.interface} channel {self.ch}")
-                    time.sleep(0.2) # scanning time
+            if not tempList: # if channel list is empty sweep sequentially
+                print(f"Empty Target list on {interface}, using default scan")
+                for channel in self.defaultAssignments[interface]:
+                    self.tuneChannel(interface, channel)
             else:
-                tempList = self.channelList.copy()
-                self.channelList.clear() # clear out the old list
-                print(f"{str(len(tempList))} : {str(tempList)}")
+                print(f"{interface} {str(len(tempList))} : {str(tempList)}")
                 for channel in tempList:
-                    self.ch = channel
-                    #print(self.ch)
-                    os.system(f"iwconfig {self.interface} channel {self.ch}")
-                    time.sleep(0.2) # scanning time
+                    self.tuneChannel(interface, channel)
                 
             
 
     def printTarget(self):
         ''' prints out the currently tracked targets to the screen \n needs to be a separate thread'''
 
-        # initialize the networks dataframe that will contain all access points nearby 
-        pandas.set_option('display.max_rows', None)
-        networks = pandas.DataFrame(columns=["BSSID", "SSID", "Vendor", "dBm_Signal", "Channel", "Crypto"])
-        # set the index BSSID (MAC address of the AP)
-        networks.set_index("BSSID", inplace=True)
+        os.system("clear") # once, after that the display draws over itself
 
         while True:
 
-            os.system("clear")
+            # only the targets heard or archived since the last tick touch the display
+            # removals go last so a row queued before its target was evicted doesn't linger,
+            # popEvicted already skips targets heard again
+            self.display.drain()
+            self.display.remove(self.targets.popEvicted())
 
-            for target in self.quickList: 
-                networks.loc[target.bssid] = (target.ssid, target.vendor, target.dBm, target.ch, target.crypto)
-
-            # clear the quicklist so that old signals go away
-            self.quickList = []
-            print(networks)
-            print(f"Total length: {len(self.targetList)}\n")
+            sys.stdout.write(self.display.render(len(self.targets)))
+            sys.stdout.flush()
 
             time.sleep(1)
 
@@ -406,8 +525,11 @@ class WifiScanner:
 
         while True:
 
+            # evicted targets go to the archive, the log holds the current hot table
+            self.targets.flushArchive()
+
             saveFile = open('wifiLog.pkl', 'wb')
-            pickle.dump(self.targetList, saveFile, -1)
+            pickle.dump(self.targets.targets(), saveFile, -1)
             saveFile.close()
 
             print("Writing to log")
@@ -415,13 +537,19 @@ class WifiScanner:
             time.sleep(60)
 
     def loadTargets(self):
-        ''' Loads the old target list from a pickle '''
+        ''' Moves the old target list from the last run into the archive, so the hot table starts empty '''
         try:
             f = open('wifiLog.pkl', 'rb')
-            print("Loading old Target List")
-            self.targetList = pickle.load(f)
+            print("Archiving old Target List")
+            self.targets.archive(pickle.load(f))
             #print(str(self.targetList))
             f.close()
+            self.targets.flushArchive()
+
+            # empty the log so a restart doesn't archive the same targets twice
+            saveFile = open('wifiLog.pkl', 'wb')
+            pickle.dump([], saveFile, -1)
+            saveFile.close()
         except:
             print("Load file does not exist")
 
@@ -436,46 +564,98 @@ class WifiScanner:
         pika.ConnectionParameters(host='localhost'))
         channel = connection.channel()
 
-        channel.exchange_declare(exchange='scanSweep', exchange_type='fanout')
+        if self.routing == 'bands':
+            # only a cactus publishing per band declares the exchange, binding to one we made ourselves would hear nothing
+            try:
+                channel.exchange_declare(exchange=BAND_EXCHANGE, passive=True)
+            except pika.exceptions.ChannelClosedByBroker:
+                print(f"No {BAND_EXCHANGE} exchange, cactus isn't publishing per band (run it with --routing bands or both), using the scanSweep fanout instead")
+                self.routing = 'fanout'
+                channel = connection.channel()
 
         result = channel.queue_declare(queue='', exclusive=True)
         queue_name = result.method.queue
 
-        channel.queue_bind(exchange='scanSweep', queue=queue_name)
+        if self.routing == 'fanout': # every target of every sweep
+            channel.exchange_declare(exchange='scanSweep', exchange_type='fanout')
+            channel.queue_bind(exchange='scanSweep', queue=queue_name)
+        else: # only the wifi bands
+            channel.exchange_declare(exchange=BAND_EXCHANGE, exchange_type='topic')
+            for band in self.bands:
+                channel.queue_bind(exchange=BAND_EXCHANGE, queue=queue_name, routing_key=routingKey('scan', band))
         channel.basic_consume(queue=queue_name, on_message_callback=self.rabbitCallback, auto_ack=True)
         channel.start_consuming()
 
-    def startSniffer(self):
-        ''' Starts and runs the packet sniffer \n note: because this is blocking, it must be its own thread '''
+    def linkRing(self):
+        ''' Follows the scans cactus writes to shared memory, only the wifi bands are handed to updateChannels '''
+
+        print(f"Reading scans from shared memory ring {self.ringName}_scan")
+        ring = SweepRing.attach(f"{self.ringName}_scan")
+
+        for seq, timestamp, view in ring.entries():
+            freqs = view[:, 0]
+            inWifi = ((freqs >= 2401000000) & (freqs <= 2495000000)) | ((freqs >= 5150000000) & (freqs <= 5835000000))
+            newFreqs = freqs[inWifi].astype(int).tolist()
+
+            if ring.valid(seq): # cactus didn't lap us while the view was read
+                self.updateChannels(newFreqs)
+
+    def startSniffer(self, interface=None):
+        ''' Starts and runs the packet sniffer \n interface: defaults to the first interface \n note: because this is blocking, it must be its own thread '''
+
+        if interface is None:
+            interface = self.interface
+
+        # fast path: kernel filtered raw socket with the struct based parser
+        try:
+            beaconParser.sniffBeacons(interface, self.addTarget)
+            return
+        except (OSError, AttributeError) as e: # no AF_PACKET or no permissions
+            print(f"Fast beacon parser unavailable on {interface} ({e}), falling back to scapy")
+
+        # scapy takes seconds to import, so it's only loaded when the fast path can't be used
+        from scapy.all import sniff # needed for reading the packets
+
         # start sniffing
         try:
-            sniff(prn=self.callback, iface=self.interface)
+            sniff(prn=self.callback, iface=interface, filter=beaconParser.SCAPY_FILTER)
         except TypeError:
             print("Scapy ran into a type error")
             # Restart thread
-            self.snifferThread = Thread(target=self.startSniffer, daemon=False)
-            self.snifferThread.start()
+            self.snifferThreads[interface] = Thread(target=self.startSniffer, args=(interface,), daemon=False)
+            self.snifferThreads[interface].start()
 
     def close(self):
-        self.snifferThread.setDaemon(True)
+        if self.geoStore is not None:
+            self.geoStore.close()
+        for thread in self.snifferThreads.values():
+            thread.setDaemon(True)
         sys.exit()
                     
     def startScanner(self):
-        ''' starts the channel hopper and display before starting the packet sniffer loops '''
+        ''' starts the channel hoppers and display before starting the packet sniffer loops, one sniffer and hopper per interface '''
 
-        self.snifferThread = Thread(target=self.startSniffer, daemon=False)
-        self.snifferThread.start()
+        self.snifferThreads = {}
+        self.channelHoppers = {}
+
+        for iface in self.interfaces:
+            self.snifferThreads[iface] = Thread(target=self.startSniffer, args=(iface,), daemon=False)
+            self.snifferThreads[iface].start()
         
         self.printerThread = Thread(target=self.printTarget, daemon=True)
         self.printerThread.start()
 
-        self.channelHopper = Thread(target=self.loop_channels, daemon=True)
-        self.channelHopper.start()
+        for iface in self.interfaces:
+            self.channelHoppers[iface] = Thread(target=self.loop_channels, args=(iface,), daemon=True)
+            self.channelHoppers[iface].start()
 
         self.saveThread = Thread(target=self.saveTargets, daemon=True)
         self.saveThread.start()
 
-        self.rabbitThread = Thread(target=self.linkRabbit, daemon=True)
+        if self.ringName is not None:
+            self.rabbitThread = Thread(target=self.linkRing, daemon=True)
+        else:
+            self.rabbitThread = Thread(target=self.linkRabbit, daemon=True)
         self.rabbitThread.start()
 
 def check_root():
@@ -486,25 +666,34 @@ def check_root():
         exit(1)
 
 if __name__ == "__main__":
-    
+
+    parser = argparse.ArgumentParser(description="Wifi beacon scanner, hops to the channels cactus sees activity on")
+    parser.add_argument("interface", nargs="*", default=["wlx9cefd5fd14f7"], help="monitor mode capable interfaces")
+    parser.add_argument("--max-targets", dest="maxTargets", type=int, default=2000, help="targets held in memory")
+    parser.add_argument("--max-timeout", dest="maxTimeout", type=int, default=3, help="channel visits without a beacon before a target is archived")
+    parser.add_argument("--display-rows", dest="displayRows", type=int, default=40, help="rows shown on screen")
+    parser.add_argument("--display-sort", dest="displaySort", choices=["signal", "recent"], default="signal", help="order of the screen view")
+    parser.add_argument("--metrics-port", dest="metricsPort", type=int, help="port for Prometheus metrics")
+    parser.add_argument("--stats-interval", dest="statsInterval", type=float, help="seconds between stats messages")
+    parser.add_argument("--profile-dir", dest="profileDir", default="profiles", help="folder for profiles and traces")
+    parser.add_argument("--profile-control", dest="profileControl", action="store_true", help="accept profiling commands on the control exchange")
+    parser.add_argument("--routing", choices=["fanout", "bands"], default="fanout", help="receive every sweep, or only the wifi bands from a cactus run with --routing bands or both")
+    parser.add_argument("--bands", nargs="+", default=["2400", "5000"], help="cactus band names to receive")
+    parser.add_argument("--geo-dir", dest="geoDir", help="folder to store position tagged beacons in")
+    parser.add_argument("--position", default="gpsd", help="position feed for --geo-dir: gpsd, gpsd:host:port, file:track.csv or sim")
+    parser.add_argument("--ring", dest="ringName", help="read scans from cactus' shared memory rings with this name prefix instead of RabbitMQ")
+    args = parseArgs(parser, 'wifi')
+
     print("Starting scanner: ")
 
     # check to see if running as root
     check_root()
 
-    # default interface
-    interface = "wlx9cefd5fd14f7"
-    #interface = "wlx9cefd5fcd2ba"
-
-    # looks for custom arguments
-    if len(sys.argv) > 1 :
-        interface = str(sys.argv[1])
-
-    print(f"Using interface: {interface}")
+    print(f"Using interfaces: {', '.join(args.interface)}")
 
     try:
-        scanner = WifiScanner(interface)
+        scanner = WifiScanner(**vars(args))
         scanner.startScanner()
     except (KeyboardInterrupt, SystemExit):
         print("shutting Down")
-        scanner.close()
\ No newline at end of file
+        scanner.close()
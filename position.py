@@ -0,0 +1,253 @@
+# Position feeds for tagging detections on moving platforms
+
+import json # needed for the gpsd protocol
+import calendar # needed for gpsd's UTC times
+import math # needed for the simulated track
+import time # needed for fix ages
+import socket # needed for gpsd
+from threading import Thread, Lock # needed for the reader threads
+
+class PositionFeed:
+    """
+    Base feed, keeps the latest fix and hands it out while it's fresh
+    """
+
+    def __init__(self, maxAge=5.0):
+        """
+        Initialization method
+
+        Args:
+            maxAge (float, optional): Seconds a fix stays usable. Defaults to 5.
+        """
+
+        self.maxAge = float(maxAge)
+        self.fix = None # (lat, lon, alt, fix time, local time received)
+        self.lock = Lock()
+
+    def setFix(self, lat, lon, alt=None, fixTime=None):
+        ''' Stores a new fix, alt and fixTime are optional '''
+
+        now = time.time()
+        with self.lock:
+            self.fix = (float(lat), float(lon), None if alt is None else float(alt), now if fixTime is None else float(fixTime), now)
+
+    def position(self):
+        """
+        Gets the latest fix
+
+        Returns:
+            tuple: (lat, lon, alt), None without a fresh fix
+        """
+
+        with self.lock:
+            fix = self.fix
+        if fix is None or time.time() - fix[4] > self.maxAge:
+            return None
+        return fix[0], fix[1], fix[2]
+
+    def close(self):
+        ''' Stops the feed '''
+
+        pass
+
+def parseTpv(line):
+    """
+    Reads a gpsd TPV report
+
+    Args:
+        line (str): one line of gpsd JSON
+
+    Returns:
+        tuple: (lat, lon, alt, fix time), None for other reports or no fix
+    """
+
+    try:
+        report = json.loads(line)
+    except ValueError:
+        return None
+
+    if report.get('class') != 'TPV' or report.get('mode', 0) < 2 or 'lat' not in report or 'lon' not in report:
+        return None
+
+    fixTime = None
+    if 'time' in report:
+        try:
+            fixTime = calendar.timegm(time.strptime(report['time'][:19], '%Y-%m-%dT%H:%M:%S'))
+        except ValueError:
+            pass
+
+    return report['lat'], report['lon'], report.get('altHAE', report.get('alt')), fixTime
+
+class GpsdFeed(PositionFeed):
+    """
+    Reads fixes from a gpsd daemon with its JSON watch protocol
+    """
+
+    def __init__(self, host='localhost', port=2947, maxAge=5.0):
+        """
+        Initialization method
+
+        Args:
+            host (str, optional): gpsd host. Defaults to 'localhost'.
+            port (int, optional): gpsd port. Defaults to 2947.
+            maxAge (float, optional): Seconds a fix stays usable. Defaults to 5.
+        """
+
+        super().__init__(maxAge)
+        self.host = host
+        self.port = int(port)
+        self.running = True
+        self.thread = Thread(target=self.__readLoop, daemon=True)
+        self.thread.start()
+
+    def __readLoop(self):
+        ''' keeps a connection to gpsd open, reconnecting if it drops '''
+
+        while self.running:
+            try:
+                with socket.create_connection((self.host, self.port), timeout=10) as sock:
+                    sock.sendall(b'?WATCH={"enable":true,"json":true}\n')
+                    for line in sock.makefile('r', encoding='utf-8', errors='replace'):
+                        if not self.running:
+                            return
+                        fix = parseTpv(line)
+                        if fix is not None:
+                            self.setFix(*fix)
+            except OSError as e:
+                print(f"gpsd at {self.host}:{self.port} unavailable ({e}), retrying")
+            time.sleep(2)
+
+    def close(self):
+        self.running = False
+
+class FileFeed(PositionFeed):
+    """
+    Replays a recorded track, gpsd JSON lines (like gpspipe -w output) or 'time,lat,lon[,alt]' CSV lines
+    """
+
+    def __init__(self, fileName, speed=1.0, loop=False, maxAge=5.0):
+        """
+        Initialization method
+
+        Args:
+            fileName (str): the track file
+            speed (float, optional): Replay speed, 2 plays twice as fast. Defaults to 1.
+            loop (bool, optional): Start over at the end of the file. Defaults to False.
+            maxAge (float, optional): Seconds a fix stays usable. Defaults to 5.
+        """
+
+        super().__init__(maxAge)
+        self.track = self.__readTrack(fileName)
+        self.speed = float(speed)
+        self.loop = loop
+        self.running = True
+        self.thread = Thread(target=self.__replayLoop, daemon=True)
+        self.thread.start()
+
+    @staticmethod
+    def __readTrack(fileName):
+        ''' loads every fix in the file, oldest first '''
+
+        track = []
+        with open(fileName, 'r') as infile:
+            for line in infile:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                if line.startswith('{'):
+                    fix = parseTpv(line)
+                else:
+                    values = line.split(',')
+                    fix = (float(values[1]), float(values[2]), float(values[3]) if len(values) > 3 else None, float(values[0]))
+                if fix is not None:
+                    track.append(fix)
+        return track
+
+    def __replayLoop(self):
+        ''' steps through the track at the recorded pace '''
+
+        while self.running and self.track:
+            previous = None
+            for lat, lon, alt, fixTime in self.track:
+                if not self.running:
+                    return
+                if previous is not None and fixTime is not None:
+                    time.sleep(max(fixTime - previous, 0) / self.speed)
+                previous = fixTime
+                self.setFix(lat, lon, alt)
+            if not self.loop:
+                return
+
+    def close(self):
+        self.running = False
+
+class SimulatedFeed(PositionFeed):
+    """
+    Drives a made up track for testing, a steady speed with a slow turn
+    """
+
+    def __init__(self, lat=38.8895, lon=-77.0353, speed=10.0, heading=90.0, turnRate=1.0, maxAge=5.0):
+        """
+        Initialization method
+
+        Args:
+            lat (float, optional): Starting latitude. Defaults to 38.8895.
+            lon (float, optional): Starting longitude. Defaults to -77.0353.
+            speed (float, optional): Meters per second. Defaults to 10.
+            heading (float, optional): Starting heading in degrees. Defaults to 90.
+            turnRate (float, optional): Degrees the heading changes per second. Defaults to 1.
+            maxAge (float, optional): Unused, the simulated fix is always fresh. Defaults to 5.
+        """
+
+        super().__init__(maxAge)
+        self.startLat = float(lat)
+        self.startLon = float(lon)
+        self.speed = float(speed)
+        self.heading = float(heading)
+        self.turnRate = float(turnRate)
+        self.startTime = time.time()
+
+    def position(self):
+        ''' Integrates the track up to now '''
+
+        elapsed = time.time() - self.startTime
+        if self.turnRate == 0:
+            north = self.speed * elapsed * math.cos(math.radians(self.heading))
+            east = self.speed * elapsed * math.sin(math.radians(self.heading))
+        else: # a circle, radius from the speed and turn rate
+            radius = self.speed / math.radians(self.turnRate)
+            start = math.radians(self.heading)
+            end = start + math.radians(self.turnRate * elapsed)
+            north = radius * (math.sin(end) - math.sin(start))
+            east = radius * (math.cos(start) - math.cos(end))
+
+        lat = self.startLat + north / 111320.0
+        lon = self.startLon + east / (111320.0 * math.cos(math.radians(self.startLat)))
+        return lat, lon, None
+
+def openFeed(spec):
+    """
+    Makes a position feed from a short description
+
+    Args:
+        spec (str): 'gpsd', 'gpsd:host:port', 'file:track.csv', 'sim' or 'sim:lat,lon'
+
+    Returns:
+        PositionFeed: the feed, None if spec is None
+    """
+
+    if spec is None:
+        return None
+
+    kind, _, rest = str(spec).partition(':')
+    if kind == 'gpsd':
+        host, _, port = rest.partition(':')
+        return GpsdFeed(host or 'localhost', int(port or 2947))
+    if kind == 'file':
+        return FileFeed(rest)
+    if kind == 'sim':
+        if rest:
+            lat, lon = (float(value) for value in rest.split(','))
+            return SimulatedFeed(lat, lon)
+        return SimulatedFeed()
+    raise ValueError(f"Unknown position feed {spec}")
@@ -0,0 +1,268 @@
+# On demand profiling and timing traces for the sweep and sniffer loops
+
+import os # needed for file paths
+import sys # needed for thread stacks
+import time # needed for timing
+import signal # needed for the signal toggles
+import cProfile # needed for deterministic profiles
+import threading # needed for thread names and ids
+from collections import deque, Counter # needed for the trace ring and stack counts
+
+class LoopProfiler:
+    """
+    Profiles a running loop when asked and keeps a ring buffer of per iteration stage timings
+    """
+
+    def __init__(self, name, outputDir='profiles', traceSize=2048, defaultIterations=20, defaultSeconds=10):
+        """
+        Initialization method
+
+        Args:
+            name (str): Prefix for the dump files, like 'cactus' or 'wifi'
+            outputDir (str, optional): Folder dumps are written to. Defaults to 'profiles'.
+            traceSize (int, optional): Stage timings kept in the ring buffer. Defaults to 2048.
+            defaultIterations (int, optional): Iterations profiled per thread when none are given. Defaults to 20.
+            defaultSeconds (float, optional): Max length of a capture and of the stack sampling. Defaults to 10.
+        """
+
+        self.name = name
+        self.outputDir = outputDir
+        self.defaultIterations = int(defaultIterations)
+        self.defaultSeconds = float(defaultSeconds)
+
+        # (iteration id, stage, wall time, microseconds), appends are atomic so loops never lock
+        self.traces = deque(maxlen=int(traceSize))
+
+        self.capture = None # set while a capture is running
+
+    def __path(self, kind, suffix):
+        ''' builds a dump file name in the output folder '''
+
+        os.makedirs(self.outputDir, exist_ok=True)
+        return os.path.join(self.outputDir, f"{self.name}_{kind}_{time.strftime('%Y%m%d-%H%M%S')}{suffix}")
+
+    def trace(self, iterId, stage, seconds):
+        ''' Records how long a stage of an iteration took '''
+
+        self.traces.append((iterId, stage, time.time(), int(seconds * 1000000)))
+
+    def dumpTrace(self):
+        """
+        Writes the trace ring buffer to a file
+
+        Returns:
+            str: the file written
+        """
+
+        fileName = self.__path('trace', '.txt')
+        with open(fileName, 'w') as outfile:
+            outfile.write("# id stage wall_time microseconds\n")
+            for iterId, stage, wallTime, micros in list(self.traces):
+                outfile.write(f"{iterId} {stage} {wallTime:.6f} {micros}\n")
+        print(f"Wrote {self.name} timing trace to {fileName}")
+        return fileName
+
+    def request(self, iterations=None, seconds=None):
+        """
+        Starts a capture, each loop thread is profiled from its next tick and stacks are sampled
+
+        Args:
+            iterations (int, optional): Iterations profiled per loop thread. Defaults to defaultIterations.
+            seconds (float, optional): Upper bound on the capture and the sampling time. Defaults to defaultSeconds.
+        """
+
+        # a capture can outlive its deadline if a profiled loop stalls, let a new one replace it
+        if self.capture is not None and time.time() < self.capture['deadline']:
+            print(f"{self.name} profile already running")
+            return
+
+        iterations = self.defaultIterations if iterations is None else int(iterations)
+        seconds = self.defaultSeconds if seconds is None else float(seconds)
+
+        self.capture = {'iterations': iterations, 'deadline': time.time() + seconds, 'threads': {}, 'sampled': False}
+        threading.Thread(target=self.__sampleStacks, args=(seconds,), daemon=True).start()
+        print(f"Profiling {self.name} for {iterations} iterations or {seconds} seconds")
+
+    def tick(self, iterId):
+        """
+        Called by a loop thread once per iteration, starts and stops that thread's profile
+
+        Args:
+            iterId (int): the id of the iteration starting now, like the sweep number
+        """
+
+        capture = self.capture
+        if capture is None: # fast path when nothing was asked for
+            return
+
+        threadID = threading.get_ident()
+        state = capture['threads'].get(threadID)
+
+        if state is None:
+            if time.time() < capture['deadline']:
+                profile = cProfile.Profile()
+                capture['threads'][threadID] = [profile, iterId, 0]
+                try:
+                    profile.enable()
+                except ValueError: # newer pythons allow one profiler at a time, the stack samples still cover this thread
+                    capture['threads'][threadID][0] = None
+            else:
+                self.__finish(capture)
+            return
+
+        profile, firstId, count = state
+        if profile is None: # this thread already finished
+            self.__finish(capture)
+            return
+
+        state[2] = count + 1
+        if state[2] >= capture['iterations'] or time.time() >= capture['deadline']:
+            profile.disable()
+            state[0] = None
+            fileName = self.__path(f"{threading.current_thread().name}_{firstId}-{iterId}", '.prof')
+            profile.dump_stats(fileName)
+            print(f"Wrote {self.name} profile of iterations {firstId} to {iterId} to {fileName}")
+            self.__finish(capture)
+
+    def __finish(self, capture):
+        ''' clears the capture once the sampler is done and no thread is still being profiled '''
+
+        if capture['sampled'] and all(state[0] is None for state in list(capture['threads'].values())):
+            if self.capture is capture:
+                self.capture = None
+
+    def call(self, iterId, stage, func, *args):
+        """
+        Runs a one off call, like a cluster thread, tracing its time and profiling it during a capture
+
+        Args:
+            iterId (int): the iteration the call belongs to
+            stage (str): the stage name used in the trace
+            func (function): the function to run
+
+        Returns:
+            the function's return value
+        """
+
+        capture = self.capture
+        profile = None
+        if capture is not None and time.time() < capture['deadline']:
+            profile = cProfile.Profile()
+
+        if profile is not None:
+            try:
+                profile.enable()
+            except ValueError: # another profiler is active, just time the call
+                profile = None
+
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.trace(iterId, stage, time.perf_counter() - start)
+            if profile is not None:
+                profile.disable()
+                profile.dump_stats(self.__path(f"{stage}_{iterId}", '.prof'))
+
+    def __sampleStacks(self, seconds, interval=0.005):
+        ''' samples every thread's stack for the capture window and writes collapsed stacks '''
+
+        counts = Counter()
+        ownID = threading.get_ident()
+        names = {}
+        end = time.time() + seconds
+
+        while time.time() < end:
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+
+            for threadID, frame in sys._current_frames().items():
+                if threadID == ownID:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(threadID, str(threadID)))
+                counts[';'.join(reversed(stack))] += 1
+
+            time.sleep(interval)
+
+        # collapsed stack format, ready for flamegraph tools
+        fileName = self.__path('stacks', '.txt')
+        with open(fileName, 'w') as outfile:
+            for stack, count in counts.most_common():
+                outfile.write(f"{stack} {count}\n")
+        print(f"Wrote {self.name} stack samples to {fileName}")
+
+        capture = self.capture
+        if capture is not None:
+            capture['sampled'] = True
+            self.__finish(capture)
+
+    def installSignals(self):
+        """
+        SIGUSR1 starts a capture and SIGUSR2 dumps the trace, only works from the main thread
+
+        Returns:
+            bool: True if the handlers were installed
+        """
+
+        try:
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.request())
+            signal.signal(signal.SIGUSR2, lambda signum, frame: self.dumpTrace())
+            return True
+        except (ValueError, AttributeError): # not the main thread, or no SIGUSR on this platform
+            return False
+
+    def control(self, command):
+        """
+        Handles a text control command
+
+        Args:
+            command (str): 'profile [iterations] [seconds]' or 'trace'
+        """
+
+        words = command.split()
+        if not words:
+            return
+        if words[0] == 'profile':
+            iterations = int(words[1]) if len(words) > 1 else None
+            seconds = float(words[2]) if len(words) > 2 else None
+            self.request(iterations, seconds)
+        elif words[0] == 'trace':
+            self.dumpTrace()
+
+    def listenControl(self, host='localhost'):
+        """
+        Listens on the control fanout exchange for '<name> profile ...' and '<name> trace' messages
+
+        Args:
+            host (str, optional): the RabbitMQ host. Defaults to 'localhost'.
+
+        Returns:
+            Thread: the listening thread
+        """
+
+        def controlLoop():
+            import pika # needed for rabbitMQ, only when control messages are used
+
+            connection = pika.BlockingConnection(pika.ConnectionParameters(host=host))
+            channel = connection.channel()
+            channel.exchange_declare(exchange='control', exchange_type='fanout')
+
+            result = channel.queue_declare(queue='', exclusive=True)
+            channel.queue_bind(exchange='control', queue=result.method.queue)
+
+            def callback(ch, method, properties, body):
+                target, _, command = body.decode().partition(' ')
+                if target in (self.name, 'all'):
+                    self.control(command)
+
+            channel.basic_consume(queue=result.method.queue, on_message_callback=callback, auto_ack=True)
+            channel.start_consuming()
+
+        thread = threading.Thread(target=controlLoop, daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,172 @@
+# Coarse history tiers, sweeps that age out of the raw clustering window are folded into per bin summaries
+
+from collections import deque # needed for the bucket rings
+
+import numpy as np # needed for the summaries
+
+# one frequency bin over a bucket of sweeps, first and last are sweep numbers
+SUMMARY = np.dtype([('freq', 'f8'), ('hits', 'i4'), ('sum', 'f8'), ('max', 'f4'), ('first', 'i8'), ('last', 'i8')])
+
+def parseTiers(value):
+    """
+    Reads tiers written like '10x30,100x33'
+
+    Args:
+        value (str): comma separated <sweeps per bucket>x<buckets kept>
+
+    Returns:
+        list: (sweeps per bucket, buckets kept) for each tier
+    """
+
+    tiers = []
+    for part in value.split(','):
+        size, _, keep = part.strip().partition('x')
+        tiers.append((int(size), int(keep)))
+    return tiers
+
+def summarize(freqs, dbs, sweepNumber):
+    """
+    Turns one sweep's targets into summary records
+
+    Args:
+        freqs (list): the sweep's frequencies in Hz
+        dbs (list): the sweep's power levels
+        sweepNumber (int): the sweep's number
+
+    Returns:
+        numpy.ndarray: SUMMARY array, one record per target
+    """
+
+    summary = np.zeros(len(freqs), dtype=SUMMARY)
+    summary['freq'] = freqs
+    summary['hits'] = 1
+    summary['sum'] = dbs
+    summary['max'] = dbs
+    summary['first'] = sweepNumber
+    summary['last'] = sweepNumber
+    return mergeSummaries(summary) # a bin can only be a target once per sweep, but this keeps the records sorted
+
+def mergeSummaries(*summaries):
+    """
+    Combines summaries into one record per frequency bin
+
+    Args:
+        summaries (numpy.ndarray): SUMMARY arrays
+
+    Returns:
+        numpy.ndarray: SUMMARY array sorted by frequency
+    """
+
+    records = np.concatenate(summaries) if summaries else np.zeros(0, dtype=SUMMARY)
+    freqs, inverse = np.unique(records['freq'], return_inverse=True)
+
+    merged = np.zeros(len(freqs), dtype=SUMMARY)
+    merged['freq'] = freqs
+    merged['hits'] = np.bincount(inverse, records['hits'], len(freqs))
+    merged['sum'] = np.bincount(inverse, records['sum'], len(freqs))
+    merged['max'] = -np.inf
+    np.maximum.at(merged['max'], inverse, records['max'])
+    merged['first'] = np.iinfo(np.int64).max
+    np.minimum.at(merged['first'], inverse, records['first'])
+    merged['last'] = np.iinfo(np.int64).min
+    np.maximum.at(merged['last'], inverse, records['last'])
+    return merged
+
+class TieredHistory:
+    """
+    Buckets of per bin summaries at coarser and coarser time scales.
+    A bucket pushed out of one tier is folded into the next, so an hour of history costs a few hundred clustering rows instead of thousands of sweeps.
+    Not thread safe, SignalClusterer folds and reads it under its own lock.
+    """
+
+    def __init__(self, tiers=((10, 30), (100, 33)), binSize=100000):
+        """
+        Initialization method
+
+        Args:
+            tiers (list, optional): (sweeps per bucket, buckets kept) from fine to coarse, each bucket size a multiple of the one before.
+                Defaults to 5 minutes of 10 sweep buckets then 55 minutes of 100 sweep buckets at about a sweep a second.
+            binSize (int, optional): The width of each frequency bin in Hertz, bins this close are neighbors. Defaults to 100000.
+        """
+
+        self.binSize = binSize
+        self.tiers = []
+        previous = 1
+        for size, keep in tiers:
+            size = int(size)
+            if size < previous or size % previous != 0:
+                raise ValueError(f"Tier bucket size {size} isn't a multiple of {previous}")
+            self.tiers.append({'size': size, 'keep': int(keep), 'buckets': deque(), 'open': [], 'sweeps': 0})
+            previous = size
+
+    def fold(self, freqs, dbs, sweepNumber):
+        """
+        Adds a sweep that left the raw window
+
+        Args:
+            freqs (list): the sweep's frequencies in Hz
+            dbs (list): the sweep's power levels
+            sweepNumber (int): the sweep's number
+        """
+
+        self.__add(0, summarize(np.asarray(freqs, dtype=np.float64), np.asarray(dbs, dtype=np.float64), sweepNumber), 1)
+
+    def __add(self, level, summary, sweeps):
+        ''' adds a summary covering some sweeps to a tier's open bucket, closing it once it's full '''
+
+        if level >= len(self.tiers): # older than the coarsest tier keeps
+            return
+
+        tier = self.tiers[level]
+        tier['open'].append(summary)
+        tier['sweeps'] += sweeps
+        if tier['sweeps'] < tier['size']:
+            return
+
+        tier['buckets'].append(self.__prune(mergeSummaries(*tier['open'])))
+        tier['open'] = []
+        tier['sweeps'] = 0
+        if len(tier['buckets']) > tier['keep']:
+            self.__add(level + 1, tier['buckets'].popleft(), tier['size'])
+
+    def __prune(self, summary):
+        """
+        Drops bins hit only once with no neighboring bin hit, the noise that makes up most of a long bucket.
+        A short emitter still covers a few neighboring bins, so it stays.
+        """
+
+        close = np.diff(summary['freq']) <= 1.5 * self.binSize
+        neighbor = np.r_[False, close] | np.r_[close, False]
+        return summary[(summary['hits'] > 1) | neighbor]
+
+    def rows(self):
+        """
+        Gets every bucket oldest first, open buckets included so nothing drops out of view while it fills
+
+        Returns:
+            list: SUMMARY arrays
+        """
+
+        rows = []
+        for tier in reversed(self.tiers):
+            rows.extend(tier['buckets'])
+            if tier['open']:
+                rows.append(mergeSummaries(*tier['open']))
+        return rows
+
+    def points(self):
+        """
+        Builds weighted clustering points from the summaries
+
+        Returns:
+            tuple: (N x 3 array of [MHz, mean dBm, row] points, hits of each point, rows used)
+        """
+
+        rows = [row for row in self.rows() if len(row) > 0]
+        if not rows:
+            return np.zeros((0, 3)), np.zeros(0), 0
+
+        records = np.concatenate(rows)
+        rowIndex = np.repeat(np.arange(len(rows)), [len(row) for row in rows])
+        points = np.column_stack((records['freq'] / 1000000, records['sum'] / records['hits'], rowIndex))
+        return points, records['hits'].astype(np.float64), len(rows)
@@ -0,0 +1,307 @@
+# Time and frequency range queries over a SweepRecorder archive
+
+import os # needed for file paths
+import json # needed for the chunk index
+import sys # needed for command line args
+import argparse # needed for command line options
+from datetime import datetime # needed for parsing times
+
+import numpy as np # needed for the reductions
+
+class SweepArchive:
+    """
+    Read only view of a recorded spectrogram, reductions run chunk by chunk over memory maps
+    """
+
+    def __init__(self, directory, blockRows=4096):
+        """
+        Initialization method
+
+        Args:
+            directory (str): Folder written by SweepRecorder
+            blockRows (int, optional): Max rows converted to float at once, bounds memory use. Defaults to 4096.
+        """
+
+        self.directory = str(directory)
+        self.blockRows = int(blockRows)
+
+        with open(os.path.join(self.directory, 'archive.json'), 'r') as infile:
+            info = json.load(infile)
+
+        self.minFreq = info['minFreq']
+        self.maxFreq = info['maxFreq']
+        self.binSize = info['binSize']
+        self.bins = info['bins']
+        self.dtype = info['dtype']
+        self.empty = info['empty']
+
+        # start frequency of every bin in MHz
+        self.freqs = self.minFreq + (np.arange(self.bins) * self.binSize / 1000000)
+
+    def chunks(self):
+        """
+        Reads the chunk index, re-read every query so a live archive can be queried
+
+        Returns:
+            list: (base path, meta dict) for every chunk holding rows, oldest first
+        """
+
+        chunkList = []
+        for name in sorted(os.listdir(self.directory)):
+            if name.startswith('chunk_') and name.endswith('.json'):
+                with open(os.path.join(self.directory, name), 'r') as infile:
+                    meta = json.load(infile)
+                if meta['rows'] > 0:
+                    chunkList.append((os.path.join(self.directory, name[:-5]), meta))
+        return chunkList
+
+    def columnRange(self, minFreq=None, maxFreq=None):
+        ''' Converts a frequency range in MHz into a column slice '''
+
+        start = 0 if minFreq is None else int((minFreq - self.minFreq) * 1000000 // self.binSize)
+        stop = self.bins if maxFreq is None else int(np.ceil((maxFreq - self.minFreq) * 1000000 / self.binSize))
+        return max(start, 0), min(max(stop, start + 1), self.bins)
+
+    def blocks(self, startTime=None, endTime=None, minFreq=None, maxFreq=None):
+        """
+        Walks the rows in a time range, only opening the chunks that overlap it
+
+        Args:
+            startTime (float, optional): seconds since the epoch, None for the start of the archive. Defaults to None.
+            endTime (float, optional): seconds since the epoch, None for the end of the archive. Defaults to None.
+            minFreq (float, optional): lowest frequency in MHz. Defaults to the full span.
+            maxFreq (float, optional): highest frequency in MHz. Defaults to the full span.
+
+        Yields:
+            tuple: (timestamps, float32 dBm block with NaN for empty bins)
+        """
+
+        start, stop = self.columnRange(minFreq, maxFreq)
+
+        for base, meta in self.chunks():
+            # the index lets whole chunks be skipped without touching their data
+            if startTime is not None and meta['endTime'] < startTime:
+                continue
+            if endTime is not None and meta['startTime'] > endTime:
+                continue
+
+            rows = meta['rows']
+            times = np.memmap(base + '.ts', dtype=np.float64, mode='r', shape=(meta['capacity'],))[:rows]
+            first = 0 if startTime is None else int(np.searchsorted(times, startTime, side='left'))
+            last = rows if endTime is None else int(np.searchsorted(times, endTime, side='right'))
+            if first >= last:
+                continue
+
+            data = np.memmap(base + '.dat', dtype=self.dtype, mode='r', shape=(meta['capacity'], self.bins))
+
+            for row in range(first, last, self.blockRows):
+                rowEnd = min(row + self.blockRows, last)
+                yield np.array(times[row:rowEnd]), self.__toFloat(data[row:rowEnd, start:stop])
+
+    def __toFloat(self, block):
+        ''' converts a stored block to float32 dBm with NaN for missing bins '''
+
+        values = block.astype(np.float32)
+        if self.dtype == 'int8':
+            values[block == self.empty] = np.nan
+        return values
+
+    def reduce(self, stat='max', startTime=None, endTime=None, minFreq=None, maxFreq=None, threshold=-60.0, percentile=90.0):
+        """
+        Reduces every sweep in a range down to one value per bin
+
+        Args:
+            stat (str, optional): 'max', 'mean', 'occupancy' (percent of sweeps above threshold) or 'percentile'. Defaults to 'max'.
+            startTime (float, optional): seconds since the epoch. Defaults to the start of the archive.
+            endTime (float, optional): seconds since the epoch. Defaults to the end of the archive.
+            minFreq (float, optional): lowest frequency in MHz. Defaults to the full span.
+            maxFreq (float, optional): highest frequency in MHz. Defaults to the full span.
+            threshold (float, optional): dBm a bin must exceed to count as occupied. Defaults to -60.
+            percentile (float, optional): the percentile for stat='percentile'. Defaults to 90.
+
+        Returns:
+            tuple: (bin frequencies in MHz, value per bin, number of sweeps used)
+        """
+
+        start, stop = self.columnRange(minFreq, maxFreq)
+        columns = stop - start
+
+        result = np.full(columns, -np.inf) if stat == 'max' else np.zeros(columns)
+        counts = np.zeros(columns)
+        histogram = np.zeros((columns, 256), dtype=np.int64) if stat == 'percentile' else None
+        sweeps = 0
+
+        for _, block in self.blocks(startTime, endTime, minFreq, maxFreq):
+            sweeps += len(block)
+            valid = ~np.isnan(block)
+            counts += valid.sum(axis=0)
+
+            if stat == 'max':
+                np.fmax(result, np.nanmax(np.where(valid, block, -np.inf), axis=0), out=result)
+            elif stat == 'mean':
+                result += np.where(valid, block, 0).sum(axis=0)
+            elif stat == 'occupancy':
+                result += (np.where(valid, block, -np.inf) > threshold).sum(axis=0)
+            elif stat == 'percentile':
+                # whole dB histograms per bin are exact for int8 and stream chunk by chunk
+                levels = np.clip(np.rint(block[valid]), -128, 127).astype(np.int64) + 128
+                cols = np.nonzero(valid)[1]
+                histogram += np.bincount(cols * 256 + levels, minlength=columns * 256).reshape(columns, 256)
+            else:
+                raise ValueError(f"Unknown stat {stat}")
+
+        if stat == 'max':
+            result[np.isinf(result)] = np.nan
+        elif stat == 'mean':
+            result = np.where(counts > 0, result / np.maximum(counts, 1), np.nan)
+        elif stat == 'occupancy':
+            result = np.where(counts > 0, 100 * result / np.maximum(counts, 1), np.nan)
+        elif stat == 'percentile':
+            cumulative = np.cumsum(histogram, axis=1)
+            target = np.ceil(cumulative[:, -1] * (percentile / 100.0))
+            level = np.argmax(cumulative >= np.maximum(target, 1)[:, None], axis=1)
+            result = np.where(cumulative[:, -1] > 0, level - 128, np.nan).astype(np.float64)
+
+        return self.freqs[start:stop], result, sweeps
+
+    def bandReduce(self, freqs, values, bands, how='mean'):
+        """
+        Collapses a per bin result into one value per band
+
+        Args:
+            freqs (numpy.ndarray): bin frequencies from reduce
+            values (numpy.ndarray): values from reduce
+            bands (list): (name, low MHz, high MHz) for each band
+            how (str, optional): 'mean' or 'max' over the bins of each band. Defaults to 'mean'.
+
+        Returns:
+            dict: band name -> value, NaN when the band has no data
+        """
+
+        results = {}
+        for name, low, high in bands:
+            selected = values[(freqs >= low) & (freqs < high)]
+            selected = selected[~np.isnan(selected)]
+            if len(selected) == 0:
+                results[name] = float('nan')
+            elif how == 'max':
+                results[name] = float(selected.max())
+            else:
+                results[name] = float(selected.mean())
+        return results
+
+    def occupancy(self, bands, startTime=None, endTime=None, threshold=-60.0):
+        """
+        Percent of sweeps each band was occupied
+
+        Args:
+            bands (list): (name, low MHz, high MHz) for each band
+            startTime (float, optional): seconds since the epoch. Defaults to the start of the archive.
+            endTime (float, optional): seconds since the epoch. Defaults to the end of the archive.
+            threshold (float, optional): dBm a bin must exceed to count as occupied. Defaults to -60.
+
+        Returns:
+            dict: band name -> mean occupancy percent of its bins
+        """
+
+        minFreq = min(band[1] for band in bands)
+        maxFreq = max(band[2] for band in bands)
+        freqs, values, _ = self.reduce('occupancy', startTime, endTime, minFreq, maxFreq, threshold=threshold)
+        return self.bandReduce(freqs, values, bands, how='mean')
+
+    def clusterPoints(self, startTime=None, endTime=None, minFreq=None, maxFreq=None, threshold=None, topPercent=6.0):
+        """
+        Builds the [MHz, dBm, sweep] points signalCluster clusters, from recorded sweeps
+
+        Args:
+            startTime (float, optional): seconds since the epoch. Defaults to the start of the archive.
+            endTime (float, optional): seconds since the epoch. Defaults to the end of the archive.
+            minFreq (float, optional): lowest frequency in MHz. Defaults to the full span.
+            maxFreq (float, optional): highest frequency in MHz. Defaults to the full span.
+            threshold (float, optional): fixed dBm cutoff, None uses the top percent of each sweep instead. Defaults to None.
+            topPercent (float, optional): share of each sweep's bins kept when no threshold is given. Defaults to 6.
+
+        Returns:
+            numpy.ndarray: N x 3 array of points
+        """
+
+        start, _ = self.columnRange(minFreq, maxFreq)
+        points = []
+        sweep = 0
+
+        for _, block in self.blocks(startTime, endTime, minFreq, maxFreq):
+            if threshold is None:
+                cutoff = np.nanpercentile(np.where(np.isnan(block), -np.inf, block), 100 - topPercent, axis=1)[:, None]
+            else:
+                cutoff = threshold
+
+            rows, cols = np.nonzero(np.where(np.isnan(block), -np.inf, block) > cutoff)
+            points.append(np.column_stack((self.freqs[start + cols], block[rows, cols], rows + sweep)))
+            sweep += len(block)
+
+        if not points:
+            return np.zeros((0, 3))
+        return np.concatenate(points)
+
+    def signals(self, startTime=None, endTime=None, minFreq=None, maxFreq=None, threshold=None, topPercent=6.0):
+        """
+        Runs the live clustering and feature extraction over recorded sweeps
+
+        Args:
+            startTime (float, optional): seconds since the epoch. Defaults to the start of the archive.
+            endTime (float, optional): seconds since the epoch. Defaults to the end of the archive.
+            minFreq (float, optional): lowest frequency in MHz. Defaults to the full span.
+            maxFreq (float, optional): highest frequency in MHz. Defaults to the full span.
+            threshold (float, optional): fixed dBm cutoff, None uses the top percent of each sweep instead. Defaults to None.
+            topPercent (float, optional): share of each sweep's bins kept when no threshold is given. Defaults to 6.
+
+        Returns:
+            list: list of [center frequency, bandwidth, continuous, power difference, power weighted center, occupancy, spectral flatness]
+        """
+
+        from cactus import clusterLabels, signalFeatures # only pulled in when clustering is asked for
+
+        points = self.clusterPoints(startTime, endTime, minFreq, maxFreq, threshold, topPercent)
+        if len(points) <= 12:
+            return []
+        return signalFeatures(*clusterLabels(points))
+
+def parseTime(value):
+    ''' Accepts seconds since the epoch or an ISO time like 2024-05-01T14:00 '''
+
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Query a recorded cactus sweep archive")
+    parser.add_argument("directory", help="archive folder written by the recorder")
+    parser.add_argument("stat", choices=["max", "mean", "occupancy", "percentile", "signals"])
+    parser.add_argument("--start", help="start time, epoch seconds or ISO")
+    parser.add_argument("--end", help="end time, epoch seconds or ISO")
+    parser.add_argument("--min-freq", type=float, help="lowest frequency in MHz")
+    parser.add_argument("--max-freq", type=float, help="highest frequency in MHz")
+    parser.add_argument("--threshold", type=float, help="dBm cutoff for occupancy and signals")
+    parser.add_argument("--percentile", type=float, default=90.0)
+    args = parser.parse_args()
+
+    archive = SweepArchive(args.directory)
+    startTime = parseTime(args.start)
+    endTime = parseTime(args.end)
+
+    if args.stat == "signals":
+        for signal in archive.signals(startTime, endTime, args.min_freq, args.max_freq, args.threshold):
+            print(f"{signal[0]:.3f} MHz : {signal[1]:.3f} MHz : {signal[2]:.0f} : {signal[3]:.1f} : {signal[4]:.3f} MHz : {signal[5]:.0f} : {signal[6]:.2f} : {signal[7]:.1f} dBm")
+        sys.exit()
+
+    threshold = -60.0 if args.threshold is None else args.threshold
+    freqs, values, sweeps = archive.reduce(args.stat, startTime, endTime, args.min_freq, args.max_freq, threshold, args.percentile)
+
+    print(f"{sweeps} sweeps")
+    for freq, value in zip(freqs, values):
+        if not np.isnan(value):
+            print(f"{freq:.3f} {value:.1f}")
@@ -0,0 +1,227 @@
+# Records every full sweep into a chunked, memory mapped spectrogram archive
+
+import os # needed for file paths
+import json # needed for the chunk index
+import math # needed for sizing
+import queue # needed for the bounded write buffer
+from threading import Thread # needed for the writer thread
+
+import numpy as np # needed for memory mapping
+
+# int8 archives store whole dBm with this value meaning no data for the bin
+INT8_EMPTY = -128
+
+class SweepRecorder:
+    """
+    Appends sweep power vectors to fixed frequency axis memmap chunks from a background thread
+    """
+
+    def __init__(self, directory, minFreq, maxFreq, binSize, dtype='int8', maxChunkBytes=256 * 1024 * 1024, maxChunks=None, bufferSweeps=32, flushEvery=10):
+        """
+        Initialization method
+
+        Args:
+            directory (str): Folder the archive is written to, created if needed
+            minFreq (int): The min frequency of the sweep in MHz
+            maxFreq (int): The max frequency of the sweep in MHz
+            binSize (int): The width of each frequency bin in Hertz
+            dtype (str, optional): 'int8' for whole dBm or 'float16'. Defaults to 'int8'.
+            maxChunkBytes (int, optional): Size a chunk is rotated at. Defaults to 256 MiB.
+            maxChunks (int, optional): Oldest chunks are deleted past this many, None keeps everything. Defaults to None.
+            bufferSweeps (int, optional): Sweeps that can wait for the writer before new ones are dropped. Defaults to 32.
+            flushEvery (int, optional): Sweeps between flushing the chunk and its index to disk. Defaults to 10.
+        """
+
+        if dtype not in ('int8', 'float16'):
+            raise ValueError(f"Unsupported archive dtype {dtype}")
+
+        self.directory = str(directory)
+        self.minFreq = int(minFreq)
+        self.maxFreq = int(maxFreq)
+        self.binSize = int(binSize)
+        self.dtype = dtype
+        self.maxChunks = maxChunks
+        self.flushEvery = int(flushEvery)
+
+        self.bins = math.ceil((self.maxFreq - self.minFreq) * 1000000 / self.binSize)
+        self.chunkRows = max(1, int(maxChunkBytes) // (self.bins * np.dtype(dtype).itemsize))
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.__writeArchiveInfo()
+
+        # the sweeper only ever does a non blocking put
+        self.buffer = queue.Queue(maxsize=int(bufferSweeps))
+        self.dropped = 0
+        self.recorded = 0
+
+        self.chunkNumber = self.__nextChunkNumber()
+        self.chunk = None
+
+        self.writerThread = Thread(target=self.__writeLoop, daemon=True)
+        self.writerThread.start()
+
+    def newVector(self):
+        """
+        Makes an empty power vector on the archive's frequency axis
+
+        Returns:
+            numpy.ndarray: float32 vector of NaN, one entry per bin
+        """
+
+        return np.full(self.bins, np.nan, dtype=np.float32)
+
+    def binIndex(self, freq):
+        """
+        Converts a frequency into a bin on the archive's axis
+
+        Args:
+            freq (int): frequency in Hz
+
+        Returns:
+            int: the bin index, may be out of range
+        """
+
+        return int((freq - (self.minFreq * 1000000)) // self.binSize)
+
+    def addLine(self, powerVector, lowFreq, values):
+        """
+        Copies one hackrf_sweep line into a power vector
+
+        Args:
+            powerVector (numpy.ndarray): the vector for the sweep in progress
+            lowFreq (int): the line's starting frequency in Hz
+            values (list): the line's dBm strings, one per bin
+        """
+
+        start = self.binIndex(lowFreq)
+        stop = min(start + len(values), self.bins)
+        if 0 <= start < stop:
+            powerVector[start:stop] = np.asarray(values[:stop - start], dtype=np.float32)
+
+    def record(self, timestamp, powerVector):
+        """
+        Hands a finished sweep to the writer without ever blocking
+
+        Args:
+            timestamp (float): time the sweep finished, seconds since the epoch
+            powerVector (numpy.ndarray): dBm per bin, NaN where nothing was read
+
+        Returns:
+            bool: False if the buffer was full and the sweep was dropped
+        """
+
+        try:
+            self.buffer.put_nowait((timestamp, powerVector))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def close(self):
+        ''' Writes out everything still buffered and closes the current chunk '''
+
+        self.buffer.put((None, None))
+        self.writerThread.join()
+
+    def __writeArchiveInfo(self):
+        ''' writes the axis and format that every chunk in the archive shares '''
+
+        info = {'minFreq': self.minFreq, 'maxFreq': self.maxFreq, 'binSize': self.binSize, 'bins': self.bins, 'dtype': self.dtype, 'empty': INT8_EMPTY if self.dtype == 'int8' else None}
+
+        infoFile = os.path.join(self.directory, 'archive.json')
+        if os.path.exists(infoFile):
+            with open(infoFile, 'r') as infile:
+                old = json.load(infile)
+            if old != info:
+                raise ValueError(f"{self.directory} already holds an archive with a different axis or format")
+            return
+
+        with open(infoFile, 'w') as outfile:
+            json.dump(info, outfile)
+
+    def __nextChunkNumber(self):
+        ''' finds the chunk number after the last one already in the folder '''
+
+        numbers = [int(name[6:12]) for name in os.listdir(self.directory) if name.startswith('chunk_') and name.endswith('.json')]
+        return max(numbers) + 1 if numbers else 0
+
+    def __openChunk(self):
+        ''' creates the data and timestamp memmaps for a new chunk '''
+
+        base = os.path.join(self.directory, f"chunk_{self.chunkNumber:06d}")
+        self.chunk = {
+            'base': base,
+            'data': np.memmap(base + '.dat', dtype=self.dtype, mode='w+', shape=(self.chunkRows, self.bins)),
+            'times': np.memmap(base + '.ts', dtype=np.float64, mode='w+', shape=(self.chunkRows,)),
+            'rows': 0,
+        }
+
+    def __flushChunk(self):
+        ''' flushes the memmaps and rewrites the chunk index entry '''
+
+        chunk = self.chunk
+        chunk['data'].flush()
+        chunk['times'].flush()
+
+        rows = chunk['rows']
+        meta = {
+            'rows': rows,
+            'capacity': self.chunkRows,
+            'startTime': float(chunk['times'][0]) if rows else None,
+            'endTime': float(chunk['times'][rows - 1]) if rows else None,
+        }
+
+        # write then rename so a reader never sees a half written index
+        with open(chunk['base'] + '.json.tmp', 'w') as outfile:
+            json.dump(meta, outfile)
+        os.replace(chunk['base'] + '.json.tmp', chunk['base'] + '.json')
+
+    def __closeChunk(self):
+        ''' finishes the current chunk and applies the chunk limit '''
+
+        self.__flushChunk()
+        self.chunk = None
+        self.chunkNumber += 1
+
+        if self.maxChunks is not None:
+            for number in range(self.chunkNumber - int(self.maxChunks) - 1, -1, -1):
+                base = os.path.join(self.directory, f"chunk_{number:06d}")
+                if not os.path.exists(base + '.json'):
+                    break
+                for ext in ('.json', '.dat', '.ts'):
+                    os.remove(base + ext)
+
+    def __quantize(self, powerVector):
+        ''' converts a float dBm vector to the archive dtype '''
+
+        if self.dtype == 'float16':
+            return powerVector.astype(np.float16)
+
+        row = np.clip(np.rint(powerVector), INT8_EMPTY + 1, 127)
+        row[np.isnan(powerVector)] = INT8_EMPTY
+        return row.astype(np.int8)
+
+    def __writeLoop(self):
+        ''' writer thread, drains the buffer into the memmaps '''
+
+        while True:
+            timestamp, powerVector = self.buffer.get()
+
+            if timestamp is None: # close was called
+                if self.chunk is not None:
+                    self.__closeChunk()
+                return
+
+            if self.chunk is None:
+                self.__openChunk()
+
+            row = self.chunk['rows']
+            self.chunk['data'][row] = self.__quantize(powerVector[:self.bins])
+            self.chunk['times'][row] = timestamp
+            self.chunk['rows'] = row + 1
+            self.recorded += 1
+
+            if self.chunk['rows'] >= self.chunkRows:
+                self.__closeChunk()
+            elif self.chunk['rows'] % self.flushEvery == 0:
+                self.__flushChunk()
@@ -0,0 +1,224 @@
+# Shared memory ring buffer that hands sweeps to consumers on the same machine without the broker
+
+import time # needed for polling and timestamps
+from threading import Lock # needed when several threads write
+from multiprocessing import shared_memory, resource_tracker # needed for the shared segment
+
+import numpy as np # needed for the views
+
+MAGIC = 0x43414354 # 'CACT', marks a segment written by SweepRing
+
+# header fields, int64 each
+HEADER_MAGIC = 0
+HEADER_SLOTS = 1
+HEADER_CAPACITY = 2
+HEADER_COLUMNS = 3
+HEADER_WRITE_SEQ = 4
+HEADER_SIZE = 8
+
+class SweepRing:
+    """
+    Fixed size ring of sweep entries in a multiprocessing.shared_memory segment.
+    One process writes, any number read zero copy views and check the entry's sequence number to know it wasn't overwritten.
+    """
+
+    def __init__(self, name, slots=16, capacity=32768, columns=2, create=True):
+        """
+        Initialization method, use create=False or attach() in readers
+
+        Args:
+            name (str): Name of the shared memory segment, like 'cactus_scan'
+            slots (int, optional): Entries kept before the oldest is overwritten. Defaults to 16.
+            capacity (int, optional): Max rows in one entry, longer entries are cut. Defaults to 32768.
+            columns (int, optional): Values in each row, 2 for [Hz, dBm] scans. Defaults to 2.
+            create (bool, optional): True for the writer. Defaults to True.
+        """
+
+        self.name = name
+        self.isWriter = create
+        self.missed = 0 # entries a reader skipped because it fell behind
+        self.truncated = 0 # entries the writer had to cut
+        self.lock = Lock() # one entry at a time, cactus publishes signals from several cluster threads
+
+        if create:
+            size = self.__layoutSize(slots, capacity, columns)
+            try:
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            except FileExistsError: # left behind by a writer that didn't close
+                stale = shared_memory.SharedMemory(name=name)
+                stale.close()
+                stale.unlink()
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            self.__map(slots, capacity, columns)
+            self.header[:] = 0
+            self.seqs[:] = -1
+            self.header[HEADER_SLOTS] = slots
+            self.header[HEADER_CAPACITY] = capacity
+            self.header[HEADER_COLUMNS] = columns
+            self.header[HEADER_WRITE_SEQ] = -1
+            self.header[HEADER_MAGIC] = MAGIC # last, readers wait for it
+        else:
+            self.shm = self.__open(name)
+            header = np.ndarray((HEADER_SIZE,), dtype=np.int64, buffer=self.shm.buf)
+            if header[HEADER_MAGIC] != MAGIC:
+                raise ValueError(f"{name} is not a sweep ring")
+            self.__map(int(header[HEADER_SLOTS]), int(header[HEADER_CAPACITY]), int(header[HEADER_COLUMNS]))
+
+    @staticmethod
+    def __layoutSize(slots, capacity, columns):
+        ''' bytes needed for the header, the per slot fields and the data '''
+
+        return 8 * (HEADER_SIZE + 3 * slots + slots * capacity * columns)
+
+    @staticmethod
+    def __open(name):
+        ''' attaches to an existing segment without letting this process' exit remove it '''
+
+        try:
+            return shared_memory.SharedMemory(name=name, track=False) # python 3.13+
+        except TypeError:
+            shm = shared_memory.SharedMemory(name=name)
+            # older pythons track attached segments too and would unlink it when the reader exits
+            resource_tracker.unregister(shm._name, 'shared_memory')
+            return shm
+
+    def __map(self, slots, capacity, columns):
+        ''' builds the numpy views over the segment '''
+
+        self.slots = slots
+        self.capacity = capacity
+        self.columns = columns
+
+        buf = self.shm.buf
+        offset = 0
+        self.header = np.ndarray((HEADER_SIZE,), dtype=np.int64, buffer=buf, offset=offset)
+        offset += 8 * HEADER_SIZE
+        self.seqs = np.ndarray((slots,), dtype=np.int64, buffer=buf, offset=offset)
+        offset += 8 * slots
+        self.counts = np.ndarray((slots,), dtype=np.int64, buffer=buf, offset=offset)
+        offset += 8 * slots
+        self.times = np.ndarray((slots,), dtype=np.float64, buffer=buf, offset=offset)
+        offset += 8 * slots
+        self.data = np.ndarray((slots, capacity, columns), dtype=np.float64, buffer=buf, offset=offset)
+
+    @classmethod
+    def attach(cls, name, wait=True, interval=0.5):
+        """
+        Opens an existing ring as a reader
+
+        Args:
+            name (str): Name of the shared memory segment
+            wait (bool, optional): Keep trying until the writer has made it. Defaults to True.
+            interval (float, optional): Seconds between tries. Defaults to 0.5.
+
+        Returns:
+            SweepRing: the reader
+        """
+
+        while True:
+            try:
+                return cls(name, create=False)
+            except (FileNotFoundError, ValueError):
+                if not wait:
+                    raise
+                time.sleep(interval)
+
+    def write(self, rows, timestamp=None):
+        """
+        Adds an entry, overwriting the oldest one
+
+        Args:
+            rows (numpy.ndarray): n x columns values, like np.column_stack((freqs, dBm))
+            timestamp (float, optional): seconds since the epoch. Defaults to now.
+
+        Returns:
+            int: the entry's sequence number
+        """
+
+        rows = np.asarray(rows, dtype=np.float64).reshape(-1, self.columns)
+        count = len(rows)
+        if count > self.capacity:
+            count = self.capacity
+            self.truncated += 1
+
+        with self.lock:
+            seq = int(self.header[HEADER_WRITE_SEQ]) + 1
+            slot = seq % self.slots
+
+            # readers seeing -1 know the slot is being rewritten
+            self.seqs[slot] = -1
+            self.data[slot, :count] = rows[:count]
+            self.counts[slot] = count
+            self.times[slot] = time.time() if timestamp is None else timestamp
+            self.seqs[slot] = seq
+            self.header[HEADER_WRITE_SEQ] = seq
+        return seq
+
+    def latest(self):
+        ''' Sequence number of the newest entry, -1 before the first '''
+
+        return int(self.header[HEADER_WRITE_SEQ])
+
+    def read(self, lastSeq):
+        """
+        Gets the entry after lastSeq, jumping ahead if it was already overwritten
+
+        Args:
+            lastSeq (int): the last sequence number the reader handled
+
+        Returns:
+            tuple: (seq, timestamp, zero copy n x columns view), None if nothing is new
+        """
+
+        while True:
+            writeSeq = int(self.header[HEADER_WRITE_SEQ])
+            if writeSeq <= lastSeq:
+                return None
+
+            seq = max(lastSeq + 1, writeSeq - self.slots + 1)
+            slot = seq % self.slots
+
+            count = int(self.counts[slot])
+            timestamp = float(self.times[slot])
+            view = self.data[slot, :count]
+
+            if self.seqs[slot] == seq: # not rewritten while the fields were read
+                self.missed += seq - lastSeq - 1
+                return seq, timestamp, view
+
+    def valid(self, seq):
+        ''' True while the entry hasn't been overwritten, check after using a view '''
+
+        return int(self.seqs[seq % self.slots]) == seq
+
+    def entries(self, interval=0.001, fromStart=False):
+        """
+        Yields every new entry as it's written, forever
+
+        Args:
+            interval (float, optional): Seconds between polls when nothing is new. Defaults to 0.001.
+            fromStart (bool, optional): Also yield the entries already in the ring. Defaults to False.
+
+        Yields:
+            tuple: (seq, timestamp, zero copy n x columns view)
+        """
+
+        lastSeq = -1 if fromStart else self.latest()
+        while True:
+            entry = self.read(lastSeq)
+            if entry is None:
+                if self.latest() < lastSeq: # the writer started over
+                    lastSeq = -1
+                time.sleep(interval)
+                continue
+            lastSeq = entry[0]
+            yield entry
+
+    def close(self):
+        ''' Detaches, the writer also removes the segment '''
+
+        # views have to go before the buffer can be released
+        self.header = self.seqs = self.counts = self.times = self.data = None
+        self.shm.close()
+        if self.isWriter:
+            self.shm.unlink()
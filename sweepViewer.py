@@ -1,27 +1,96 @@
 import sys # needed to exit
+import argparse # needed for command line options
 import matplotlib.pyplot as plt # needed for graphs
 import matplotlib.animation as animation # needed for graphs
 import numpy as np # needed for graph
 
 import pika # needed for rabbitMQ
 
+from sweepRing import SweepRing # needed for the shared memory transport
+
 import time # needed for sleep
-from threading import Thread # needed for threads
+from threading import Thread, Lock # needed for threads
+
+class HistoryRing:
+    '''
+    Preallocated ring buffer of display rows
+    '''
+
+    def __init__(self, rows, columns, sweepsPerRow=1):
+        """
+        Initialization method
+
+        Args:
+            rows (int): The number of rows kept
+            columns (int): The number of display columns
+            sweepsPerRow (int, optional): How many sweeps are folded into each row. Defaults to 1.
+        """
+
+        self.rows = int(rows)
+        self.sweepsPerRow = int(sweepsPerRow)
+        self.data = np.zeros((self.rows, columns), dtype=np.float32)
+        self.head = 0 # the row the next entry goes in
+
+    def push(self, row):
+        ''' Overwrites the oldest row '''
+
+        self.data[self.head] = row
+        self.head = (self.head + 1) % self.rows
+
+    def ordered(self):
+        ''' Returns a copy with the oldest row first '''
+
+        return np.roll(self.data, -self.head, axis=0)
 
 class SweepViewer:
     '''
     Simple python class to view wide sweeper output
     '''
 
-    def __init__(self) -> None:
-        self.minFreq = 0
-        self.maxFreq = 6000
-        self.maxHistory = 30
+    def __init__(self, minFreq=0, maxFreq=6000, resolution=1.0, maxHistory=30, reduce='max', tiers=((60, 10), (60, 6))) -> None:
+        """
+        Initialization method
+
+        Args:
+            minFreq (float, optional): The lowest frequency shown in MHz. Defaults to 0.
+            maxFreq (float, optional): The highest frequency shown in MHz. Defaults to 6000.
+            resolution (float, optional): The width of each display column in MHz. Defaults to 1.0.
+            maxHistory (int, optional): The number of full rate sweeps kept. Defaults to 30.
+            reduce (str, optional): 'max' for max-hold or 'mean' when several bins or sweeps fall in one cell. Defaults to 'max'.
+            tiers (tuple, optional): (rows, rows of the previous tier folded into one) for each older, coarser history.
+                Defaults to 60 rows of 10 sweeps then 60 rows of 1 minute, about an hour at one sweep a second.
+        """
+
+        self.minFreq = float(minFreq)
+        self.maxFreq = float(maxFreq)
+        self.resolution = float(resolution)
+        self.maxHistory = int(maxHistory)
+        self.reduce = reduce
+        self.columns = int(np.ceil((self.maxFreq - self.minFreq) / self.resolution))
+
+        # fixed color scale, values are 100 + dBm so -100 dBm to 0 dBm
+        self.minLevel = 0
+        self.maxLevel = 100
+
+        # tier 0 holds every sweep, each later tier folds rows of the one before it
+        self.history = [HistoryRing(self.maxHistory, self.columns)]
+        sweepsPerRow = 1
+        for rows, factor in tiers:
+            sweepsPerRow = sweepsPerRow * int(factor)
+            self.history.append(HistoryRing(rows, self.columns, sweepsPerRow))
+
+        # partially folded rows waiting to be pushed into each coarser tier
+        self.pending = [np.zeros(self.columns, dtype=np.float32) for _ in tiers]
+        self.pendingCount = [0] * len(tiers)
+        self.factors = [int(factor) for _, factor in tiers]
+
+        self.lock = Lock()
+
+    @property
+    def dataList(self):
+        ''' The full rate ring buffer '''
 
-        tempList = [0] * (self.maxFreq-self.minFreq)
-        self.dataList = []
-        for i in range(self.maxHistory):
-            self.dataList.append(tempList)
+        return self.history[0].data
 
     def linkRabbit(self):
             """Setup and start listening for RabbitMQ messages
@@ -45,6 +114,59 @@ class SweepViewer:
             channel.basic_consume(queue=queue_name, on_message_callback=self.rabbitCallback, auto_ack=True)
             channel.start_consuming()
 
+    def decimate(self, freqs, levels):
+        """Reduces frequency bins into display columns
+
+        Args:
+            freqs (numpy.ndarray): bin frequencies in Hz
+            levels (numpy.ndarray): bin levels, 100 + dBm
+
+        Returns:
+            numpy.ndarray: one row of display columns
+        """
+
+        index = np.floor((freqs / 1000000 - self.minFreq) / self.resolution).astype(np.int64)
+        valid = (index >= 0) & (index < self.columns)
+        index = index[valid]
+        levels = levels[valid]
+
+        if self.reduce == 'mean':
+            sums = np.bincount(index, weights=levels, minlength=self.columns)
+            counts = np.bincount(index, minlength=self.columns)
+            return (sums / np.maximum(counts, 1)).astype(np.float32)
+
+        row = np.zeros(self.columns, dtype=np.float32)
+        np.maximum.at(row, index, levels)
+        return row
+
+    def addRow(self, row):
+        """Pushes a full rate row and folds it into the coarser tiers
+
+        Args:
+            row (numpy.ndarray): one row of display columns
+        """
+
+        with self.lock:
+            self.history[0].push(row)
+
+            for tier in range(len(self.pending)):
+                if self.reduce == 'mean':
+                    self.pending[tier] += row
+                else:
+                    np.maximum(self.pending[tier], row, out=self.pending[tier])
+                self.pendingCount[tier] += 1
+
+                if self.pendingCount[tier] < self.factors[tier]:
+                    break
+
+                # this tier's row is complete, it becomes the input of the next tier
+                row = self.pending[tier]
+                if self.reduce == 'mean':
+                    row = row / self.pendingCount[tier]
+                self.history[tier + 1].push(row)
+                self.pending[tier] = np.zeros(self.columns, dtype=np.float32)
+                self.pendingCount[tier] = 0
+
     def rabbitCallback(self, ch, method, properties, body):
         """Callback method for rabbitMQ
 
@@ -55,63 +177,114 @@ class SweepViewer:
             body (String): The message body as a string
         """
 
-        data = body.split( )
-        newFreqs = [0] * (self.maxFreq-self.minFreq)
+        data = np.array(body.split(), dtype=np.float64)
+        data = data[:len(data) - (len(data) % 2)].reshape(-1, 2)
+
+        self.addRow(self.scanRow(data))
+
+    def scanRow(self, data):
+        """Turns [Hz, dBm] scan pairs into a display row
+
+        Args:
+            data (numpy.ndarray): n x 2 array of frequency and power
+
+        Returns:
+            numpy.ndarray: one row of display columns
+        """
+
+        level = np.where(data[:, 1] != 0, 100 + np.round(data[:, 1]), 0)
+        return self.decimate(data[:, 0], level)
+
+    def linkRing(self, ringName):
+        """Follows the scans cactus writes to shared memory instead of RabbitMQ
+
+        Args:
+            ringName (str): the name prefix cactus was given
+        """
+
+        print(f"Reading scans from shared memory ring {ringName}_scan")
+        ring = SweepRing.attach(f"{ringName}_scan")
 
-        freq = 0
+        for seq, timestamp, view in ring.entries():
+            row = self.scanRow(view) # straight from the shared buffer
+            if ring.valid(seq): # cactus didn't lap us while the row was built
+                self.addRow(row)
 
-        for i in range(0, len(data), 2):
-            freq = int((int(data[i].decode()) / 1000000) - self.minFreq) # convert freq to index 
+    def snapshot(self, tier=0, minFreq=None, maxFreq=None):
+        """Copies a history tier out oldest row first
 
-            val = round(float(data[i+1].decode()))
+        Args:
+            tier (int, optional): 0 for full rate, higher for older and coarser history. Defaults to 0.
+            minFreq (float, optional): zoom to this lowest frequency in MHz. Defaults to the full span.
+            maxFreq (float, optional): zoom to this highest frequency in MHz. Defaults to the full span.
 
-            if val != 0 :
-                val = 100 + val
-            
-            newFreqs[freq] = val
+        Returns:
+            numpy.ndarray: rows x columns array, newest row last
+        """
 
-            #print(f"Freq: {str(freq)} : {str(round(float(data[i+1].decode())))}")
+        start, stop = self.columnRange(minFreq, maxFreq)
 
-        self.dataList.append(newFreqs)
+        with self.lock:
+            return self.history[tier].ordered()[:, start:stop]
 
-        #if len(self.dataList) > self.maxHistory:
-        self.dataList.pop(0)
+    def columnRange(self, minFreq=None, maxFreq=None):
+        ''' Converts a frequency range in MHz into a column slice '''
 
-        #print(str(newFreqs))
-        
+        start = 0 if minFreq is None else int((minFreq - self.minFreq) / self.resolution)
+        stop = self.columns if maxFreq is None else int(np.ceil((maxFreq - self.minFreq) / self.resolution))
+        return max(start, 0), min(max(stop, start + 1), self.columns)
 
-    def startViewer(self):
-        self.rabbitThread = Thread(target=self.linkRabbit, daemon=True)
+    def startViewer(self, ringName=None):
+        if ringName is not None:
+            self.rabbitThread = Thread(target=self.linkRing, args=(ringName,), daemon=True)
+        else:
+            self.rabbitThread = Thread(target=self.linkRabbit, daemon=True)
         self.rabbitThread.start()
 
 
 if __name__ == "__main__":
 
+    parser = argparse.ArgumentParser(description="Waterfall viewer for the cactus scanSweep output")
+    parser.add_argument("--min-freq", type=float, default=0, help="lowest frequency in MHz")
+    parser.add_argument("--max-freq", type=float, default=6000, help="highest frequency in MHz")
+    parser.add_argument("--resolution", type=float, default=1.0, help="MHz per display column")
+    parser.add_argument("--history", type=int, default=30, help="full rate sweeps kept")
+    parser.add_argument("--reduce", choices=["max", "mean"], default="max", help="how bins are combined into a column")
+    parser.add_argument("--tier", type=int, default=0, help="history tier to show, 0 is full rate")
+    parser.add_argument("--zoom", type=float, nargs=2, metavar=("MIN", "MAX"), help="only show this range in MHz")
+    parser.add_argument("--ring", help="read from cactus' shared memory rings with this name prefix instead of RabbitMQ")
+    args = parser.parse_args()
+
     print("Starting Sweep Viewer")
-    viewer = SweepViewer()
-    viewer.startViewer()
+    viewer = SweepViewer(minFreq=args.min_freq, maxFreq=args.max_freq, resolution=args.resolution, maxHistory=args.history, reduce=args.reduce)
+    if not 0 <= args.tier < len(viewer.history):
+        parser.error(f"--tier must be between 0 and {len(viewer.history) - 1}")
+    viewer.startViewer(args.ring)
 
     print("Press Ctrl + C to exit")
 
-    x = np.arange(viewer.maxFreq)
-    y = np.arange(viewer.maxHistory)
-    X,Y = np.meshgrid(x,y)
-
-
-    def animate(i, X,Y):
-        
-        Z = np.array(viewer.dataList)
-        plt.pcolormesh(X, Y, Z, vmin=np.min(Z), vmax=np.max(Z), shading='auto')
+    zoomMin, zoomMax = args.zoom if args.zoom else (None, None)
+    start, stop = viewer.columnRange(zoomMin, zoomMax)
+    rows = viewer.history[args.tier].rows
+    sweepsPerRow = viewer.history[args.tier].sweepsPerRow
 
     plt.close()
-    fig = plt.figure()
-    ani = animation.FuncAnimation(fig, animate, fargs=(X,Y), repeat = True)
-    plt.show()
-
-    #while True:
-    #    input()
+    fig, ax = plt.subplots()
 
+    # one image artist for the whole run, each frame only swaps its data
+    image = ax.imshow(viewer.snapshot(args.tier, zoomMin, zoomMax), aspect='auto', origin='lower', interpolation='nearest',
+                      extent=(viewer.minFreq + start * viewer.resolution, viewer.minFreq + stop * viewer.resolution, -rows * sweepsPerRow, 0),
+                      vmin=viewer.minLevel, vmax=viewer.maxLevel)
+    ax.set_xlabel("Frequency (MHz)")
+    ax.set_ylabel("Sweeps ago")
 
+    def animate(i):
 
+        image.set_data(viewer.snapshot(args.tier, zoomMin, zoomMax))
+        return (image,)
 
+    ani = animation.FuncAnimation(fig, animate, interval=200, blit=True, cache_frame_data=False)
+    plt.show()
 
+    #while True:
+    #    input()